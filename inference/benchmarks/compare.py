@@ -0,0 +1,370 @@
+"""Compare benchmark results and flag statistically significant regressions.
+
+The first file is the baseline; suites in every other file are matched to
+it by their full definition (see ``SUITE_IDENTITY_FIELDS``). For each latency and throughput distribution
+the relative change of the mean and tail percentiles is bootstrapped from
+the suites' histograms, and that of suite output throughput from per-request
+completion tokens and latency. A change is a regression when its confidence
+interval excludes zero in the bad direction and the point estimate exceeds
+the metric's threshold; any regression, or a baseline suite missing from a
+candidate, makes the command exit non-zero.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from inference.benchmarks.utils.metrics import BenchmarkResults, StreamingHistogram, TokenRateHistogram
+from inference.benchmarks.utils.sink import read_records, suite_identity
+
+# Distribution key -> whether higher values are better.
+COMPARED_METRICS = {
+    "latency_ms": False,
+    "ttft_ms": False,
+    "tpot_ms": False,
+    "itl_ms": False,
+    "decode_tokens_per_s": True,
+}
+# Suite throughput: completion tokens per second of request latency.
+THROUGHPUT_METRIC = "output_tokens_per_s"
+# Statistic -> quantile (``None`` for the mean).
+STATISTICS = {"mean": None, "p50": 0.5, "p95": 0.95, "p99": 0.99}
+# Aggregate rates and startup timings; a single value per suite, so they are
+# reported without a confidence interval and never gate.
+AGGREGATE_METRICS = (
+    ("load", "achieved_qps"),
+    ("batch", "requests_per_s"),
+    ("batch", "output_tokens_per_s"),
+    ("startup", "setup_s"),
+    ("startup", "cold_start_s"),
+    ("startup", "weight_load_gb_per_s"),
+)
+
+SuiteKey = Tuple[str, str, int]
+
+
+def load_suites(path: Path) -> List[Dict[str, Any]]:
+    """Suite summaries from an aggregated ``.json`` output or a ``.jsonl`` sink.
+
+    For sinks the latest completed attempt of each suite is used. Older
+    summaries without histograms or output rates are rebuilt from the
+    attempt's ``sample`` records when they were recorded.
+    """
+    if path.suffix != ".jsonl":
+        return json.loads(path.read_text())
+    suites: Dict[str, Dict[str, Any]] = {}
+    samples: Dict[str, BenchmarkResults] = {}
+    definitions: Dict[str, Dict[str, Any]] = {}
+    for record in read_records(path):
+        if record.get("type") == "suite_start":
+            definitions[record["run_id"]] = record["suite"]
+        elif record.get("type") == "sample":
+            samples.setdefault(record["run_id"], BenchmarkResults(name="")).add_sample(record["sample"])
+        elif record.get("type") == "suite":
+            suites[record["suite_hash"]] = record
+    summaries = []
+    for record in sorted(suites.values(), key=lambda record: record["index"]):
+        summary = record["summary"]
+        rebuilt = samples.get(record["run_id"])
+        if rebuilt is not None and not {"histograms", "output_rates"} <= summary["results"].keys():
+            rebuilt_results = rebuilt.summary()
+            for key in ("histograms", "output_rates"):
+                if key not in summary["results"] and key in rebuilt_results:
+                    summary["results"][key] = rebuilt_results[key]
+        if "suite" not in summary and record["run_id"] in definitions:
+            summary["suite"] = suite_identity(definitions[record["run_id"]])
+        summaries.append(summary)
+    return summaries
+
+
+def suite_definition(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """The suite definition a summary was measured under.
+
+    Summaries written before the definition was recorded fall back to what
+    they do carry: params, load shape, batch size and sweep point.
+    """
+    if "suite" in summary:
+        return summary["suite"]
+    definition: Dict[str, Any] = {"params": summary.get("config", {})}
+    load = summary.get("load")
+    if load:
+        definition["load"] = {key: load.get(key) for key in ("mode", "concurrency", "arrival", "target_qps")}
+    if summary.get("batch"):
+        definition["batch_size"] = summary["batch"].get("batch_size")
+    if "sweep_point" in summary:
+        definition["sweep_point"] = summary["sweep_point"]
+    return definition
+
+
+def index_suites(summaries: Sequence[Dict[str, Any]]) -> Dict[SuiteKey, Dict[str, Any]]:
+    """Key suites by runner and canonical definition; repeats are told apart by occurrence."""
+    indexed: Dict[SuiteKey, Dict[str, Any]] = {}
+    seen: Counter = Counter()
+    for summary in summaries:
+        key = (summary["runner"], json.dumps(suite_definition(summary), sort_keys=True, default=str))
+        indexed[(*key, seen[key])] = summary
+        seen[key] += 1
+    return indexed
+
+
+@dataclass
+class BucketDistribution:
+    """Histogram buckets as arrays, for vectorized bootstrap resampling."""
+
+    values: np.ndarray
+    counts: np.ndarray
+
+    @classmethod
+    def from_histogram(cls, histogram: StreamingHistogram) -> "BucketDistribution":
+        buckets = histogram.buckets()
+        return cls(np.array([value for value, _ in buckets]), np.array([count for _, count in buckets]))
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def statistic(self, counts: np.ndarray, name: str) -> np.ndarray:
+        """``name`` over the last axis of ``counts``, which holds counts per bucket."""
+        totals = counts.sum(axis=-1)
+        quantile = STATISTICS[name]
+        if quantile is None:
+            return counts @ self.values / totals
+        # Nearest rank, matching ``StreamingHistogram.quantile``.
+        rank = np.maximum(1, np.ceil(quantile * totals))
+        return self.values[(counts.cumsum(axis=-1) >= rank[..., None]).argmax(axis=-1)]
+
+    def resample(self, rng: np.random.Generator, num_resamples: int) -> np.ndarray:
+        return rng.multinomial(self.count, self.counts / self.count, size=num_resamples)
+
+
+@dataclass
+class RateDistribution(BucketDistribution):
+    """Token rate buckets; ``values`` holds the mean tokens and ``latency_s`` the mean latency per request.
+
+    Every statistic is the suite's total tokens over total latency.
+    """
+
+    latency_s: np.ndarray
+
+    @classmethod
+    def from_rates(cls, histogram: TokenRateHistogram) -> "RateDistribution":
+        buckets = histogram.buckets()
+        counts = np.array([count for count, _, _ in buckets])
+        tokens = np.array([tokens for _, tokens, _ in buckets])
+        latency_s = np.array([latency_s for _, _, latency_s in buckets])
+        return cls(tokens / counts, counts, latency_s / counts)
+
+    def statistic(self, counts: np.ndarray, name: str) -> np.ndarray:
+        return (counts @ self.values) / (counts @ self.latency_s)
+
+
+def bootstrap_delta(
+    baseline: BucketDistribution,
+    candidate: BucketDistribution,
+    statistic: str,
+    rng: np.random.Generator,
+    num_resamples: int = 2000,
+    confidence: float = 0.95,
+) -> Dict[str, Any]:
+    """Relative change of ``statistic`` with a percentile bootstrap interval.
+
+    Both are ``None`` when the baseline is zero, and the interval alone when
+    no resample has a nonzero baseline.
+    """
+    base_value = float(baseline.statistic(baseline.counts, statistic))
+    cand_value = float(candidate.statistic(candidate.counts, statistic))
+    result: Dict[str, Any] = {"baseline": base_value, "candidate": cand_value, "delta": None, "ci": None}
+    if base_value == 0:
+        return result
+    result["delta"] = cand_value / base_value - 1
+    base_samples = baseline.statistic(baseline.resample(rng, num_resamples), statistic)
+    cand_samples = candidate.statistic(candidate.resample(rng, num_resamples), statistic)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deltas = cand_samples / base_samples - 1
+    deltas = deltas[np.isfinite(deltas)]
+    if deltas.size:
+        tail = (1 - confidence) / 2 * 100
+        low, high = np.percentile(deltas, [tail, 100 - tail])
+        result["ci"] = [float(low), float(high)]
+    return result
+
+
+def parse_thresholds(items: Sequence[str]) -> Dict[str, float]:
+    """Parse ``metric=fraction`` pairs, e.g. ``latency_ms.p99=0.1`` or ``ttft_ms=0.2``."""
+    thresholds = {}
+    for item in items:
+        metric, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Threshold `{item}` must look like `metric=fraction`")
+        thresholds[metric] = float(value)
+    return thresholds
+
+
+def classify(result: Dict[str, Any], higher_is_better: bool, threshold: float) -> str:
+    if result["ci"] is None:
+        return "no interval"
+    low, high = result["ci"]
+    # Express the change so that positive always means worse.
+    sign = -1 if higher_is_better else 1
+    worse = sign * result["delta"]
+    worse_low = min(sign * low, sign * high)
+    worse_high = max(sign * low, sign * high)
+    if worse > threshold and worse_low > 0:
+        return "regression"
+    if -worse > threshold and worse_high < 0:
+        return "improvement"
+    return "ok"
+
+
+def compare_suites(
+    baseline: Dict[str, Any],
+    candidate: Dict[str, Any],
+    thresholds: Dict[str, float],
+    default_threshold: float,
+    rng: np.random.Generator,
+    num_resamples: int = 2000,
+    confidence: float = 0.95,
+    min_samples: int = 10,
+) -> List[Dict[str, Any]]:
+    def compare(
+        metric: str, statistic: str, base_dist: BucketDistribution, cand_dist: BucketDistribution, higher_is_better: bool
+    ) -> Dict[str, Any]:
+        key = metric.partition(".")[0]
+        threshold = thresholds.get(metric, thresholds.get(key, default_threshold))
+        row: Dict[str, Any] = {"metric": metric, "threshold": threshold}
+        if min(base_dist.count, cand_dist.count) < min_samples:
+            row["status"] = "insufficient data"
+        else:
+            row.update(bootstrap_delta(base_dist, cand_dist, statistic, rng, num_resamples, confidence))
+            row["status"] = classify(row, higher_is_better, threshold)
+        return row
+
+    base_histograms = baseline["results"].get("histograms", {})
+    cand_histograms = candidate["results"].get("histograms", {})
+    rows = []
+    for key, higher_is_better in COMPARED_METRICS.items():
+        if key not in base_histograms or key not in cand_histograms:
+            continue
+        base_dist = BucketDistribution.from_histogram(StreamingHistogram.from_dict(base_histograms[key]))
+        cand_dist = BucketDistribution.from_histogram(StreamingHistogram.from_dict(cand_histograms[key]))
+        for statistic in STATISTICS:
+            rows.append(compare(f"{key}.{statistic}", statistic, base_dist, cand_dist, higher_is_better))
+    base_rates = baseline["results"].get("output_rates")
+    cand_rates = candidate["results"].get("output_rates")
+    if base_rates and cand_rates:
+        base_dist = RateDistribution.from_rates(TokenRateHistogram.from_dict(base_rates))
+        cand_dist = RateDistribution.from_rates(TokenRateHistogram.from_dict(cand_rates))
+        rows.append(compare(THROUGHPUT_METRIC, "mean", base_dist, cand_dist, higher_is_better=True))
+    for section, key in AGGREGATE_METRICS:
+        base_value = (baseline.get(section) or {}).get(key)
+        cand_value = (candidate.get(section) or {}).get(key)
+        if base_value and cand_value is not None:
+            rows.append(
+                {
+                    "metric": f"{section}.{key}",
+                    "baseline": base_value,
+                    "candidate": cand_value,
+                    "delta": cand_value / base_value - 1,
+                    "status": "no interval",
+                }
+            )
+    return rows
+
+
+def format_row(row: Dict[str, Any]) -> str:
+    if row.get("delta") is None:
+        return f"  {row['metric']:<28} {row['status']}"
+    line = f"  {row['metric']:<28} {row['baseline']:>12.3f} -> {row['candidate']:>12.3f}  {row['delta']:+8.2%}"
+    if row.get("ci") is not None:
+        line += f"  [{row['ci'][0]:+.2%}, {row['ci'][1]:+.2%}]"
+    if row["status"] not in ("ok", "no interval"):
+        line += f"  {row['status'].upper()}"
+    return line
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="run_benchmarks.py compare",
+        description="Compare benchmark results against a baseline and fail on significant regressions",
+    )
+    parser.add_argument("results", type=Path, nargs="+", help="Result files (.json or sink .jsonl); the first is the baseline")
+    parser.add_argument(
+        "--threshold",
+        action="append",
+        default=[],
+        metavar="METRIC=FRACTION",
+        help="Relative change tolerated before a significant change is a regression, "
+        "per metric (`latency_ms.p99=0.1`) or distribution (`ttft_ms=0.2`); repeatable",
+    )
+    parser.add_argument("--default-threshold", type=float, default=0.05)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--num-resamples", type=int, default=2000)
+    parser.add_argument("--min-samples", type=int, default=10, help="Skip distributions with fewer values than this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--allow-missing",
+        action="store_true",
+        help="Report baseline suites absent from a candidate without failing",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="Write the full comparison report as JSON")
+    args = parser.parse_args(argv)
+    if len(args.results) < 2:
+        parser.error("at least two result files are required")
+    thresholds = parse_thresholds(args.threshold)
+    rng = np.random.default_rng(args.seed)
+
+    baseline = index_suites(load_suites(args.results[0]))
+    report: List[Dict[str, Any]] = []
+    regressions = 0
+    missing = 0
+    for path in args.results[1:]:
+        candidate = index_suites(load_suites(path))
+        print(f"{path} vs {args.results[0]}")
+        for key in list(baseline) + [key for key in candidate if key not in baseline]:
+            runner, definition, occurrence = key
+            label = f"{runner} {definition}" + (f" #{occurrence}" if occurrence else "")
+            entry: Dict[str, Any] = {"candidate_file": str(path), "runner": runner, "suite": json.loads(definition)}
+            if key not in candidate:
+                entry["status"] = "missing from candidate"
+                missing += 1
+            elif key not in baseline:
+                entry["status"] = "not in baseline"
+            else:
+                entry["metrics"] = compare_suites(
+                    baseline[key],
+                    candidate[key],
+                    thresholds,
+                    args.default_threshold,
+                    rng,
+                    num_resamples=args.num_resamples,
+                    confidence=args.confidence,
+                    min_samples=args.min_samples,
+                )
+                suite_regressions = sum(row["status"] == "regression" for row in entry["metrics"])
+                entry["status"] = "regression" if suite_regressions else "ok"
+                regressions += suite_regressions
+            report.append(entry)
+            print(f"{label}: {entry['status']}")
+            for row in entry.get("metrics", []):
+                print(format_row(row))
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Saved comparison report to {args.output}")
+    if regressions:
+        print(f"{regressions} significant regression(s) found")
+    if missing:
+        print(f"{missing} baseline suite(s) missing from the candidates" + (" (allowed)" if args.allow_missing else ""))
+    if regressions or (missing and not args.allow_missing):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Reuse set-up runners across suites that share an engine."""
+from __future__ import annotations
+
+import gc
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple, Type
+
+from inference.benchmarks.runners.base import BenchmarkRunner
+
+EngineKey = Tuple[str, str]
+
+
+def engine_key(runner_cls: Type[BenchmarkRunner], params: Dict[str, Any]) -> EngineKey:
+    """Identify the engine ``params`` load: everything except the runner's ``request_params``.
+
+    Unknown params count as load-affecting, so runners only share an engine
+    when that is known to be safe.
+    """
+    engine_params = {key: value for key, value in params.items() if key not in runner_cls.request_params}
+    runner_path = f"{runner_cls.__module__}.{runner_cls.__qualname__}"
+    return runner_path, json.dumps(engine_params, sort_keys=True, default=str)
+
+
+class EnginePool:
+    """Keeps up to ``max_engines`` runners set up between suites.
+
+    A suite whose ``engine_key`` matches a live runner gets that runner with
+    its ``request_params`` swapped in via ``configure``, instead of paying for
+    another model load or engine deserialization. Loading a different engine
+    first tears down the least recently used ones beyond ``max_engines - 1``,
+    so GPU memory is freed before the new weights arrive. With the default of
+    one engine, suites that need another model always evict the live one.
+    """
+
+    def __init__(self, max_engines: int = 1):
+        if max_engines < 1:
+            raise ValueError("`max_engines` must be at least 1")
+        self.max_engines = max_engines
+        self._runners: "OrderedDict[EngineKey, BenchmarkRunner]" = OrderedDict()
+
+    def acquire(self, runner_cls: Type[BenchmarkRunner], params: Dict[str, Any]) -> Tuple[BenchmarkRunner, bool]:
+        """Runner for ``params`` and whether an existing engine was reused."""
+        key = engine_key(runner_cls, params)
+        runner = self._runners.get(key)
+        if runner is not None:
+            self._runners.move_to_end(key)
+            runner.config = params
+            runner.configure()
+            return runner, True
+        evict_start = time.perf_counter()
+        evicted = False
+        while len(self._runners) >= self.max_engines:
+            self.evict(next(iter(self._runners)))
+            evicted = True
+        evict_s = time.perf_counter() - evict_start
+        runner = runner_cls(params)
+        runner.start_up()
+        if evicted:
+            # Time spent freeing the previous engine before this one could load.
+            runner.startup["evict_s"] = evict_s
+        self._runners[key] = runner
+        return runner, False
+
+    @contextmanager
+    def lease(self, runner_cls: Type[BenchmarkRunner], params: Dict[str, Any]) -> Iterator[Tuple[BenchmarkRunner, bool]]:
+        """Like ``acquire``, but evicts the runner if the suite using it fails."""
+        runner, reused = self.acquire(runner_cls, params)
+        try:
+            yield runner, reused
+        except BaseException:
+            # The engine may be left in a bad state (e.g. after running out of memory).
+            self.evict(engine_key(runner_cls, params))
+            raise
+
+    def evict(self, key: Optional[EngineKey] = None) -> None:
+        """Tear down the runner for ``key``, or every runner when ``key`` is None."""
+        keys = list(self._runners) if key is None else [key]
+        for evicted in keys:
+            runner = self._runners.pop(evicted, None)
+            if runner is None:
+                continue
+            logging.info("Evicting %s engine", runner.name)
+            try:
+                runner.shut_down()
+            finally:
+                del runner
+                # Engines hold GPU memory until their last reference is collected.
+                gc.collect()
+
+    def close(self) -> None:
+        self.evict()
+
+    def __enter__(self) -> "EnginePool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        self.close()
@@ -4,19 +4,34 @@ from __future__ import annotations
 import argparse
 import importlib
 import json
+import sys
+import time
+from contextlib import contextmanager
+from itertools import chain, repeat
 from pathlib import Path
-from typing import Any, Dict, Type
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Type
 
 import yaml
 
+from inference.benchmarks import compare
+from inference.benchmarks.engine_pool import EnginePool, engine_key
 from inference.benchmarks.runners.base import BenchmarkRunner
+from inference.benchmarks.scheduler import SuiteScheduler, visible_devices
+from inference.benchmarks.sweep import expand_sweep, pareto_report
+from inference.benchmarks.utils.load import LoadConfig, RequestCoalescer, generate_load, iter_batches, run_batches
 from inference.benchmarks.utils.metrics import BenchmarkResults
+from inference.benchmarks.utils.profiling import ProfilingConfig, build_profiler
+from inference.benchmarks.utils.sink import ResultSink, suite_hash, suite_identity
+from inference.benchmarks.utils.steady_state import ConvergenceDetector, run_warmup, until_converged
+from inference.benchmarks.utils.system import start_system_sampler, stop_system_sampler
+from inference.benchmarks.workloads import Request, annotate_sample, build_workload, group_conversations
 
 RUNNER_REGISTRY = {
     "vllm": "inference.benchmarks.runners.vllm_runner.VLLMRunner",
     "sglang": "inference.benchmarks.runners.sglang_runner.SGLangRunner",
     "lmdeploy": "inference.benchmarks.runners.lmdeploy_runner.LMDeployRunner",
     "tensorrt-llm": "inference.benchmarks.runners.tensorrt_llm_runner.TensorRTLLMRunner",
+    "openai": "inference.benchmarks.runners.openai_runner.OpenAICompatibleRunner",
 }
 
 
@@ -26,41 +41,318 @@ def load_class(path: str) -> Type[BenchmarkRunner]:
     return getattr(module, class_name)
 
 
-def run_suite(suite_config: Dict[str, Any]) -> Dict[str, Any]:
+def runner_class(runner_key: str) -> Type[BenchmarkRunner]:
+    return load_class(RUNNER_REGISTRY.get(runner_key, runner_key))
+
+
+DEFAULT_PROFILE_DIR = Path("outputs/profiles")
+
+
+@contextmanager
+def open_runner(
+    runner_cls: Type[BenchmarkRunner], params: Dict[str, Any], engine_pool: Optional[EnginePool] = None
+) -> Iterator[Tuple[BenchmarkRunner, bool]]:
+    """Yield a set-up runner and whether its engine was reused from ``engine_pool``."""
+    if engine_pool is not None:
+        with engine_pool.lease(runner_cls, params) as leased:
+            yield leased
+    else:
+        with runner_cls(params) as runner:
+            yield runner, False
+
+
+def startup_summary(runner: BenchmarkRunner, engine_reused: bool, first_request_ms: Optional[float]) -> Dict[str, Any]:
+    """Setup/teardown timings of ``runner``; a reused engine only reports its first request."""
+    startup: Dict[str, Any] = {"first_request_ms": first_request_ms}
+    if not engine_reused:
+        startup.update(runner.startup)
+        load_s = startup["phases"].get("weight_load")
+        if startup.get("weight_bytes") and load_s:
+            startup["weight_load_gb_per_s"] = startup["weight_bytes"] / load_s / 1e9
+        if first_request_ms is not None:
+            startup["cold_start_s"] = startup["setup_s"] + first_request_ms / 1000
+    if runner.teardown_s is not None:
+        startup["teardown_s"] = runner.teardown_s
+    return startup
+
+
+def run_suite(
+    suite_config: Dict[str, Any],
+    sample_writer: Optional[Callable[[Dict[str, Any]], None]] = None,
+    profile_dir: Optional[Path] = None,
+    engine_pool: Optional[EnginePool] = None,
+) -> Dict[str, Any]:
     runner_key = suite_config["runner"]
-    runner_cls_path = RUNNER_REGISTRY.get(runner_key, runner_key)
-    runner_cls = load_class(runner_cls_path)
-    prompts = suite_config.get("prompts", ["Hello, world! Explain Azure H100 benefits."])
+    runner_cls = runner_class(runner_key)
+    workload = build_workload(suite_config)
     repetitions = suite_config.get("repetitions", 1)
-    with runner_cls(suite_config.get("params", {})) as runner:
-        results = BenchmarkResults(name=runner_cls.name)
-        for _ in range(repetitions):
-            for prompt in prompts:
-                sample = runner.run_once(prompt)
-                results.add_sample(sample)
-
-    return {
+    load_config = LoadConfig.from_dict(suite_config["load"]) if "load" in suite_config else None
+    # Runners that cannot take concurrent calls get them coalesced into `run_batch`.
+    coalesce = load_config is not None and load_config.max_in_flight > 1 and not runner_cls.thread_safe
+    if coalesce and suite_config.get("streaming", False):
+        raise ValueError(
+            f"Runner `{runner_cls.name}` streams one request at a time; set `load.concurrency: 1`, "
+            "disable `streaming` so concurrent requests are batched, or use a thread-safe runner"
+        )
+    batch_size = suite_config.get("batch_size")
+    if batch_size is not None and load_config is not None:
+        raise ValueError("A suite can set either `batch_size` or `load`, not both")
+    # Each turn resends the previous one's conversation, so turns are sent in order.
+    conversational = workload.type == "conversations"
+    if conversational and batch_size is not None:
+        raise ValueError(
+            "Conversation turns must follow each other's completion and cannot be batched; "
+            "use `load` to run conversations concurrently"
+        )
+    warmup_config = suite_config.get("warmup", {})
+    detector = ConvergenceDetector(**suite_config["convergence"]) if "convergence" in suite_config else None
+    profiling_config = ProfilingConfig.from_dict(suite_config.get("profiling", {}))
+    suite_profile_dir = (profile_dir or DEFAULT_PROFILE_DIR) / f"{runner_key}-{suite_hash(suite_config)[:12]}"
+    load_stats = None
+    batch_stats = None
+    results = BenchmarkResults(name=runner_cls.name, sample_writer=sample_writer)
+    profiler = None
+    # Latency of the first request (warmup or measured) the runner serves.
+    first_request: Dict[str, float] = {}
+
+    def on_sample(sample: Dict[str, Any]) -> None:
+        results.add_sample(sample)
+        if detector is not None:
+            detector.observe(sample)
+        if profiler is not None:
+            profiler.step()
+
+    with open_runner(runner_cls, suite_config.get("params", {}), engine_pool) as (runner, engine_reused):
+        run_request = runner.run_streaming if suite_config.get("streaming", False) else runner.run_once
+
+        def request_fn(request: Request) -> Dict[str, Any]:
+            sample = run_request(request.prompt, max_new_tokens=request.max_new_tokens)
+            first_request.setdefault("latency_ms", sample.get("latency_ms"))
+            return annotate_sample(sample, request)
+
+        def batch_fn(requests: Sequence[Request]) -> List[Dict[str, Any]]:
+            limits = [request.max_new_tokens for request in requests]
+            prompts = [request.prompt for request in requests]
+            samples = runner.run_batch(prompts, limits if any(limit is not None for limit in limits) else None)
+            if samples:
+                first_request.setdefault("latency_ms", samples[0].get("batch_latency_ms", samples[0].get("latency_ms")))
+            return [annotate_sample(sample, request) for sample, request in zip(samples, requests)]
+
+        if batch_size is not None:
+            warmup_batch = next(iter_batches(workload, batch_size), []) if warmup_config else []
+            warmup_fn, warmup_items = batch_fn, [warmup_batch] if warmup_batch else []
+        else:
+            warmup_fn, warmup_items = request_fn, workload
+        warmup_stats = run_warmup(
+            warmup_fn,
+            warmup_items,
+            iterations=warmup_config.get("iterations", 0),
+            duration_s=warmup_config.get("duration_s", 0.0),
+        )
+        if detector is not None:
+            requests = until_converged(workload, detector)
+        else:
+            requests = chain.from_iterable(repeat(workload, repetitions))
+        # Created after warmup so the window counts measured requests only.
+        profiler = build_profiler(profiling_config, suite_profile_dir, rank=0)
+        measured_start = time.perf_counter()
+        try:
+            if batch_size is not None:
+                batch_stats = run_batches(batch_fn, requests, batch_size, on_sample)
+            elif load_config is not None:
+                items = group_conversations(requests) if conversational else requests
+                if coalesce:
+                    with RequestCoalescer(batch_fn, max_batch_size=load_config.max_in_flight) as coalescer:
+                        load_stats = generate_load(coalescer, items, load_config, on_sample, chained=conversational)
+                else:
+                    load_stats = generate_load(request_fn, items, load_config, on_sample, chained=conversational)
+            else:
+                for request in requests:
+                    on_sample(request_fn(request))
+        finally:
+            if profiler is not None:
+                profiler.close()
+        duration_s = time.perf_counter() - measured_start
+
+    summary = {
         "runner": runner_cls.name,
         "config": suite_config.get("params", {}),
         "results": results.summary(),
+        "startup": startup_summary(runner, engine_reused, first_request.get("latency_ms")),
+        "throughput": {
+            "duration_s": duration_s,
+            "requests_per_s": results.num_samples / duration_s if duration_s > 0 else None,
+            "output_tokens_per_s": (
+                results.totals["completion_tokens"] / duration_s
+                if duration_s > 0 and results.totals.get("completion_tokens")
+                else None
+            ),
+        },
     }
+    summary["suite"] = suite_identity(suite_config)
+    if engine_pool is not None:
+        summary["engine_reused"] = engine_reused
+    if "sweep_point" in suite_config:
+        summary["sweep_point"] = suite_config["sweep_point"]
+    if warmup_stats["iterations"]:
+        summary["warmup"] = warmup_stats
+    if detector is not None:
+        summary["convergence"] = detector.summary()
+    if load_stats is not None:
+        summary["load"] = load_stats
+    if batch_stats is not None:
+        summary["batch"] = batch_stats
+    if profiler is not None:
+        summary["profile_dir"] = str(suite_profile_dir)
+    return summary
+
+
+def group_by_engine(suites: Sequence[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+    """Order ``(index, suite)`` pairs so suites sharing an engine run back to back.
+
+    Groups keep the order in which their engine first appears, as do the
+    suites within each group.
+    """
+    groups: Dict[Any, List[Tuple[int, Dict[str, Any]]]] = {}
+    for index, suite in suites:
+        key = engine_key(runner_class(suite["runner"]), suite.get("params", {}))
+        groups.setdefault(key, []).append((index, suite))
+    return list(chain.from_iterable(groups.values()))
 
 
 def main() -> None:
-    parser = argparse.ArgumentParser(description="Benchmark multiple inference backends")
+    if sys.argv[1:2] == ["compare"]:
+        compare.main(sys.argv[2:])
+        return
+    parser = argparse.ArgumentParser(
+        description="Benchmark multiple inference backends",
+        epilog="Use `run_benchmarks.py compare BASELINE RESULTS...` to compare result files.",
+    )
     parser.add_argument("--config", type=Path, required=True)
     parser.add_argument("--output", type=Path, default=Path("outputs/benchmark_results.json"))
+    parser.add_argument(
+        "--sink",
+        type=Path,
+        default=None,
+        help="Append-only JSONL log of suite results (defaults to --output with a .jsonl suffix)",
+    )
+    parser.add_argument("--resume", action="store_true", help="Skip suites already completed in the sink")
+    parser.add_argument(
+        "--overwrite", action="store_true", help="Discard an existing non-empty sink instead of refusing to start"
+    )
+    parser.add_argument("--record-samples", action="store_true", help="Also stream raw per-request samples to the sink")
+    parser.add_argument(
+        "--system-sample-interval",
+        type=float,
+        default=0.1,
+        help="Seconds between background CPU/GPU utilization samples; 0 samples once per request instead",
+    )
+    parser.add_argument(
+        "--isolate",
+        action="store_true",
+        help="Run each suite in its own process, packing suites onto free GPUs concurrently",
+    )
+    parser.add_argument(
+        "--num-gpus",
+        type=int,
+        default=None,
+        help="Number of GPUs to schedule across with --isolate (defaults to the visible devices)",
+    )
+    parser.add_argument("--max-parallel-suites", type=int, default=None, help="Cap on concurrent suites with --isolate")
+    parser.add_argument(
+        "--profile-dir",
+        type=Path,
+        default=None,
+        help="Where suites with a `profiling` section write traces (defaults to a `profiles` directory next to --output)",
+    )
+    parser.add_argument(
+        "--no-engine-reuse",
+        action="store_true",
+        help="Set up a fresh runner for every suite instead of reusing engines across suites",
+    )
+    parser.add_argument("--max-engines", type=int, default=1, help="Engines kept loaded at once when reusing engines")
     args = parser.parse_args()
+    if args.num_gpus is not None and args.num_gpus < 1:
+        parser.error("--num-gpus must be at least 1")
+    if args.max_parallel_suites is not None and args.max_parallel_suites < 1:
+        parser.error("--max-parallel-suites must be at least 1")
 
     suites = yaml.safe_load(args.config.read_text())
-    aggregated: list[Dict[str, Any]] = []
+    summaries: Dict[int, Dict[str, Any]] = {}
+    failures: Dict[int, str] = {}
+
+    sink = ResultSink(args.sink or args.output.with_suffix(".jsonl"), resume=args.resume, overwrite=args.overwrite)
+    completed = sink.completed_suites() if args.resume else {}
+    pending = []
+    expanded = chain.from_iterable(expand_sweep(suite) for suite in suites.get("benchmarks", []))
+    for index, suite in enumerate(expanded):
+        digest = suite_hash(suite)
+        if digest in completed:
+            print(f"Skipping suite {index} ({suite['runner']}): already completed in {sink.path}")
+            summaries[index] = completed[digest]
+        else:
+            pending.append((index, suite))
+
+    profile_dir = args.profile_dir or args.output.parent / "profiles"
+    run_ids: Dict[int, str] = {}
+
+    def on_start(index: int, suite: Dict[str, Any]) -> Optional[Callable[[Dict[str, Any]], None]]:
+        run_ids[index] = sink.start_suite(index, suite)
+        return sink.sample_writer(suite, run_ids[index]) if args.record_samples else None
+
+    def on_complete(index: int, suite: Dict[str, Any], summary: Dict[str, Any]) -> None:
+        summary["suite_hash"] = suite_hash(suite)
+        sink.finish_suite(index, suite, run_ids[index], summary)
+        summaries[index] = summary
 
-    for suite in suites.get("benchmarks", []):
-        aggregated.append(run_suite(suite))
+    try:
+        if args.isolate:
+            devices = [str(idx) for idx in range(args.num_gpus)] if args.num_gpus is not None else visible_devices()
+            scheduler = SuiteScheduler(
+                devices,
+                max_parallel=args.max_parallel_suites,
+                system_sample_interval=args.system_sample_interval,
+                profile_dir=profile_dir,
+            )
+            failures = scheduler.run(pending, on_start=on_start, on_complete=on_complete)
+        else:
+            engine_pool = None if args.no_engine_reuse else EnginePool(max_engines=args.max_engines)
+            if engine_pool is not None:
+                pending = group_by_engine(pending)
+            if args.system_sample_interval > 0:
+                start_system_sampler(interval=args.system_sample_interval)
+            try:
+                for index, suite in pending:
+                    writer = on_start(index, suite)
+                    summary = run_suite(suite, sample_writer=writer, profile_dir=profile_dir, engine_pool=engine_pool)
+                    on_complete(index, suite, summary)
+            finally:
+                if engine_pool is not None:
+                    engine_pool.close()
+                stop_system_sampler()
+    finally:
+        sink.close()
 
+    aggregated = [summaries[index] for index in sorted(summaries)]
     args.output.parent.mkdir(parents=True, exist_ok=True)
     args.output.write_text(json.dumps(aggregated, indent=2))
     print(f"Saved benchmark results to {args.output}")
+    if any("sweep_point" in summary for summary in aggregated):
+        report = pareto_report(aggregated)
+        pareto_path = args.output.with_name(f"{args.output.stem}_pareto.json")
+        pareto_path.write_text(json.dumps(report, indent=2))
+        for runner, entry in report.items():
+            print(f"Pareto frontier for {runner} ({len(entry['frontier'])} of {entry['num_suites']} suites):")
+            for point in entry["frontier"]:
+                print(
+                    f"  {point['output_tokens_per_s']:10.1f} tok/s  p99 {point['p99_latency_ms']:10.1f} ms  "
+                    f"{point['sweep_point'] or point['config']}"
+                )
+        print(f"Saved Pareto report to {pareto_path}")
+    for index, error in sorted(failures.items()):
+        print(f"Suite {index} failed:\n{error}")
+    if failures:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -2,30 +2,155 @@
 from __future__ import annotations
 
 import abc
-from typing import Any, Dict
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from inference.benchmarks.utils.system import capture_system_snapshot
+
+
+@dataclass
+class TokenChunk:
+    """A piece of streamed output and the moment it reached the client."""
+
+    text: str
+    timestamp: float
+    num_tokens: int = 1
+    prompt_tokens: Optional[int] = None
+    # Prompt tokens the engine served from its prefix cache, when it reports them.
+    cached_tokens: Optional[int] = None
 
 
 class BenchmarkRunner(abc.ABC):
     name: str
+    # Whether ``run_once`` may be called from several threads at once. Load
+    # generation with more than one request in flight requires this.
+    thread_safe: bool = False
+    # Params applied by ``configure`` without reloading the engine. Suites whose
+    # params differ only in these keys can share a live runner (see ``EnginePool``).
+    request_params: Tuple[str, ...] = ()
 
     def __init__(self, config: Dict[str, Any]):
         self.config = config
+        # Filled by ``start_up``: ``setup_s``, named ``phases`` and, for runners
+        # that load weights, ``weight_bytes``.
+        self.startup: Dict[str, Any] = {"phases": {}}
+        self.teardown_s: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a named step of ``setup`` into ``startup["phases"]`` (seconds).
+
+        Runners whose step that reads weights into device memory does nothing
+        else should call it ``weight_load`` so the load bandwidth can be
+        derived. Engines that also allocate caches or capture graphs in the
+        same call record it as ``engine_init`` instead.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup["phases"][name] = time.perf_counter() - start
+
+    def start_up(self) -> None:
+        """Run ``setup`` and record how long it took."""
+        self.startup = {"phases": {}}
+        start = time.perf_counter()
+        self.setup()
+        self.startup["setup_s"] = time.perf_counter() - start
+
+    def shut_down(self) -> None:
+        """Run ``teardown`` and record how long it took."""
+        start = time.perf_counter()
+        try:
+            self.teardown()
+        finally:
+            self.teardown_s = time.perf_counter() - start
 
     @abc.abstractmethod
     def setup(self) -> None:
         """Prepare the runtime (load model, start server, etc.)."""
 
+    def configure(self) -> None:
+        """Apply the ``request_params`` in ``self.config`` to the live runtime.
+
+        Runners call this at the end of ``setup``; ``EnginePool`` calls it again
+        after swapping in the params of a suite that reuses the engine.
+        """
+
     @abc.abstractmethod
-    def run_once(self, prompt: str) -> Dict[str, Any]:
-        """Execute a single inference and return metrics."""
+    def run_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Execute a single inference and return metrics.
+
+        ``max_new_tokens`` overrides the configured generation limit for this request.
+        """
 
     @abc.abstractmethod
     def teardown(self) -> None:
         """Release resources created in setup."""
 
+    def run_batch(
+        self, prompts: Sequence[str], max_new_tokens: Optional[Sequence[Optional[int]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Execute ``prompts`` together and return one sample per prompt.
+
+        ``max_new_tokens``, when given, holds a per-prompt override (or None).
+        Runners backed by engines with native batching should override this so
+        the engine schedules all prompts at once; the fallback runs them one by one.
+        """
+        limits = max_new_tokens if max_new_tokens is not None else [None] * len(prompts)
+        return [self.run_once(prompt, max_new_tokens=limit) for prompt, limit in zip(prompts, limits)]
+
+    def stream_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Iterator[TokenChunk]:
+        """Yield the output of a single inference as it is produced.
+
+        Timestamps come from ``time.perf_counter``. Runners without native
+        streaming inherit this fallback, which yields the whole ``run_once``
+        output as one chunk once generation has finished.
+        """
+        sample = self.run_once(prompt, max_new_tokens=max_new_tokens)
+        yield TokenChunk(
+            text=sample.get("output", ""),
+            timestamp=time.perf_counter(),
+            num_tokens=sample.get("completion_tokens") or 1,
+            prompt_tokens=sample.get("prompt_tokens"),
+        )
+
+    def run_streaming(self, prompt: str, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Execute a single inference through ``stream_once`` and return token-level metrics."""
+        start = time.perf_counter()
+        chunks: List[TokenChunk] = list(self.stream_once(prompt, max_new_tokens=max_new_tokens))
+        end = time.perf_counter()
+        snapshot = capture_system_snapshot(start, end)
+
+        completion_tokens = sum(chunk.num_tokens for chunk in chunks)
+        prompt_tokens = next((c.prompt_tokens for c in reversed(chunks) if c.prompt_tokens is not None), None)
+        cached_tokens = next((c.cached_tokens for c in reversed(chunks) if c.cached_tokens is not None), None)
+        # Chunks carrying only metadata (e.g. a final usage report) are not tokens.
+        timed = [chunk for chunk in chunks if chunk.text or chunk.num_tokens]
+        first = timed[0] if timed else None
+        ttft_ms = (first.timestamp - start) * 1000 if first is not None else None
+        itl_ms = [(cur.timestamp - prev.timestamp) * 1000 for prev, cur in zip(timed, timed[1:])]
+        decode_s = timed[-1].timestamp - first.timestamp if first is not None else 0.0
+        decode_tokens = completion_tokens - (first.num_tokens if first is not None else 0)
+        return {
+            "prompt": prompt,
+            "output": "".join(chunk.text for chunk in chunks),
+            "latency_ms": (end - start) * 1000,
+            "ttft_ms": ttft_ms,
+            "itl_ms": itl_ms,
+            "tpot_ms": decode_s * 1000 / decode_tokens if decode_tokens > 0 else None,
+            "decode_tokens_per_s": decode_tokens / decode_s if decode_tokens > 0 and decode_s > 0 else None,
+            "prompt_tokens": prompt_tokens,
+            "cached_prompt_tokens": cached_tokens,
+            "completion_tokens": completion_tokens,
+            "system": snapshot,
+        }
+
     def __enter__(self) -> "BenchmarkRunner":
-        self.setup()
+        self.start_up()
         return self
 
     def __exit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
-        self.teardown()
+        self.shut_down()
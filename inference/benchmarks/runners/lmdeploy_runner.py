@@ -1,22 +1,34 @@
 """LMDeploy benchmark runner."""
 from __future__ import annotations
 
-from typing import Any, Dict
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
 
-from lmdeploy import pipeline
+from lmdeploy import GenerationConfig, pipeline
 
-from inference.benchmarks.runners.base import BenchmarkRunner
+from inference.benchmarks.runners.base import BenchmarkRunner, TokenChunk
 from inference.benchmarks.utils.system import capture_system_snapshot, time_it
+from inference.benchmarks.utils.weights import fetch_weights, weight_bytes
 
 
 class LMDeployRunner(BenchmarkRunner):
     name = "lmdeploy"
+    request_params = ("top_k", "top_p", "temperature", "max_new_tokens")
 
     def setup(self) -> None:
         model_name = self.config.get("model", "meta-llama/Llama-3.1-8B-Instruct")
         backend = self.config.get("backend", "turbomind")
         tp_size = self.config.get("tensor_parallel_size", 1)
-        self.pipe = pipeline(model_name, backend=backend, tp=tp_size)
+        with self.phase("weight_download"):
+            weights_dir = fetch_weights(model_name)
+        self.startup["weight_bytes"] = weight_bytes(weights_dir)
+        # TurboMind converts the checkpoint and allocates its KV cache in the
+        # same call, so no pure weight-load time is available.
+        with self.phase("engine_init"):
+            self.pipe = pipeline(model_name, backend=backend, tp=tp_size)
+        self.configure()
+
+    def configure(self) -> None:
         self.generation_kwargs = {
             "top_k": self.config.get("top_k", 1),
             "top_p": self.config.get("top_p", 0.95),
@@ -24,17 +36,62 @@ class LMDeployRunner(BenchmarkRunner):
             "max_new_tokens": self.config.get("max_new_tokens", 128),
         }
 
-    def run_once(self, prompt: str) -> Dict[str, Any]:
+    def _generation_config(self, max_new_tokens: Optional[int]) -> GenerationConfig:
+        kwargs = dict(self.generation_kwargs)
+        if max_new_tokens is not None:
+            kwargs["max_new_tokens"] = max_new_tokens
+        return GenerationConfig(**kwargs)
+
+    def run_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
         with time_it() as data:
-            response = self.pipe([prompt], **self.generation_kwargs)
-        snapshot = capture_system_snapshot()
+            response = self.pipe([prompt], gen_config=self._generation_config(max_new_tokens))
+        snapshot = capture_system_snapshot(data["start"], data["end"])
         return {
             "prompt": prompt,
             "output": response[0].text,
             "latency_ms": data["latency_ms"],
+            "prompt_tokens": getattr(response[0], "input_token_len", None),
+            "completion_tokens": getattr(response[0], "generate_token_len", None),
             "system": snapshot,
         }
 
+    def run_batch(
+        self, prompts: Sequence[str], max_new_tokens: Optional[Sequence[Optional[int]]] = None
+    ) -> List[Dict[str, Any]]:
+        if max_new_tokens is None:
+            gen_config: Any = self._generation_config(None)
+        else:
+            gen_config = [self._generation_config(limit) for limit in max_new_tokens]
+        with time_it() as data:
+            responses = self.pipe(list(prompts), gen_config=gen_config)
+        snapshot = capture_system_snapshot(data["start"], data["end"])
+        return [
+            {
+                "prompt": prompt,
+                "output": response.text,
+                "latency_ms": data["latency_ms"],
+                "batch_latency_ms": data["latency_ms"],
+                "batch_size": len(prompts),
+                "prompt_tokens": getattr(response, "input_token_len", None),
+                "completion_tokens": getattr(response, "generate_token_len", None),
+                "system": snapshot,
+            }
+            for prompt, response in zip(prompts, responses)
+        ]
+
+    def stream_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Iterator[TokenChunk]:
+        tokens_so_far = 0
+        for response in self.pipe.stream_infer([prompt], gen_config=self._generation_config(max_new_tokens)):
+            timestamp = time.perf_counter()
+            # `generate_token_len` is cumulative while `text` is the new piece.
+            yield TokenChunk(
+                text=response.text,
+                timestamp=timestamp,
+                num_tokens=response.generate_token_len - tokens_so_far,
+                prompt_tokens=response.input_token_len,
+            )
+            tokens_so_far = response.generate_token_len
+
     def teardown(self) -> None:
         if hasattr(self, "pipe"):
             self.pipe = None
@@ -0,0 +1,186 @@
+"""Benchmark runner for OpenAI-compatible HTTP endpoints."""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import httpx
+
+from inference.benchmarks.runners.base import BenchmarkRunner, TokenChunk
+from inference.benchmarks.utils.system import capture_system_snapshot, time_it
+
+ENDPOINTS = {
+    "completions": "/v1/completions",
+    "chat": "/v1/chat/completions",
+}
+_STREAM_END = object()
+
+
+def _cached_tokens(usage: Dict[str, Any]) -> Optional[int]:
+    # Only servers that run a prefix cache and report it (vLLM, SGLang, OpenAI) send this.
+    return (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+
+
+class OpenAICompatibleRunner(BenchmarkRunner):
+    """Drive a deployed vLLM/SGLang/etc. server over its OpenAI-compatible API.
+
+    Requests are issued from a single background event loop sharing one
+    keep-alive connection pool, so concurrent callers do not pay for new
+    connections or per-thread clients.
+    """
+
+    name = "openai"
+    thread_safe = True
+    request_params = ("max_new_tokens", "temperature", "top_p")
+
+    def setup(self) -> None:
+        endpoint = self.config.get("endpoint", "completions")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint `{endpoint}`; expected one of {sorted(ENDPOINTS)}")
+        self.chat = endpoint == "chat"
+        self.path = ENDPOINTS[endpoint]
+        self.model = self.config.get("model", "meta-llama/Llama-3.1-8B-Instruct")
+        max_connections = self.config.get("max_connections", 512)
+        api_key = self.config.get("api_key") or os.getenv("OPENAI_API_KEY")
+
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, name="openai-runner", daemon=True)
+        self.loop_thread.start()
+        self.client = httpx.AsyncClient(
+            base_url=self.config.get("base_url", "http://localhost:8000"),
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else None,
+            timeout=httpx.Timeout(self.config.get("timeout_s", 600.0)),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.configure()
+
+    def configure(self) -> None:
+        self.request_kwargs = {
+            "max_tokens": self.config.get("max_new_tokens", 128),
+            "temperature": self.config.get("temperature", 0.0),
+            "top_p": self.config.get("top_p", 0.95),
+        }
+
+    def _payload(self, prompt: str, stream: bool, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"model": self.model, "stream": stream, **self.request_kwargs}
+        if max_new_tokens is not None:
+            payload["max_tokens"] = max_new_tokens
+        if self.chat:
+            payload["messages"] = [{"role": "user", "content": prompt}]
+        else:
+            payload["prompt"] = prompt
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _submit(self, coro: Any) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _complete(self, prompt: str, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
+        start = time.perf_counter()
+        response = await self.client.post(self.path, json=self._payload(prompt, False, max_new_tokens))
+        response.raise_for_status()
+        latency_ms = (time.perf_counter() - start) * 1000
+        body = response.json()
+        choice = body["choices"][0]
+        usage = body.get("usage") or {}
+        return {
+            "prompt": prompt,
+            "output": choice["message"]["content"] if self.chat else choice["text"],
+            "latency_ms": latency_ms,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "cached_prompt_tokens": _cached_tokens(usage),
+            "completion_tokens": usage.get("completion_tokens"),
+        }
+
+    async def _stream(self, prompt: str, max_new_tokens: Optional[int], sink: "queue.Queue[Any]") -> None:
+        tokens_seen = 0
+        # The latest text chunk is held back until the next event, so tokens the
+        # final usage report adds can be credited to it instead of arriving as
+        # a separate, zero-latency chunk.
+        held: Optional[TokenChunk] = None
+        try:
+            async with self.client.stream("POST", self.path, json=self._payload(prompt, True, max_new_tokens)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    timestamp = time.perf_counter()
+                    event = json.loads(data)
+                    usage = event.get("usage")
+                    if event.get("choices"):
+                        choice = event["choices"][0]
+                        text = (choice.get("delta") or {}).get("content") if self.chat else choice.get("text")
+                        if text:
+                            tokens_seen += 1
+                            if held is not None:
+                                sink.put(held)
+                            held = TokenChunk(text=text, timestamp=timestamp)
+                    if usage:
+                        # Servers may pack several tokens into one event; the
+                        # final usage report settles the exact count.
+                        extra = max(0, (usage.get("completion_tokens") or 0) - tokens_seen)
+                        if held is not None:
+                            held.num_tokens += extra
+                            sink.put(held)
+                            held, extra = None, 0
+                        sink.put(
+                            TokenChunk(
+                                text="",
+                                timestamp=timestamp,
+                                num_tokens=extra,
+                                prompt_tokens=usage.get("prompt_tokens"),
+                                cached_tokens=_cached_tokens(usage),
+                            )
+                        )
+            if held is not None:
+                sink.put(held)
+        except BaseException as exc:  # noqa: BLE001 - re-raised in the consuming thread
+            sink.put(exc)
+        finally:
+            sink.put(_STREAM_END)
+
+    def run_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
+        with time_it() as data:
+            sample = self._submit(self._complete(prompt, max_new_tokens))
+        sample["system"] = capture_system_snapshot(data["start"], data["end"])
+        return sample
+
+    def run_batch(
+        self, prompts: Sequence[str], max_new_tokens: Optional[Sequence[Optional[int]]] = None
+    ) -> List[Dict[str, Any]]:
+        limits = max_new_tokens if max_new_tokens is not None else [None] * len(prompts)
+
+        async def gather() -> List[Dict[str, Any]]:
+            return await asyncio.gather(*(self._complete(prompt, limit) for prompt, limit in zip(prompts, limits)))
+
+        with time_it() as data:
+            samples = self._submit(gather())
+        snapshot = capture_system_snapshot(data["start"], data["end"])
+        for sample in samples:
+            sample.update({"batch_latency_ms": data["latency_ms"], "batch_size": len(prompts), "system": snapshot})
+        return samples
+
+    def stream_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Iterator[TokenChunk]:
+        sink: "queue.Queue[Any]" = queue.Queue()
+        asyncio.run_coroutine_threadsafe(self._stream(prompt, max_new_tokens, sink), self.loop)
+        while (item := sink.get()) is not _STREAM_END:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def teardown(self) -> None:
+        if hasattr(self, "loop"):
+            self._submit(self.client.aclose())
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop_thread.join()
+            self.loop.close()
+            self.client = None
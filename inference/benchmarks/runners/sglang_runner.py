@@ -1,42 +1,110 @@
 """SGLang benchmark runner."""
 from __future__ import annotations
 
-from typing import Any, Dict
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
 
 import sglang as sgl
 
-from inference.benchmarks.runners.base import BenchmarkRunner
+from inference.benchmarks.runners.base import BenchmarkRunner, TokenChunk
 from inference.benchmarks.utils.system import capture_system_snapshot, time_it
+from inference.benchmarks.utils.weights import fetch_weights, weight_bytes
 
 
 class SGLangRunner(BenchmarkRunner):
     name = "sglang"
+    request_params = ("temperature", "max_new_tokens")
 
     def setup(self) -> None:
         model_name = self.config.get("model", "meta-llama/Llama-3.1-8B-Instruct")
         tp_size = self.config.get("tensor_parallel_size", 1)
-        self.session = sgl.Engine(model=model_name, tensor_parallel_size=tp_size)
-        self.generator = sgl.Generator(self.session)
+        # Extra `sgl.Engine` arguments, e.g. mem_fraction_static or max_running_requests.
+        engine_kwargs = self.config.get("engine_args", {})
+        with self.phase("weight_download"):
+            weights_dir = fetch_weights(model_name)
+        self.startup["weight_bytes"] = weight_bytes(weights_dir)
+        # Weight loading, memory pool allocation and CUDA graph capture happen
+        # in one call, so no pure weight-load time is available.
+        with self.phase("engine_init"):
+            self.session = sgl.Engine(model=model_name, tensor_parallel_size=tp_size, **engine_kwargs)
+        self.configure()
+
+    def configure(self) -> None:
         self.max_new_tokens = self.config.get("max_new_tokens", 128)
         self.temperature = self.config.get("temperature", 0.0)
 
-    def run_once(self, prompt: str) -> Dict[str, Any]:
+    def _sampling_params(self, max_new_tokens: Optional[int]) -> Dict[str, Any]:
+        return {
+            "temperature": self.temperature,
+            "max_new_tokens": max_new_tokens if max_new_tokens is not None else self.max_new_tokens,
+        }
+
+    def run_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
         with time_it() as data:
-            output = self.generator.generate(
-                prompt,
-                sampling_params={
-                    "temperature": self.temperature,
-                    "max_new_tokens": self.max_new_tokens,
-                },
-            )
-        snapshot = capture_system_snapshot()
+            output = self.session.generate(prompt, sampling_params=self._sampling_params(max_new_tokens))
+        snapshot = capture_system_snapshot(data["start"], data["end"])
+        meta = output.get("meta_info", {})
         return {
             "prompt": prompt,
-            "output": output.text,
+            "output": output.get("text", ""),
             "latency_ms": data["latency_ms"],
+            "prompt_tokens": meta.get("prompt_tokens"),
+            "cached_prompt_tokens": meta.get("cached_tokens"),
+            "completion_tokens": meta.get("completion_tokens"),
             "system": snapshot,
         }
 
+    def run_batch(
+        self, prompts: Sequence[str], max_new_tokens: Optional[Sequence[Optional[int]]] = None
+    ) -> List[Dict[str, Any]]:
+        limits = max_new_tokens if max_new_tokens is not None else [None] * len(prompts)
+        sampling_params = [self._sampling_params(limit) for limit in limits]
+        with time_it() as data:
+            outputs = self.session.generate(list(prompts), sampling_params=sampling_params)
+        snapshot = capture_system_snapshot(data["start"], data["end"])
+        samples = []
+        for prompt, output in zip(prompts, outputs):
+            meta = output.get("meta_info", {})
+            samples.append(
+                {
+                    "prompt": prompt,
+                    "output": output.get("text", ""),
+                    # SGLang reports no per-request timings for offline batches.
+                    "latency_ms": data["latency_ms"],
+                    "batch_latency_ms": data["latency_ms"],
+                    "batch_size": len(prompts),
+                    "prompt_tokens": meta.get("prompt_tokens"),
+                    "cached_prompt_tokens": meta.get("cached_tokens"),
+                    "completion_tokens": meta.get("completion_tokens"),
+                    "system": snapshot,
+                }
+            )
+        return samples
+
+    def stream_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Iterator[TokenChunk]:
+        stream = self.session.generate(prompt, sampling_params=self._sampling_params(max_new_tokens), stream=True)
+        text_so_far = ""
+        tokens_so_far = 0
+        for chunk in stream:
+            timestamp = time.perf_counter()
+            text = chunk.get("text", "")
+            meta = chunk.get("meta_info", {})
+            # Depending on the server options SGLang streams either the
+            # cumulative text or only the newly decoded piece.
+            if text.startswith(text_so_far):
+                delta, text_so_far = text[len(text_so_far):], text
+            else:
+                delta, text_so_far = text, text_so_far + text
+            completion_tokens = meta.get("completion_tokens", tokens_so_far + 1)
+            yield TokenChunk(
+                text=delta,
+                timestamp=timestamp,
+                num_tokens=completion_tokens - tokens_so_far,
+                prompt_tokens=meta.get("prompt_tokens"),
+                cached_tokens=meta.get("cached_tokens"),
+            )
+            tokens_so_far = completion_tokens
+
     def teardown(self) -> None:
         if hasattr(self, "session"):
             shutdown = getattr(self.session, "shutdown", None)
@@ -1,17 +1,21 @@
 """TensorRT-LLM benchmark runner."""
 from __future__ import annotations
 
-from typing import Any, Dict
+from pathlib import Path
+from typing import Any, Dict, Optional
 
 from tensorrt_llm.runtime import ModelConfig, SamplingConfig
 from tensorrt_llm.runtime.engine import LlmEngine
 
 from inference.benchmarks.runners.base import BenchmarkRunner
 from inference.benchmarks.utils.system import capture_system_snapshot, time_it
+from inference.benchmarks.utils.weights import weight_bytes
 
 
 class TensorRTLLMRunner(BenchmarkRunner):
     name = "tensorrt-llm"
+    # `max_new_tokens` sizes the engine's `max_output_len`, so it is not reusable.
+    request_params = ("temperature", "top_p")
 
     def setup(self) -> None:
         engine_dir = self.config.get("engine_dir")
@@ -24,16 +28,27 @@ class TensorRTLLMRunner(BenchmarkRunner):
             max_input_len=self.config.get("max_input_len", 2048),
             max_output_len=self.config.get("max_new_tokens", 128),
         )
-        self.sampling_config = SamplingConfig(
-            temperature=self.config.get("temperature", 0.0),
-            top_p=self.config.get("top_p", 0.95),
-        )
-        self.engine = LlmEngine.from_dir(engine_dir, model_config=model_config)
+        self.startup["weight_bytes"] = weight_bytes(Path(engine_dir))
+        # Deserializes the prebuilt engine, weights included.
+        with self.phase("weight_load"):
+            self.engine = LlmEngine.from_dir(engine_dir, model_config=model_config)
+        self.configure()
+
+    def configure(self) -> None:
+        self.sampling_kwargs = {
+            "temperature": self.config.get("temperature", 0.0),
+            "top_p": self.config.get("top_p", 0.95),
+        }
+        self.sampling_config = SamplingConfig(**self.sampling_kwargs)
 
-    def run_once(self, prompt: str) -> Dict[str, Any]:
+    def run_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
+        sampling_config = self.sampling_config
+        if max_new_tokens is not None:
+            # Requests may ask for fewer tokens than the engine's `max_output_len`, never more.
+            sampling_config = SamplingConfig(**self.sampling_kwargs, max_new_tokens=max_new_tokens)
         with time_it() as data:
-            outputs = self.engine.generate(prompt, sampling_config=self.sampling_config)
-        snapshot = capture_system_snapshot()
+            outputs = self.engine.generate(prompt, sampling_config=sampling_config)
+        snapshot = capture_system_snapshot(data["start"], data["end"])
         return {
             "prompt": prompt,
             "output": outputs[0],
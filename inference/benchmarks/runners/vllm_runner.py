@@ -1,38 +1,100 @@
 """vLLM benchmark runner."""
 from __future__ import annotations
 
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Sequence
 
 from vllm import LLM, SamplingParams
 
 from inference.benchmarks.runners.base import BenchmarkRunner
 from inference.benchmarks.utils.system import capture_system_snapshot, time_it
+from inference.benchmarks.utils.weights import fetch_weights, weight_bytes
 
 
 class VLLMRunner(BenchmarkRunner):
     name = "vllm"
+    request_params = ("temperature", "top_p", "max_new_tokens")
 
     def setup(self) -> None:
         model_name = self.config.get("model", "meta-llama/Llama-3.1-8B-Instruct")
         tensor_parallel_size = self.config.get("tensor_parallel_size", 1)
-        self.sampling_params = SamplingParams(
-            temperature=self.config.get("temperature", 0.0),
-            top_p=self.config.get("top_p", 0.95),
-            max_tokens=self.config.get("max_new_tokens", 128),
-        )
-        self.llm = LLM(model=model_name, tensor_parallel_size=tensor_parallel_size)
-
-    def run_once(self, prompt: str) -> Dict[str, Any]:
+        # Extra `LLM` constructor arguments, e.g. gpu_memory_utilization or max_num_seqs.
+        engine_kwargs = dict(self.config.get("engine_args", {}))
+        if "enable_prefix_caching" in self.config:
+            engine_kwargs["enable_prefix_caching"] = self.config["enable_prefix_caching"]
+        with self.phase("weight_download"):
+            weights_dir = fetch_weights(model_name)
+        self.startup["weight_bytes"] = weight_bytes(weights_dir)
+        # `LLM` loads weights, profiles and allocates the KV cache and captures
+        # CUDA graphs in one call, so no pure weight-load time is available.
+        with self.phase("engine_init"):
+            self.llm = LLM(model=model_name, tensor_parallel_size=tensor_parallel_size, **engine_kwargs)
+        self.configure()
+
+    def configure(self) -> None:
+        self.sampling_kwargs = {
+            "temperature": self.config.get("temperature", 0.0),
+            "top_p": self.config.get("top_p", 0.95),
+            "max_tokens": self.config.get("max_new_tokens", 128),
+        }
+        self.sampling_params = SamplingParams(**self.sampling_kwargs)
+
+    def _sampling_params(self, max_new_tokens: Optional[int]) -> SamplingParams:
+        if max_new_tokens is None:
+            return self.sampling_params
+        return SamplingParams(**{**self.sampling_kwargs, "max_tokens": max_new_tokens})
+
+    def run_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
         with time_it() as data:
-            outputs = self.llm.generate(prompt, self.sampling_params)
-        snapshot = capture_system_snapshot()
+            outputs = self.llm.generate(prompt, self._sampling_params(max_new_tokens))
+        snapshot = capture_system_snapshot(data["start"], data["end"])
+        metrics = getattr(outputs[0], "metrics", None) if outputs else None
+        first_token = getattr(metrics, "first_token_time", None)
+        arrival = getattr(metrics, "arrival_time", None)
         return {
             "prompt": prompt,
             "output": outputs[0].outputs[0].text if outputs else "",
             "latency_ms": data["latency_ms"],
+            "ttft_ms": (first_token - arrival) * 1000 if first_token and arrival else None,
+            "prompt_tokens": len(outputs[0].prompt_token_ids) if outputs else None,
+            "cached_prompt_tokens": getattr(outputs[0], "num_cached_tokens", None) if outputs else None,
+            "completion_tokens": len(outputs[0].outputs[0].token_ids) if outputs else None,
             "system": snapshot,
         }
 
+    def run_batch(
+        self, prompts: Sequence[str], max_new_tokens: Optional[Sequence[Optional[int]]] = None
+    ) -> List[Dict[str, Any]]:
+        if max_new_tokens is None:
+            sampling_params: Any = self.sampling_params
+        else:
+            sampling_params = [self._sampling_params(limit) for limit in max_new_tokens]
+        with time_it() as data:
+            outputs = self.llm.generate(list(prompts), sampling_params)
+        snapshot = capture_system_snapshot(data["start"], data["end"])
+        samples = []
+        for prompt, output in zip(prompts, outputs):
+            # Per-request timings are only populated when vLLM collects stats;
+            # otherwise every request is charged the latency of the whole batch.
+            metrics = getattr(output, "metrics", None)
+            finished = getattr(metrics, "finished_time", None)
+            first_token = getattr(metrics, "first_token_time", None)
+            arrival = getattr(metrics, "arrival_time", None)
+            samples.append(
+                {
+                    "prompt": prompt,
+                    "output": output.outputs[0].text,
+                    "latency_ms": (finished - arrival) * 1000 if finished and arrival else data["latency_ms"],
+                    "ttft_ms": (first_token - arrival) * 1000 if first_token and arrival else None,
+                    "batch_latency_ms": data["latency_ms"],
+                    "batch_size": len(prompts),
+                    "prompt_tokens": len(output.prompt_token_ids),
+                    "cached_prompt_tokens": getattr(output, "num_cached_tokens", None),
+                    "completion_tokens": len(output.outputs[0].token_ids),
+                    "system": snapshot,
+                }
+            )
+        return samples
+
     def teardown(self) -> None:
         if hasattr(self, "llm"):
             self.llm = None
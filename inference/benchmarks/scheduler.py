@@ -0,0 +1,172 @@
+"""Run benchmark suites in isolated subprocesses packed onto GPUs."""
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import traceback
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+SampleWriter = Callable[[Dict[str, Any]], None]
+
+
+def devices_required(suite: Dict[str, Any]) -> int:
+    """GPUs a suite needs: ``num_gpus`` if set, else its ``tensor_parallel_size``."""
+    if "num_gpus" in suite:
+        return int(suite["num_gpus"])
+    return int(suite.get("params", {}).get("tensor_parallel_size", 1))
+
+
+def visible_devices() -> List[str]:
+    """Device ids available to this process, honoring ``CUDA_VISIBLE_DEVICES``."""
+    env = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if env is not None:
+        return [device.strip() for device in env.split(",") if device.strip()]
+    from inference.benchmarks.utils.system import get_nvml_session
+
+    return [str(idx) for idx in range(get_nvml_session().device_count)]
+
+
+def _suite_worker(
+    conn: Connection,
+    suite: Dict[str, Any],
+    devices: Sequence[str],
+    record_samples: bool,
+    system_sample_interval: float,
+    profile_dir: Optional[Path],
+) -> None:
+    # Must happen before any CUDA-aware import in this fresh interpreter.
+    os.environ["CUDA_VISIBLE_DEVICES"] = ",".join(devices)
+    try:
+        from inference.benchmarks.run_benchmarks import run_suite
+        from inference.benchmarks.utils.system import start_system_sampler, stop_system_sampler
+
+        if system_sample_interval > 0:
+            start_system_sampler(interval=system_sample_interval)
+        writer = (lambda sample: conn.send(("sample", sample))) if record_samples else None
+        try:
+            summary = run_suite(suite, sample_writer=writer, profile_dir=profile_dir)
+        finally:
+            stop_system_sampler()
+        conn.send(("result", summary))
+    except BaseException:  # noqa: BLE001 - reported to the parent
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+@dataclass
+class _Running:
+    index: int
+    suite: Dict[str, Any]
+    devices: List[str]
+    process: Any
+    conn: Connection
+    writer: Optional[SampleWriter]
+    outcome: Optional[Tuple[str, Any]] = field(default=None)
+
+
+class SuiteScheduler:
+    """Packs suites onto free GPUs and runs each in its own spawned process.
+
+    Each suite receives a ``CUDA_VISIBLE_DEVICES`` slice sized by
+    ``devices_required`` and suites run concurrently while devices remain.
+    Pending suites are started in order whenever they fit, so smaller suites
+    can fill devices left idle by larger ones. Results and streamed samples
+    come back over a pipe; a crashing suite is reported without affecting
+    the others. ``devices`` may be simulated ids for CPU-only testing.
+    """
+
+    def __init__(
+        self,
+        devices: Sequence[str],
+        max_parallel: Optional[int] = None,
+        system_sample_interval: float = 0.0,
+        start_method: str = "spawn",
+        profile_dir: Optional[Path] = None,
+    ):
+        if max_parallel is not None and max_parallel < 1:
+            raise ValueError("`max_parallel` must be at least 1")
+        self.devices = list(devices)
+        if not self.devices:
+            raise ValueError("No devices to schedule suites on; set CUDA_VISIBLE_DEVICES or pass simulated device ids")
+        self.max_parallel = max_parallel
+        self.system_sample_interval = system_sample_interval
+        self.profile_dir = profile_dir
+        self.context = mp.get_context(start_method)
+
+    def run(
+        self,
+        suites: Sequence[Tuple[int, Dict[str, Any]]],
+        on_start: Callable[[int, Dict[str, Any]], Optional[SampleWriter]],
+        on_complete: Callable[[int, Dict[str, Any], Dict[str, Any]], None],
+    ) -> Dict[int, str]:
+        """Run ``(index, suite)`` pairs; return tracebacks of failed suites by index.
+
+        ``on_start`` is called as each suite launches and may return a writer
+        for its streamed samples. ``on_complete`` receives each summary.
+        """
+        failures: Dict[int, str] = {}
+        pending = list(suites)
+        for index, suite in list(pending):
+            if devices_required(suite) > len(self.devices):
+                failures[index] = (
+                    f"Suite requires {devices_required(suite)} GPUs but only {len(self.devices)} are available"
+                )
+                pending.remove((index, suite))
+
+        free = list(self.devices)
+        running: List[_Running] = []
+        while pending or running:
+            for index, suite in list(pending):
+                if self.max_parallel is not None and len(running) >= self.max_parallel:
+                    break
+                needed = devices_required(suite)
+                if needed > len(free):
+                    continue
+                devices, free = free[:needed], free[needed:]
+                running.append(self._launch(index, suite, devices, on_start(index, suite)))
+                pending.remove((index, suite))
+
+            ready = wait([job.conn for job in running])
+            for job in [job for job in running if job.conn in ready]:
+                self._drain(job)
+                if job.outcome is None:
+                    continue
+                job.process.join()
+                job.conn.close()
+                running.remove(job)
+                free = sorted(free + job.devices, key=self.devices.index)
+                status, payload = job.outcome
+                if status == "result":
+                    on_complete(job.index, job.suite, payload)
+                else:
+                    failures[job.index] = payload
+        return failures
+
+    def _launch(self, index: int, suite: Dict[str, Any], devices: List[str], writer: Optional[SampleWriter]) -> _Running:
+        parent_conn, child_conn = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=_suite_worker,
+            args=(child_conn, suite, devices, writer is not None, self.system_sample_interval, self.profile_dir),
+            name=f"benchmark-suite-{index}",
+        )
+        process.start()
+        child_conn.close()
+        return _Running(index=index, suite=suite, devices=devices, process=process, conn=parent_conn, writer=writer)
+
+    def _drain(self, job: _Running) -> None:
+        try:
+            while job.conn.poll():
+                kind, payload = job.conn.recv()
+                if kind == "sample":
+                    if job.writer is not None:
+                        job.writer(payload)
+                else:
+                    job.outcome = (kind, payload)
+                    return
+        except EOFError:
+            job.process.join()
+            job.outcome = ("error", f"Suite process exited with code {job.process.exitcode} before reporting results")
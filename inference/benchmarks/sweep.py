@@ -0,0 +1,159 @@
+"""Parameter sweeps over suite definitions and Pareto frontier reporting.
+
+A suite with a ``sweep`` block stands for a family of suites, one per point
+of the sweep. Axes are dotted paths into the suite (``load.concurrency``,
+``params.engine_args.gpu_memory_utilization``); a bare name such as
+``max_new_tokens`` refers to ``params`` unless it is one of ``SUITE_KEYS`` or
+``LOAD_KEYS``. Points are generated one at a time, so random and Latin
+hypercube sampling never enumerate the full grid; the points drawn are still
+collected into a list by ``run_benchmarks`` to group suites by engine.
+"""
+from __future__ import annotations
+
+import copy
+import math
+import random
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SWEEP_STRATEGIES = ("grid", "random", "lhs")
+# Suite-level settings a bare axis name refers to instead of ``params``.
+SUITE_KEYS = ("batch_size", "repetitions", "streaming", "num_gpus")
+# Load-generation settings a bare axis name refers to (see ``LoadConfig``).
+LOAD_KEYS = ("concurrency", "qps", "arrival")
+
+
+def _axis_path(axis: str) -> List[str]:
+    if "." in axis:
+        return axis.split(".")
+    if axis in SUITE_KEYS:
+        return [axis]
+    if axis in LOAD_KEYS:
+        return ["load", axis]
+    return ["params", axis]
+
+
+def _set_path(suite: Dict[str, Any], path: Sequence[str], value: Any) -> None:
+    node = suite
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
+
+
+def _decode(index: int, sizes: Sequence[int]) -> Tuple[int, ...]:
+    """Mixed-radix digits of ``index``: the grid point it numbers."""
+    digits = []
+    for size in reversed(sizes):
+        index, digit = divmod(index, size)
+        digits.append(digit)
+    return tuple(reversed(digits))
+
+
+def sweep_points(
+    levels: Sequence[Sequence[Any]],
+    strategy: str = "grid",
+    samples: Optional[int] = None,
+    seed: int = 0,
+) -> Iterator[Tuple[int, ...]]:
+    """Yield level indices per axis for each point of the sweep.
+
+    ``grid`` enumerates the cartesian product. ``random`` draws ``samples``
+    distinct grid points. ``lhs`` draws a Latin hypercube: every axis is cut
+    into ``samples`` equal strata that are each used once, so all levels are
+    covered evenly even when ``samples`` is far below the grid size;
+    duplicate points are dropped.
+    """
+    sizes = [len(values) for values in levels]
+    total = math.prod(sizes)
+    if strategy == "grid":
+        for index in range(total):
+            yield _decode(index, sizes)
+        return
+    rng = random.Random(seed)
+    if strategy == "random":
+        # Sampling from a range does not build the grid.
+        for index in rng.sample(range(total), min(samples, total)):
+            yield _decode(index, sizes)
+        return
+    strata = []
+    for _ in sizes:
+        order = list(range(samples))
+        rng.shuffle(order)
+        strata.append(order)
+    seen = set()
+    for sample in range(samples):
+        point = tuple(
+            min(int((order[sample] + rng.random()) / samples * size), size - 1)
+            for order, size in zip(strata, sizes)
+        )
+        if point not in seen:
+            seen.add(point)
+            yield point
+
+
+def expand_sweep(suite: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield the concrete suites described by ``suite``; suites without a ``sweep`` pass through.
+
+    Each expanded suite records its coordinates under ``sweep_point``.
+    """
+    if "sweep" not in suite:
+        yield suite
+        return
+    sweep = suite["sweep"]
+    strategy = sweep.get("strategy", "grid")
+    if strategy not in SWEEP_STRATEGIES:
+        raise ValueError(f"Unknown sweep strategy `{strategy}`; expected one of {SWEEP_STRATEGIES}")
+    axes = sweep.get("axes") or {}
+    if not axes or not all(isinstance(values, list) and values for values in axes.values()):
+        raise ValueError("`sweep.axes` must map each axis to a non-empty list of values")
+    samples = sweep.get("samples")
+    if strategy != "grid" and (not isinstance(samples, int) or samples < 1):
+        raise ValueError(f"Sweep strategy `{strategy}` requires a positive integer `samples`")
+    base = {key: value for key, value in suite.items() if key != "sweep"}
+    names = list(axes)
+    levels = [axes[name] for name in names]
+    for point in sweep_points(levels, strategy, samples, seed=sweep.get("seed", 0)):
+        expanded = copy.deepcopy(base)
+        coordinates = {}
+        for name, values, level in zip(names, levels, point):
+            _set_path(expanded, _axis_path(name), values[level])
+            coordinates[name] = values[level]
+        expanded["sweep_point"] = coordinates
+        yield expanded
+
+
+def pareto_frontier(points: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Points not dominated on higher ``output_tokens_per_s`` and lower ``p99_latency_ms``."""
+    frontier = []
+    best_latency = math.inf
+    for point in sorted(points, key=lambda point: (-point["output_tokens_per_s"], point["p99_latency_ms"])):
+        if point["p99_latency_ms"] < best_latency:
+            frontier.append(point)
+            best_latency = point["p99_latency_ms"]
+    return frontier
+
+
+def pareto_report(summaries: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-runner Pareto frontier of output tokens/s against p99 request latency.
+
+    Suites lacking either measurement (e.g. runners that do not report
+    completion tokens) are left out.
+    """
+    by_runner: Dict[str, List[Dict[str, Any]]] = {}
+    for summary in summaries:
+        throughput = (summary.get("throughput") or {}).get("output_tokens_per_s")
+        latency = (summary["results"].get("latency_ms") or {}).get("p99")
+        if throughput is None or latency is None:
+            continue
+        by_runner.setdefault(summary["runner"], []).append(
+            {
+                "suite_hash": summary.get("suite_hash"),
+                "sweep_point": summary.get("sweep_point"),
+                "config": summary.get("config", {}),
+                "output_tokens_per_s": throughput,
+                "p99_latency_ms": latency,
+            }
+        )
+    return {
+        runner: {"num_suites": len(points), "frontier": pareto_frontier(points)}
+        for runner, points in sorted(by_runner.items())
+    }
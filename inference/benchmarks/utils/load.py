@@ -0,0 +1,329 @@
+"""Load generation helpers for concurrent benchmarking."""
+from __future__ import annotations
+
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+# Requests are opaque to the load generator: a prompt string or a workload request.
+RequestFn = Callable[[Any], Dict[str, Any]]
+BatchFn = Callable[[Sequence[Any]], List[Dict[str, Any]]]
+SampleFn = Callable[[Dict[str, Any]], None]
+
+LOAD_MODES = ("closed", "open")
+ARRIVAL_PROCESSES = ("poisson", "constant")
+DEFAULT_OPEN_LOOP_CONCURRENCY = 256
+
+
+@dataclass
+class LoadConfig:
+    """Per-suite load-generation settings.
+
+    ``closed`` keeps ``concurrency`` requests in flight at all times. ``open``
+    issues requests at ``qps`` following a Poisson or constant arrival process,
+    with at most ``concurrency`` requests executing at once; requests that
+    arrive while all workers are busy accumulate queueing delay.
+    """
+
+    mode: str = "closed"
+    concurrency: Optional[int] = None
+    qps: Optional[float] = None
+    arrival: str = "poisson"
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LoadConfig":
+        cfg = cls(**data)
+        if cfg.mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode `{cfg.mode}`; expected one of {LOAD_MODES}")
+        if cfg.arrival not in ARRIVAL_PROCESSES:
+            raise ValueError(f"Unknown arrival process `{cfg.arrival}`; expected one of {ARRIVAL_PROCESSES}")
+        if cfg.mode == "open" and not cfg.qps:
+            raise ValueError("Open-loop load requires a positive `qps`")
+        if cfg.concurrency is not None and cfg.concurrency < 1:
+            raise ValueError("`concurrency` must be at least 1")
+        return cfg
+
+    @property
+    def max_in_flight(self) -> int:
+        if self.concurrency is not None:
+            return self.concurrency
+        return 1 if self.mode == "closed" else DEFAULT_OPEN_LOOP_CONCURRENCY
+
+
+def arrival_offsets(qps: float, arrival: str, rng: random.Random) -> Iterator[float]:
+    """Yield request send times in seconds relative to the start of the run."""
+    offset = 0.0
+    while True:
+        yield offset
+        offset += rng.expovariate(qps) if arrival == "poisson" else 1.0 / qps
+
+
+def _timed_request(request_fn: RequestFn, prompt: str, scheduled: float, origin: float) -> Dict[str, Any]:
+    started = time.perf_counter()
+    sample = request_fn(prompt)
+    finished = time.perf_counter()
+    sample["queue_delay_ms"] = max(0.0, started - scheduled) * 1000
+    sample["end_to_end_ms"] = (finished - scheduled) * 1000
+    sample["start_offset_s"] = started - origin
+    return sample
+
+
+def _run_chain(request_fn: RequestFn, chain: Sequence[Any], scheduled: float, origin: float, on_sample: SampleFn) -> None:
+    """Send ``chain``'s requests in order, each as soon as the previous one completes."""
+    for request in chain:
+        on_sample(_timed_request(request_fn, request, scheduled, origin))
+        scheduled = time.perf_counter()
+
+
+def run_closed_loop(
+    request_fn: RequestFn, prompts: Iterable[Any], concurrency: int, on_sample: SampleFn, chained: bool = False
+) -> int:
+    """Keep ``concurrency`` workers busy until ``prompts`` is exhausted.
+
+    With ``chained`` every item is a sequence of dependent requests (e.g. the
+    turns of a conversation) that one worker sends in order; ``concurrency``
+    then counts chains in flight. Returns the number of completed requests.
+    """
+    prompt_iter = iter(prompts)
+    iter_lock = threading.Lock()
+    sample_lock = threading.Lock()
+    stop = threading.Event()
+    origin = time.perf_counter()
+    completed = [0]
+
+    def record(sample: Dict[str, Any]) -> None:
+        with sample_lock:
+            on_sample(sample)
+            completed[0] += 1
+
+    def worker() -> None:
+        while not stop.is_set():
+            with iter_lock:
+                item = next(prompt_iter, None)
+            if item is None:
+                return
+            try:
+                _run_chain(request_fn, item if chained else [item], time.perf_counter(), origin, record)
+            except BaseException:
+                stop.set()
+                raise
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="closed-loop") as pool:
+        futures = [pool.submit(worker) for _ in range(concurrency)]
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in done:
+            future.result()
+    return completed[0]
+
+
+def run_open_loop(
+    request_fn: RequestFn,
+    prompts: Iterable[Any],
+    qps: float,
+    arrival: str,
+    max_in_flight: int,
+    on_sample: SampleFn,
+    seed: Optional[int] = None,
+    chained: bool = False,
+) -> int:
+    """Dispatch ``prompts`` on an arrival schedule independent of completions.
+
+    With ``chained`` the schedule sets when each chain starts; its later
+    requests follow their predecessors' completions, so ``qps`` is the chain
+    arrival rate. Returns the number of completed requests.
+    """
+    rng = random.Random(seed)
+    sample_lock = threading.Lock()
+    errors: List[BaseException] = []
+    origin = time.perf_counter()
+    completed = [0]
+
+    def record(sample: Dict[str, Any]) -> None:
+        with sample_lock:
+            on_sample(sample)
+            completed[0] += 1
+
+    def task(item: Any, scheduled: float) -> None:
+        try:
+            _run_chain(request_fn, item if chained else [item], scheduled, origin, record)
+        except BaseException as exc:
+            errors.append(exc)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="open-loop") as pool:
+        for item, offset in zip(prompts, arrival_offsets(qps, arrival, rng)):
+            if errors:
+                break
+            scheduled = origin + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(task, item, scheduled)
+    if errors:
+        raise errors[0]
+    return completed[0]
+
+
+def generate_load(
+    request_fn: RequestFn, prompts: Iterable[Any], config: LoadConfig, on_sample: SampleFn, chained: bool = False
+) -> Dict[str, Any]:
+    """Drive ``request_fn`` according to ``config`` and summarize achieved load.
+
+    ``chained`` items are sequences of requests sent one after another; see
+    ``run_closed_loop`` and ``run_open_loop``.
+    """
+    start = time.perf_counter()
+    if config.mode == "closed":
+        completed = run_closed_loop(request_fn, prompts, config.max_in_flight, on_sample, chained=chained)
+    else:
+        completed = run_open_loop(
+            request_fn,
+            prompts,
+            qps=config.qps,
+            arrival=config.arrival,
+            max_in_flight=config.max_in_flight,
+            on_sample=on_sample,
+            seed=config.seed,
+            chained=chained,
+        )
+    duration_s = time.perf_counter() - start
+    return {
+        "mode": config.mode,
+        "concurrency": config.max_in_flight,
+        "arrival": config.arrival if config.mode == "open" else None,
+        "target_qps": config.qps if config.mode == "open" else None,
+        "num_requests": completed,
+        "duration_s": duration_s,
+        "achieved_qps": completed / duration_s if duration_s > 0 else None,
+    }
+
+
+class _PendingRequest:
+    __slots__ = ("request", "enqueued", "done", "sample", "error")
+
+    def __init__(self, request: Any):
+        self.request = request
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.sample: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class RequestCoalescer:
+    """Funnel concurrent requests into ``batch_fn`` calls made from one thread.
+
+    Lets load generation drive runners whose engine is not thread-safe: each
+    caller blocks until its sample is ready, while a single dispatcher thread
+    submits everything that queued up during the previous call (at most
+    ``max_batch_size`` requests) as one batch. Engines with native batching
+    thus see the offered concurrency. Samples gain ``batch_wait_ms``, the time
+    a request waited for the dispatcher.
+    """
+
+    def __init__(self, batch_fn: BatchFn, max_batch_size: Optional[int] = None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self._queue: "queue.Queue[Optional[_PendingRequest]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "RequestCoalescer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="request-coalescer", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def __call__(self, request: Any) -> Dict[str, Any]:
+        pending = _PendingRequest(request)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.sample
+
+    def _next_batch(self) -> Optional[List[_PendingRequest]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        while self.max_batch_size is None or len(batch) < self.max_batch_size:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                # Finish this batch, then stop.
+                self._queue.put(None)
+                break
+            batch.append(pending)
+        return batch
+
+    def _loop(self) -> None:
+        while (batch := self._next_batch()) is not None:
+            dispatched = time.perf_counter()
+            try:
+                samples = self.batch_fn([pending.request for pending in batch])
+                if len(samples) != len(batch):
+                    raise RuntimeError(f"Batch of {len(batch)} requests returned {len(samples)} samples")
+                for pending, sample in zip(batch, samples):
+                    sample["batch_wait_ms"] = (dispatched - pending.enqueued) * 1000
+                    pending.sample = sample
+            except BaseException as exc:  # noqa: BLE001 - re-raised in each caller
+                for pending in batch:
+                    pending.error = exc
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def __enter__(self) -> "RequestCoalescer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        self.close()
+
+
+def iter_batches(prompts: Iterable[str], batch_size: Union[int, str]) -> Iterator[List[str]]:
+    """Group ``prompts`` into lists of ``batch_size``; ``"all"`` yields a single batch."""
+    if batch_size == "all":
+        batch = list(prompts)
+        if batch:
+            yield batch
+        return
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError("`batch_size` must be a positive integer or `all`")
+    prompt_iter = iter(prompts)
+    while batch := list(islice(prompt_iter, batch_size)):
+        yield batch
+
+
+def run_batches(batch_fn: BatchFn, prompts: Iterable[str], batch_size: Union[int, str], on_sample: SampleFn) -> Dict[str, Any]:
+    """Submit ``prompts`` in batches and summarize aggregate throughput."""
+    num_batches = 0
+    num_requests = 0
+    completion_tokens = 0
+    start = time.perf_counter()
+    for batch in iter_batches(prompts, batch_size):
+        for sample in batch_fn(batch):
+            completion_tokens += sample.get("completion_tokens") or 0
+            num_requests += 1
+            on_sample(sample)
+        num_batches += 1
+    duration_s = time.perf_counter() - start
+    return {
+        "batch_size": batch_size,
+        "num_batches": num_batches,
+        "num_requests": num_requests,
+        "duration_s": duration_s,
+        "requests_per_s": num_requests / duration_s if duration_s > 0 else None,
+        "output_tokens_per_s": completion_tokens / duration_s if duration_s > 0 and completion_tokens else None,
+    }
@@ -1,32 +1,280 @@
 """Metrics aggregation helpers."""
 from __future__ import annotations
 
+import math
+from array import array
 from dataclasses import dataclass, field
-from math import ceil
-from statistics import mean
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+# Per-sample fields aggregated into distributions by ``BenchmarkResults``.
+DISTRIBUTION_KEYS = (
+    "latency_ms",
+    "ttft_ms",
+    "tpot_ms",
+    "itl_ms",
+    "decode_tokens_per_s",
+    "queue_delay_ms",
+    "end_to_end_ms",
+)
+TOTAL_KEYS = ("prompt_tokens", "completion_tokens", "cached_prompt_tokens")
+# Distributions also broken down by each sample's ``prefix_cache`` label (hit/miss).
+PREFIX_CACHE_KEYS = ("ttft_ms", "latency_ms")
+
+
+class StreamingHistogram:
+    """Constant-memory distribution sketch with bounded relative error.
+
+    Values are counted in logarithmically spaced buckets (HDR-histogram style),
+    so any quantile is reported within ``relative_error`` of the true sample
+    while memory stays fixed regardless of how many values are recorded. Mean
+    and standard deviation are tracked exactly with Welford's algorithm.
+    Histograms built with the same parameters can be merged.
+    """
+
+    def __init__(self, relative_error: float = 0.01, min_value: float = 1e-3, max_value: float = 1e9):
+        self.relative_error = relative_error
+        self.min_value = min_value
+        self.max_value = max_value
+        self._log_base = math.log1p(2 * relative_error)
+        num_buckets = int(math.ceil(math.log(max_value / min_value) / self._log_base)) + 2
+        self.counts = array("Q", bytes(8 * num_buckets))
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = int(math.ceil(math.log(value / self.min_value) / self._log_base))
+        return min(index, len(self.counts) - 1)
+
+    def _bucket_value(self, index: int) -> float:
+        if index == 0:
+            return self.min_value
+        # Geometric midpoint of the bucket bounds, within ``relative_error`` of both.
+        upper = self.min_value * math.exp(index * self._log_base)
+        return upper / (1 + self.relative_error)
+
+    def record(self, value: float) -> None:
+        self.counts[self._bucket(value)] += 1
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    def merge(self, other: "StreamingHistogram") -> None:
+        if len(other.counts) != len(self.counts) or other.relative_error != self.relative_error:
+            raise ValueError("Only histograms with identical parameters can be merged")
+        if other.count == 0:
+            return
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        total = self.count + other.count
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self._mean += delta * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._mean if self.count else None
+
+    @property
+    def stddev(self) -> Optional[float]:
+        if not self.count:
+            return None
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Nearest-rank quantile for ``q`` in [0, 1]."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """Non-empty buckets as ascending ``(representative value, count)`` pairs."""
+        return [
+            (min(max(self._bucket_value(index), self.min), self.max), bucket_count)
+            for index, bucket_count in enumerate(self.counts)
+            if bucket_count
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Sparse JSON-serializable form, restored by ``from_dict``."""
+        return {
+            "relative_error": self.relative_error,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self._mean,
+            "m2": self._m2,
+            "buckets": [[index, bucket_count] for index, bucket_count in enumerate(self.counts) if bucket_count],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StreamingHistogram":
+        histogram = cls(data["relative_error"], data["min_value"], data["max_value"])
+        for index, bucket_count in data["buckets"]:
+            histogram.counts[index] = bucket_count
+        histogram.count = data["count"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        histogram._mean = data["mean"]
+        histogram._m2 = data["m2"]
+        return histogram
+
+    def summary(self) -> Optional[Dict[str, float]]:
+        if not self.count:
+            return None
+        stats = {
+            "count": self.count,
+            "mean": self.mean,
+            "stddev": self.stddev,
+            "min": self.min,
+            "max": self.max,
+        }
+        for pct in PERCENTILES:
+            stats[f"p{pct:g}"] = self.quantile(pct / 100)
+        return stats
+
+
+class TokenRateHistogram:
+    """Per-request output token rates with the tokens and latency behind each bucket.
+
+    Suite throughput is the ratio of total completion tokens to total request
+    latency, which a histogram of rates alone cannot give. Each rate bucket
+    also sums its requests' tokens and seconds, so requests can be resampled
+    by bucket while the ratio stays exact for the observed run; requests in a
+    bucket share a rate within ``relative_error``.
+    """
+
+    def __init__(self, relative_error: float = 0.01):
+        self.rates = StreamingHistogram(relative_error)
+        self.tokens: Dict[int, float] = {}
+        self.latency_s: Dict[int, float] = {}
+
+    @property
+    def count(self) -> int:
+        return self.rates.count
+
+    def record(self, tokens: float, latency_s: float) -> None:
+        rate = tokens / latency_s
+        index = self.rates._bucket(rate)
+        self.rates.record(rate)
+        self.tokens[index] = self.tokens.get(index, 0) + tokens
+        self.latency_s[index] = self.latency_s.get(index, 0.0) + latency_s
+
+    def buckets(self) -> List[Tuple[int, float, float]]:
+        """Non-empty buckets as ascending ``(count, tokens, latency_s)`` triples."""
+        return [
+            (bucket_count, self.tokens[index], self.latency_s[index])
+            for index, bucket_count in enumerate(self.rates.counts)
+            if bucket_count
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rates": self.rates.to_dict(),
+            "buckets": [[index, self.tokens[index], self.latency_s[index]] for index in sorted(self.tokens)],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TokenRateHistogram":
+        histogram = cls()
+        histogram.rates = StreamingHistogram.from_dict(data["rates"])
+        for index, tokens, latency_s in data["buckets"]:
+            histogram.tokens[index] = tokens
+            histogram.latency_s[index] = latency_s
+        return histogram
 
 
 @dataclass
 class BenchmarkResults:
+    """Aggregates benchmark samples in constant memory.
+
+    Only fixed-size histograms and running totals are kept. Raw samples are
+    handed to ``sample_writer`` (e.g. ``ResultSink.sample_writer``) when set
+    instead of being held in memory.
+    """
+
     name: str
-    samples: List[Dict[str, Any]] = field(default_factory=list)
+    sample_writer: Optional[Callable[[Dict[str, Any]], None]] = None
+    num_samples: int = 0
+    distributions: Dict[str, StreamingHistogram] = field(default_factory=dict)
+    totals: Dict[str, float] = field(default_factory=dict)
+    prefix_cache: Dict[str, Dict[str, StreamingHistogram]] = field(default_factory=dict)
+    prefix_cache_counts: Dict[str, int] = field(default_factory=dict)
+    output_rates: TokenRateHistogram = field(default_factory=TokenRateHistogram)
 
     def add_sample(self, sample: Dict[str, Any]) -> None:
-        self.samples.append(sample)
+        self.num_samples += 1
+        for key in DISTRIBUTION_KEYS:
+            value = sample.get(key)
+            if value is None:
+                continue
+            histogram = self.distributions.setdefault(key, StreamingHistogram())
+            if isinstance(value, (list, tuple)):
+                for item in value:
+                    histogram.record(item)
+            else:
+                histogram.record(value)
+        for key in TOTAL_KEYS:
+            if sample.get(key) is not None:
+                self.totals[key] = self.totals.get(key, 0) + sample[key]
+        if sample.get("completion_tokens") and sample.get("latency_ms"):
+            self.output_rates.record(sample["completion_tokens"], sample["latency_ms"] / 1000)
+        label = sample.get("prefix_cache")
+        if label is not None:
+            self.prefix_cache_counts[label] = self.prefix_cache_counts.get(label, 0) + 1
+            group = self.prefix_cache.setdefault(label, {})
+            for key in PREFIX_CACHE_KEYS:
+                if sample.get(key) is not None:
+                    group.setdefault(key, StreamingHistogram()).record(sample[key])
+        if self.sample_writer is not None:
+            self.sample_writer(sample)
 
     def summary(self) -> Dict[str, Any]:
-        latencies = [s.get("latency_ms", 0.0) for s in self.samples]
-        if latencies:
-            sorted_latencies = sorted(latencies)
-            p95_index = max(0, ceil(0.95 * len(sorted_latencies)) - 1)
-            p95_latency = sorted_latencies[p95_index]
-        else:
-            p95_latency = None
-        return {
+        latency = self.distributions.get("latency_ms")
+        summary: Dict[str, Any] = {
             "name": self.name,
-            "num_samples": len(self.samples),
-            "avg_latency_ms": mean(latencies) if latencies else None,
-            "p95_latency_ms": p95_latency,
-            "system_snapshots": self.samples,
+            "num_samples": self.num_samples,
+            "avg_latency_ms": latency.mean if latency else None,
+            "p95_latency_ms": latency.quantile(0.95) if latency else None,
         }
+        for key, histogram in self.distributions.items():
+            summary[key] = histogram.summary()
+        for key, total in self.totals.items():
+            summary[f"total_{key}"] = total
+        # Bucket counts let ``compare`` bootstrap confidence intervals later.
+        summary["histograms"] = {key: histogram.to_dict() for key, histogram in self.distributions.items()}
+        if self.output_rates.count:
+            summary["output_rates"] = self.output_rates.to_dict()
+        if self.prefix_cache_counts:
+            prefix_cache: Dict[str, Any] = {
+                "hit_rate": self.prefix_cache_counts.get("hit", 0) / sum(self.prefix_cache_counts.values()),
+            }
+            if self.totals.get("prompt_tokens") and "cached_prompt_tokens" in self.totals:
+                prefix_cache["cached_token_fraction"] = self.totals["cached_prompt_tokens"] / self.totals["prompt_tokens"]
+            for label, group in sorted(self.prefix_cache.items()):
+                prefix_cache[label] = {
+                    "num_samples": self.prefix_cache_counts[label],
+                    **{key: histogram.summary() for key, histogram in group.items()},
+                }
+            summary["prefix_cache"] = prefix_cache
+        return summary
@@ -0,0 +1,229 @@
+"""Long-running system monitor that records to a compact binary log.
+
+The log starts with ``MAGIC``, a little-endian ``uint32`` header length and
+a JSON header describing the record layout, followed by fixed-size packed
+records: one per sample, with host metrics and one slot per GPU for each
+GPU metric. ``read_monitor_log`` maps the records straight into numpy arrays.
+Per-process GPU memory varies in length and is not recorded.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import psutil
+
+from inference.benchmarks.utils.system import NvmlSession, get_nvml_session
+
+MAGIC = b"SYSMON\x00\x01"
+FORMAT_VERSION = 1
+# (name, struct code); times and byte counts need float64, percentages do not.
+HOST_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("timestamp", "d"),
+    ("cpu_percent", "f"),
+    ("memory_percent", "f"),
+    ("memory_used_bytes", "d"),
+)
+# (record name, key in ``NvmlSession.sample_gpus``, struct code)
+GPU_FIELDS: Tuple[Tuple[str, str, str], ...] = (
+    ("gpu_utilization", "gpu_utilization", "f"),
+    ("gpu_memory_utilization", "memory_utilization", "f"),
+    ("gpu_memory_used_bytes", "memory_used_bytes", "d"),
+    ("gpu_temperature_c", "temperature_c", "f"),
+    ("gpu_power_w", "power_w", "f"),
+    ("gpu_power_limit_w", "power_limit_w", "f"),
+    ("gpu_average_power_w", "average_power_w", "f"),
+    ("gpu_sm_clock_mhz", "sm_clock_mhz", "f"),
+    ("gpu_memory_clock_mhz", "memory_clock_mhz", "f"),
+    # A bitmask; see ``decode_throttle_reasons``.
+    ("gpu_throttle_reasons", "throttle_reasons", "d"),
+    ("gpu_pcie_tx_bytes_per_s", "pcie_tx_bytes_per_s", "d"),
+    ("gpu_pcie_rx_bytes_per_s", "pcie_rx_bytes_per_s", "d"),
+    ("gpu_nvlink_tx_bytes_per_s", "nvlink_tx_bytes_per_s", "d"),
+    ("gpu_nvlink_rx_bytes_per_s", "nvlink_rx_bytes_per_s", "d"),
+)
+
+
+def record_layout(num_gpus: int) -> List[Tuple[str, str, int]]:
+    """``(name, struct code, count)`` for every field of a record, in order."""
+    layout = [(name, code, 1) for name, code in HOST_FIELDS]
+    if num_gpus:
+        layout += [(name, code, num_gpus) for name, _, code in GPU_FIELDS]
+    return layout
+
+
+def _read_header(path: Path) -> Tuple[Dict[str, Any], int]:
+    """The JSON header of a monitor log and the offset of its first record."""
+    with path.open("rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a system monitor log")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len))
+        return header, f.tell()
+
+
+class MonitorLogWriter:
+    """Append fixed-size records to a monitor log, flushing every ``flush_interval`` seconds.
+
+    A restarted monitor keeps appending to an existing log whose header
+    matches (same version, interval, GPUs and fields), after dropping a
+    partially written final record. A log with any other header is left
+    intact and records go to the first free ``<stem>.<n><suffix>`` next to
+    it instead; ``path`` is the file actually written.
+    """
+
+    def __init__(self, path: Path, gpu_indices: Sequence[int], interval: float, flush_interval: float = 10.0):
+        self.gpu_indices = list(gpu_indices)
+        self.flush_interval = flush_interval
+        self.layout = record_layout(len(self.gpu_indices))
+        self._struct = struct.Struct("<" + "".join(code * count for _, code, count in self.layout))
+        header = {
+            "version": FORMAT_VERSION,
+            "interval": interval,
+            "gpu_indices": self.gpu_indices,
+            "fields": self.layout,
+        }
+        encoded = json.dumps(header).encode("utf-8")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        rollover = 0
+        while self.path.exists() and self.path.stat().st_size > 0:
+            offset = self._resume_offset(json.loads(encoded))
+            if offset is not None:
+                size = self.path.stat().st_size
+                self._file: BinaryIO = self.path.open("r+b")
+                self._file.truncate(size - (size - offset) % self._struct.size)
+                self._file.seek(0, 2)
+                break
+            rollover += 1
+            self.path = path.with_name(f"{path.stem}.{rollover}{path.suffix}")
+        else:
+            self._file = self.path.open("wb")
+            self._file.write(MAGIC + struct.pack("<I", len(encoded)) + encoded)
+        if self.path != path:
+            logging.info("Monitor log %s has a different layout; writing to %s", path, self.path)
+        self._last_flush = time.monotonic()
+
+    def _resume_offset(self, header: Dict[str, Any]) -> Optional[int]:
+        """Offset of the first record in ``path`` if its header matches ``header``."""
+        try:
+            existing, offset = _read_header(self.path)
+        except (ValueError, struct.error):
+            return None
+        return offset if existing == header else None
+
+    def write(self, values: Sequence[float]) -> None:
+        self._file.write(self._struct.pack(*values))
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _sample_values(session: NvmlSession) -> List[float]:
+    vm = psutil.virtual_memory()
+    values = [time.time(), psutil.cpu_percent(interval=None), vm.percent, float(vm.used)]
+    if session.available:
+        gpus = session.sample_gpus(extended=True)
+        for _, key, _ in GPU_FIELDS:
+            # Unsupported readings are stored as NaN.
+            values.extend(float("nan") if gpu.get(key) is None else gpu[key] for gpu in gpus)
+    return values
+
+
+class SystemMonitor:
+    """Sample host and GPU metrics on a background thread into a binary log.
+
+    Reuses the persistent NVML session, so a tick costs a handful of NVML
+    and ``psutil`` calls plus one packed write; ticks are scheduled against
+    a fixed cadence rather than sleeping ``interval`` after each sample.
+    """
+
+    def __init__(
+        self,
+        output_path: Path,
+        interval: float = 1.0,
+        flush_interval: float = 10.0,
+        session: Optional[NvmlSession] = None,
+    ):
+        self.output_path = output_path
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.session = session or get_nvml_session()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._writer: Optional[MonitorLogWriter] = None
+
+    def start(self) -> "SystemMonitor":
+        if self._thread is None:
+            self._writer = MonitorLogWriter(
+                self.output_path, self.session.indices, self.interval, flush_interval=self.flush_interval
+            )
+            # The first cpu_percent call only primes psutil's counters.
+            psutil.cpu_percent(interval=None)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="system-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._writer.close()
+            self._writer = None
+
+    @property
+    def log_path(self) -> Optional[Path]:
+        """The file being written, which differs from ``output_path`` after a rollover."""
+        return self._writer.path if self._writer is not None else None
+
+    def _loop(self) -> None:
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self._writer.write(_sample_values(self.session))
+            except Exception:  # noqa: BLE001 - a failed tick must not end monitoring
+                logging.exception("System monitor sample failed")
+            next_tick += self.interval
+            self._stop.wait(max(0.0, next_tick - time.monotonic()))
+
+    def __enter__(self) -> "SystemMonitor":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        self.stop()
+
+
+def read_monitor_log(path: Path) -> Dict[str, Any]:
+    """Load a monitor log as numpy arrays.
+
+    Host metrics are 1-D arrays over samples and GPU metrics are
+    ``(samples, gpus)`` arrays whose columns follow ``gpu_indices``. A
+    partially written final record is ignored.
+    """
+    header, offset = _read_header(path)
+    if header["version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported monitor log version {header['version']} in {path}")
+    dtype = np.dtype(
+        [
+            (name, "<" + code, (count,)) if name.startswith("gpu_") else (name, "<" + code)
+            for name, code, count in header["fields"]
+        ]
+    )
+    count = (path.stat().st_size - offset) // dtype.itemsize
+    records = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+    arrays: Dict[str, Any] = {name: records[name] for name in dtype.names}
+    arrays["gpu_indices"] = header["gpu_indices"]
+    arrays["interval"] = header["interval"]
+    return arrays
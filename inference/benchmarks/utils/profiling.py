@@ -0,0 +1,246 @@
+"""Profiling windows over a scheduled range of training steps or benchmark requests.
+
+Callers invoke ``step()`` after every step (or request). The window opens
+after ``start`` steps and covers the next ``steps``; once it closes,
+profiling stops entirely. ``build_profiler`` returns ``None`` when profiling
+is disabled, so callers only pay for an ``is not None`` check.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import repeat
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+PROFILER_MODES = ("torch", "py-spy")
+
+
+@dataclass
+class ProfilingConfig:
+    """Profiling settings; ``mode`` of ``None`` disables profiling.
+
+    ``torch`` records ``torch.profiler`` traces (CPU and, when available,
+    CUDA activity) and exports a Chrome trace plus a top-N operator summary.
+    ``py-spy`` samples Python stacks from outside the process and reports
+    the top-N functions. ``ranks`` limits which distributed ranks profile
+    (``None`` means all).
+    """
+
+    mode: Optional[str] = None
+    start: int = 10
+    steps: int = 5
+    warmup: int = 1
+    top_n: int = 20
+    record_shapes: bool = False
+    profile_memory: bool = False
+    with_stack: bool = False
+    py_spy_rate: int = 100
+    ranks: Optional[List[int]] = field(default_factory=lambda: [0])
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProfilingConfig":
+        config = cls(**data)
+        if config.mode is not None and config.mode not in PROFILER_MODES:
+            raise ValueError(f"Unknown profiling mode `{config.mode}`; expected one of {PROFILER_MODES}")
+        if config.steps < 1:
+            raise ValueError("Profiling `steps` must be at least 1")
+        return config
+
+
+class TorchProfilerWindow:
+    """Run ``torch.profiler`` over the configured window and export its results."""
+
+    def __init__(self, config: ProfilingConfig, output_dir: Path, rank: int = 0):
+        import torch
+
+        self.config = config
+        self.output_dir = output_dir
+        self.rank = rank
+        self._has_cuda = torch.cuda.is_available()
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if self._has_cuda:
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._lock = threading.Lock()
+        self._remaining = config.start + config.warmup + config.steps
+        self._profiler: Any = torch.profiler.profile(
+            activities=activities,
+            schedule=torch.profiler.schedule(wait=config.start, warmup=config.warmup, active=config.steps, repeat=1),
+            on_trace_ready=self._export,
+            record_shapes=config.record_shapes,
+            profile_memory=config.profile_memory,
+            with_stack=config.with_stack,
+        )
+        self._profiler.start()
+
+    def step(self) -> None:
+        with self._lock:
+            if self._profiler is None:
+                return
+            self._profiler.step()
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._stop()
+
+    def _stop(self) -> None:
+        profiler, self._profiler = self._profiler, None
+        profiler.stop()
+
+    def _export(self, profiler: Any) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        trace_path = self.output_dir / f"trace-rank{self.rank}.json"
+        profiler.export_chrome_trace(str(trace_path))
+        rows = []
+        for event in profiler.key_averages():
+            # `device` replaced `cuda` in these names in recent torch releases.
+            self_device = getattr(event, "self_device_time_total", None)
+            if self_device is None:
+                self_device = getattr(event, "self_cuda_time_total", 0.0)
+            device = getattr(event, "device_time_total", None)
+            if device is None:
+                device = getattr(event, "cuda_time_total", 0.0)
+            rows.append(
+                {
+                    "name": event.key,
+                    "count": event.count,
+                    "self_cpu_time_us": event.self_cpu_time_total,
+                    "cpu_time_us": event.cpu_time_total,
+                    "self_device_time_us": self_device,
+                    "device_time_us": device,
+                }
+            )
+        sort_key = "self_device_time_us" if self._has_cuda else "self_cpu_time_us"
+        rows.sort(key=lambda row: row[sort_key], reverse=True)
+        write_summary(self.output_dir / f"top_ops-rank{self.rank}.json", rows[: self.config.top_n], sort_key)
+        logging.info("Wrote torch profiler trace %s", trace_path)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._profiler is not None:
+                self._stop()
+
+
+def summarize_speedscope(path: Path, top_n: int) -> List[Dict[str, Any]]:
+    """Top-N functions by self samples in a py-spy speedscope profile."""
+    data = json.loads(path.read_text())
+    frames = data["shared"]["frames"]
+    self_samples: Counter = Counter()
+    total_samples: Counter = Counter()
+    total = 0.0
+    for profile in data.get("profiles", []):
+        weights = profile.get("weights") or repeat(1)
+        for stack, weight in zip(profile.get("samples", []), weights):
+            total += weight
+            if stack:
+                self_samples[stack[-1]] += weight
+            for frame in set(stack):
+                total_samples[frame] += weight
+    return [
+        {
+            "function": frames[frame]["name"],
+            "file": frames[frame].get("file"),
+            "line": frames[frame].get("line"),
+            "self_fraction": samples / total,
+            "total_fraction": total_samples[frame] / total,
+        }
+        for frame, samples in self_samples.most_common(top_n)
+    ]
+
+
+class PySpyWindow:
+    """Sample this process with ``py-spy record`` over the configured window."""
+
+    def __init__(self, config: ProfilingConfig, output_dir: Path, rank: int = 0, executable: str = "py-spy"):
+        self.config = config
+        self.output_dir = output_dir
+        self.rank = rank
+        self.executable = executable
+        self._lock = threading.Lock()
+        self._steps = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._done = False
+        if config.start == 0:
+            self._launch()
+
+    @property
+    def profile_path(self) -> Path:
+        return self.output_dir / f"pyspy-rank{self.rank}.speedscope.json"
+
+    def _launch(self) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        cmd = [
+            self.executable,
+            "record",
+            "--pid",
+            str(os.getpid()),
+            "--rate",
+            str(self.config.py_spy_rate),
+            "--format",
+            "speedscope",
+            "--output",
+            str(self.profile_path),
+            "--nonblocking",
+        ]
+        self._process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+
+    def step(self) -> None:
+        with self._lock:
+            if self._done:
+                return
+            self._steps += 1
+            if self._steps == self.config.start:
+                self._launch()
+            elif self._steps >= self.config.start + self.config.steps:
+                self._stop()
+
+    def _stop(self) -> None:
+        self._done = True
+        process, self._process = self._process, None
+        if process is None:
+            return
+        # py-spy writes its profile when interrupted.
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            return
+        if self.profile_path.exists():
+            rows = summarize_speedscope(self.profile_path, self.config.top_n)
+            write_summary(self.output_dir / f"top_functions-rank{self.rank}.json", rows, "self_fraction")
+            logging.info("Wrote py-spy profile %s", self.profile_path)
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._done:
+                self._stop()
+
+
+ProfilerWindow = Union[TorchProfilerWindow, PySpyWindow]
+
+
+def write_summary(path: Path, rows: List[Dict[str, Any]], sort_key: str) -> None:
+    path.write_text(json.dumps({"sort_by": sort_key, "top": rows}, indent=2))
+
+
+def build_profiler(config: ProfilingConfig, output_dir: Path, rank: Optional[int] = None) -> Optional[ProfilerWindow]:
+    """Profiler window for ``config``, or ``None`` when disabled or this rank is excluded."""
+    if config.mode is None:
+        return None
+    rank = int(os.environ.get("RANK", "0")) if rank is None else rank
+    if config.ranks is not None and rank not in config.ranks:
+        return None
+    if config.mode == "py-spy":
+        executable = shutil.which("py-spy")
+        if executable is None:
+            logging.warning("Profiling mode `py-spy` requested but py-spy is not installed; profiling disabled")
+            return None
+        return PySpyWindow(config, output_dir, rank=rank, executable=executable)
+    return TorchProfilerWindow(config, output_dir, rank=rank)
@@ -0,0 +1,136 @@
+"""Append-only JSONL sink for benchmark results."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, Optional
+
+
+def suite_hash(suite_config: Dict[str, Any]) -> str:
+    """Stable identifier for a suite definition, independent of key order."""
+    canonical = json.dumps(suite_config, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+# Suite settings that determine what was measured; suites compared across
+# runs must agree on all of them. Warmup, repetitions and convergence only
+# change how many samples were taken.
+SUITE_IDENTITY_FIELDS = ("runner", "params", "load", "batch_size", "streaming", "workload", "prompts", "sweep_point")
+
+
+def suite_identity(suite_config: Dict[str, Any]) -> Dict[str, Any]:
+    """The ``SUITE_IDENTITY_FIELDS`` a suite sets."""
+    return {key: suite_config[key] for key in SUITE_IDENTITY_FIELDS if key in suite_config}
+
+
+def read_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield the records in ``path``, skipping a line truncated by a crash."""
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with path.open("rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class ResultSink:
+    """Streams samples and suite summaries to disk as they are produced.
+
+    Every suite attempt gets its own ``run_id``; a suite counts as complete
+    only once its ``suite`` record has been written and synced, so samples
+    from an attempt that crashed are ignored on resume. A non-empty sink is
+    only truncated with ``overwrite``, so a rerun without ``resume`` cannot
+    wipe the results of a crashed run.
+    """
+
+    def __init__(self, path: Path, resume: bool = False, flush_every: int = 1000, overwrite: bool = False):
+        if not resume and not overwrite and path.exists() and path.stat().st_size > 0:
+            raise FileExistsError(
+                f"Result sink {path} already holds results; pass --resume to continue it "
+                "or --overwrite to start over"
+            )
+        self.path = path
+        self.flush_every = flush_every
+        self._pending = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if resume and path.exists():
+            terminated = _ends_with_newline(path)
+            self._file: Optional[IO[str]] = path.open("a", encoding="utf-8")
+            if not terminated:
+                # Start a fresh line after a record cut short by a crash.
+                self._file.write("\n")
+        else:
+            self._file = path.open("w", encoding="utf-8")
+
+    def completed_suites(self) -> Dict[str, Dict[str, Any]]:
+        """Map suite hash to the summary of its most recent completed attempt."""
+        completed: Dict[str, Dict[str, Any]] = {}
+        self._file.flush()
+        for record in read_records(self.path):
+            if record.get("type") == "suite":
+                completed[record["suite_hash"]] = record["summary"]
+        return completed
+
+    def _write(self, record: Dict[str, Any], sync: bool = False) -> None:
+        self._file.write(json.dumps(record) + "\n")
+        self._pending += 1
+        if sync or self._pending >= self.flush_every:
+            self._file.flush()
+            self._pending = 0
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def start_suite(self, index: int, suite_config: Dict[str, Any]) -> str:
+        run_id = uuid.uuid4().hex
+        self._write(
+            {
+                "type": "suite_start",
+                "suite_hash": suite_hash(suite_config),
+                "run_id": run_id,
+                "index": index,
+                "timestamp": time.time(),
+                "suite": suite_config,
+            },
+            sync=True,
+        )
+        return run_id
+
+    def sample_writer(self, suite_config: Dict[str, Any], run_id: str) -> Callable[[Dict[str, Any]], None]:
+        digest = suite_hash(suite_config)
+
+        def write(sample: Dict[str, Any]) -> None:
+            self._write({"type": "sample", "suite_hash": digest, "run_id": run_id, "sample": sample})
+
+        return write
+
+    def finish_suite(self, index: int, suite_config: Dict[str, Any], run_id: str, summary: Dict[str, Any]) -> None:
+        self._write(
+            {
+                "type": "suite",
+                "suite_hash": suite_hash(suite_config),
+                "run_id": run_id,
+                "index": index,
+                "timestamp": time.time(),
+                "summary": summary,
+            },
+            sync=True,
+        )
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
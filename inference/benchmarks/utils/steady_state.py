@@ -0,0 +1,128 @@
+"""Warmup and steady-state detection for benchmark suites."""
+from __future__ import annotations
+
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, Optional
+
+
+def repeat_passes(items: Iterable[Any]) -> Iterator[Any]:
+    """Iterate ``items`` again and again, stopping if a pass yields nothing.
+
+    Unlike ``itertools.cycle`` nothing is buffered, so re-iterable workloads
+    that stream from disk are re-read rather than held in memory.
+    """
+    while True:
+        empty = True
+        for item in items:
+            empty = False
+            yield item
+        if empty:
+            return
+
+
+def run_warmup(request_fn: Callable[[Any], Any], prompts: Iterable[Any], iterations: int = 0, duration_s: float = 0.0) -> Dict[str, Any]:
+    """Issue untimed requests until both ``iterations`` and ``duration_s`` are met.
+
+    Results are discarded so one-off costs such as CUDA graph capture, JIT
+    compilation and KV-cache allocation stay out of the measured samples.
+    """
+    start = time.perf_counter()
+    completed = 0
+    if iterations > 0 or duration_s > 0:
+        for prompt in repeat_passes(prompts):
+            if completed >= iterations and time.perf_counter() - start >= duration_s:
+                break
+            request_fn(prompt)
+            completed += 1
+    return {"iterations": completed, "duration_s": time.perf_counter() - start}
+
+
+@dataclass
+class ConvergenceDetector:
+    """Decides when a metric has stabilized enough to stop sampling.
+
+    Converges once at least ``min_samples`` values were observed and either
+    the coefficient of variation falls below ``target_cv`` or the relative
+    half-width of the mean's confidence interval falls below ``target_ci``.
+    Statistics cover the trailing ``window`` values, or all values when unset.
+    """
+
+    metric: str = "latency_ms"
+    target_cv: Optional[float] = None
+    target_ci: Optional[float] = None
+    confidence: float = 0.95
+    min_samples: int = 10
+    max_samples: int = 10000
+    window: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.target_cv is None and self.target_ci is None:
+            raise ValueError("Convergence requires `target_cv` or `target_ci`")
+        self._window: Optional[Deque[float]] = deque() if self.window else None
+        self._count = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._z = NormalDist().inv_cdf((1 + self.confidence) / 2)
+        self.num_samples = 0
+        self.converged = False
+
+    def observe(self, sample: Dict[str, Any]) -> None:
+        value = sample.get(self.metric)
+        if value is None:
+            return
+        self.num_samples += 1
+        self._count += 1
+        self._sum += value
+        self._sumsq += value * value
+        if self._window is not None:
+            self._window.append(value)
+            if len(self._window) > self.window:
+                evicted = self._window.popleft()
+                self._count -= 1
+                self._sum -= evicted
+                self._sumsq -= evicted * evicted
+        if self.num_samples >= self.min_samples:
+            cv, ci = self.statistics()
+            self.converged = (self.target_cv is not None and cv is not None and cv <= self.target_cv) or (
+                self.target_ci is not None and ci is not None and ci <= self.target_ci
+            )
+
+    def statistics(self) -> tuple[Optional[float], Optional[float]]:
+        """Coefficient of variation and relative CI half-width of the tracked values."""
+        n = self._count
+        if n < 2 or self._sum == 0:
+            return None, None
+        mean = self._sum / n
+        variance = max(0.0, (self._sumsq - self._sum * mean) / (n - 1))
+        cv = math.sqrt(variance) / mean
+        return cv, self._z * cv / math.sqrt(n)
+
+    @property
+    def done(self) -> bool:
+        return self.converged or self.num_samples >= self.max_samples
+
+    def summary(self) -> Dict[str, Any]:
+        cv, ci = self.statistics()
+        return {
+            "metric": self.metric,
+            "converged": self.converged,
+            "num_samples": self.num_samples,
+            "cv": cv,
+            "ci_relative_half_width": ci,
+            "target_cv": self.target_cv,
+            "target_ci": self.target_ci,
+        }
+
+
+def until_converged(prompts: Iterable[Any], detector: ConvergenceDetector) -> Iterator[Any]:
+    """Repeat ``prompts`` until ``detector`` reports it is done."""
+    issued = 0
+    for prompt in repeat_passes(prompts):
+        if detector.done or issued >= detector.max_samples:
+            return
+        yield prompt
+        issued += 1
@@ -1,9 +1,14 @@
 """System utilization helpers for benchmarking."""
 from __future__ import annotations
 
+import atexit
+import logging
+import os
+import threading
 import time
 from contextlib import contextmanager
-from typing import Any, Dict
+from statistics import mean
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import psutil
 
@@ -13,41 +18,468 @@ except ImportError:  # pragma: no cover
     pynvml = None
 
 
-def capture_system_snapshot() -> Dict[str, Any]:
-    snapshot: Dict[str, Any] = {
+def _visible_indices(device_count: int) -> List[int]:
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible is None:
+        return list(range(device_count))
+    devices = [device.strip() for device in visible.split(",") if device.strip()]
+    if not all(device.isdigit() for device in devices):
+        # UUIDs or MIG ids cannot be mapped to NVML indices cheaply.
+        return list(range(device_count))
+    return [int(device) for device in devices if int(device) < device_count]
+
+
+# Bits of nvmlDeviceGetCurrentClocksThrottleReasons; fixed by the NVML ABI.
+THROTTLE_REASONS = {
+    0x1: "gpu_idle",
+    0x2: "applications_clocks_setting",
+    0x4: "sw_power_cap",
+    0x8: "hw_slowdown",
+    0x10: "sync_boost",
+    0x20: "sw_thermal_slowdown",
+    0x40: "hw_thermal_slowdown",
+    0x80: "hw_power_brake_slowdown",
+    0x100: "display_clock_setting",
+}
+# Seconds between extended readings (power, clocks, link rates, processes)
+# taken by the background sampler.
+EXTENDED_SAMPLE_INTERVAL = 1.0
+# NVML return codes after which a query is not retried.
+_PERMANENT_ERRORS = ("NVML_ERROR_NOT_SUPPORTED", "NVML_ERROR_NO_PERMISSION", "NVML_ERROR_FUNCTION_NOT_FOUND")
+# NVML scope id that sums a per-link counter over all NVLinks.
+_ALL_LINKS = 0xFFFFFFFF
+# (sample key, NVML field id constant, bytes per counter unit)
+_COUNTER_FIELDS = (
+    ("pcie_tx", "NVML_FI_DEV_PCIE_COUNT_TX_BYTES", 1),
+    ("pcie_rx", "NVML_FI_DEV_PCIE_COUNT_RX_BYTES", 1),
+    ("nvlink_tx", "NVML_FI_DEV_NVLINK_THROUGHPUT_DATA_TX", 1024),
+    ("nvlink_rx", "NVML_FI_DEV_NVLINK_THROUGHPUT_DATA_RX", 1024),
+)
+LINK_RATE_KEYS = tuple(f"{key}_bytes_per_s" for key, _, _ in _COUNTER_FIELDS)
+# Rates derived from cumulative counters between consecutive samples.
+RATE_KEYS = (*LINK_RATE_KEYS, "average_power_w")
+
+
+def decode_throttle_reasons(mask: Optional[float]) -> List[str]:
+    """Names of the throttle reasons set in an NVML bitmask."""
+    if mask is None or mask != mask:  # missing or NaN
+        return []
+    return [name for bit, name in THROTTLE_REASONS.items() if int(mask) & bit]
+
+
+class NvmlSession:
+    """Keeps NVML initialized and device handles open for the life of the process.
+
+    ``nvml`` defaults to ``pynvml`` and may be any module exposing the same
+    functions. When it is missing or initialization fails the session reports
+    no GPUs instead of raising. NVML ignores ``CUDA_VISIBLE_DEVICES``, so a
+    numeric device list in that variable restricts which GPUs are sampled.
+
+    Queries a device does not support (no NVLink, power readings on some
+    SKUs) or that lack permission are reported as ``None`` and not retried;
+    other failures are also ``None`` but retried on the next sample. PCIe and NVLink traffic
+    are read as cumulative byte counters, and total energy consumption as a
+    cumulative millijoule counter; both are converted to rates over the time
+    since the previous extended sample, timed with ``clock``, so
+    ``average_power_w`` covers the whole interval where ``power_w`` is a
+    single reading. The first sample has no rates, and neither do drivers
+    without the counters: the ``nvmlDeviceGetPcieThroughput`` alternative
+    blocks for 20 ms per call and is not used.
+    """
+
+    def __init__(self, nvml: Any = None, clock: Callable[[], float] = time.monotonic):
+        self.nvml = nvml if nvml is not None else pynvml
+        self.clock = clock
+        self.indices: List[int] = []
+        self.handles: List[Any] = []
+        self._initialized = False
+        self._unsupported: Set[Tuple[int, str]] = set()
+        self._failing: Set[Tuple[int, str]] = set()
+        self._counters: Dict[int, Tuple[float, Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+        if self.nvml is None:
+            return
+        try:
+            self.nvml.nvmlInit()
+            self._initialized = True
+            self.indices = _visible_indices(self.nvml.nvmlDeviceGetCount())
+            self.handles = [self.nvml.nvmlDeviceGetHandleByIndex(idx) for idx in self.indices]
+        except Exception:  # noqa: BLE001 - no driver or no devices
+            self.shutdown()
+
+    @property
+    def available(self) -> bool:
+        return self._initialized
+
+    @property
+    def device_count(self) -> int:
+        return len(self.handles)
+
+    def _is_permanent(self, exc: Exception) -> bool:
+        """Whether ``exc`` means the query can never succeed on this device."""
+        if isinstance(exc, AttributeError):  # bindings too old for the function
+            return True
+        codes = {getattr(self.nvml, name, None) for name in _PERMANENT_ERRORS}
+        return getattr(exc, "value", None) in codes - {None}
+
+    def _query(self, idx: int, name: str, fn: Callable[..., Any], *args: Any) -> Any:
+        if (idx, name) in self._unsupported:
+            return None
+        try:
+            return fn(*args)
+        except Exception as exc:  # noqa: BLE001 - any NVML failure is a missing reading
+            if self._is_permanent(exc):
+                self._unsupported.add((idx, name))
+            elif (idx, name) not in self._failing:
+                # Transient (e.g. a GPU reset): retried on the next sample, logged once.
+                self._failing.add((idx, name))
+                logging.warning("NVML query `%s` failed on GPU %d, will retry: %s", name, idx, exc)
+            return None
+
+    def _read_counters(self, idx: int, handle: Any) -> Dict[str, float]:
+        fields = [(key, getattr(self.nvml, const, None), scale) for key, const, scale in _COUNTER_FIELDS]
+        fields = [(key, field_id, scale) for key, field_id, scale in fields if field_id is not None]
+        if not fields:
+            return {}
+        values = self._query(
+            idx,
+            "field_values",
+            self.nvml.nvmlDeviceGetFieldValues,
+            handle,
+            [(field_id, _ALL_LINKS) for _, field_id, _ in fields],
+        )
+        counters: Dict[str, float] = {}
+        for (key, _, scale), value in zip(fields, values or []):
+            if getattr(value, "nvmlReturn", 0) == 0:
+                counters[key] = float(value.value.ullVal) * scale
+        return counters
+
+    def _rates(self, idx: int, handle: Any) -> Dict[str, Optional[float]]:
+        now = self.clock()
+        counters = self._read_counters(idx, handle)
+        energy_mj = self._query(idx, "energy", self.nvml.nvmlDeviceGetTotalEnergyConsumption, handle)
+        if energy_mj is not None:
+            counters["energy_j"] = float(energy_mj) / 1000
+        previous = self._counters.get(idx)
+        self._counters[idx] = (now, counters)
+
+        def rate(key: str) -> Optional[float]:
+            if previous is None or key not in counters or key not in previous[1] or now <= previous[0]:
+                return None
+            # Counters are unsigned and wrap; a negative delta means a reset, not traffic.
+            delta = counters[key] - previous[1][key]
+            return delta / (now - previous[0]) if delta >= 0 else None
+
+        rates: Dict[str, Optional[float]] = {f"{key}_bytes_per_s": rate(key) for key, _, _ in _COUNTER_FIELDS}
+        rates["average_power_w"] = rate("energy_j")
+        return rates
+
+    def _processes(self, idx: int, handle: Any) -> List[Dict[str, Any]]:
+        processes = self._query(idx, "processes", self.nvml.nvmlDeviceGetComputeRunningProcesses, handle) or []
+        return [
+            {
+                "pid": proc.pid,
+                # None when the driver cannot attribute memory (e.g. inside some containers).
+                "memory_used_bytes": float(proc.usedGpuMemory) if proc.usedGpuMemory is not None else None,
+            }
+            for proc in processes
+        ]
+
+    def sample_gpus(self, extended: bool = False, processes: bool = False) -> List[Dict[str, Any]]:
+        """Utilization, memory and temperature of every visible GPU.
+
+        ``extended`` adds power, clocks, throttle reasons and counter rates,
+        and ``processes`` per-process memory; both cost several NVML calls
+        per GPU, so frequent samplers request them at a lower rate.
+        """
+        gpus: List[Dict[str, Any]] = []
+        with self._lock:
+            for idx, handle in zip(self.indices, self.handles):
+                nvml = self.nvml
+                util = self._query(idx, "utilization", nvml.nvmlDeviceGetUtilizationRates, handle)
+                mem = self._query(idx, "memory", nvml.nvmlDeviceGetMemoryInfo, handle)
+                temperature = self._query(
+                    idx, "temperature", nvml.nvmlDeviceGetTemperature, handle, nvml.NVML_TEMPERATURE_GPU
+                )
+                gpu: Dict[str, Any] = {
+                    "gpu_index": idx,
+                    "gpu_utilization": float(util.gpu) if util is not None else None,
+                    "memory_utilization": float(util.memory) if util is not None else None,
+                    "memory_used_bytes": float(mem.used) if mem is not None else None,
+                    "memory_total_bytes": float(mem.total) if mem is not None else None,
+                    "temperature_c": float(temperature) if temperature is not None else None,
+                }
+                if extended:
+                    power_mw = self._query(idx, "power", nvml.nvmlDeviceGetPowerUsage, handle)
+                    limit_mw = self._query(idx, "power_limit", nvml.nvmlDeviceGetEnforcedPowerLimit, handle)
+                    sm_clock = self._query(idx, "sm_clock", nvml.nvmlDeviceGetClockInfo, handle, nvml.NVML_CLOCK_SM)
+                    mem_clock = self._query(
+                        idx, "mem_clock", nvml.nvmlDeviceGetClockInfo, handle, nvml.NVML_CLOCK_MEM
+                    )
+                    throttle = self._query(idx, "throttle", nvml.nvmlDeviceGetCurrentClocksThrottleReasons, handle)
+                    gpu.update(
+                        {
+                            "power_w": power_mw / 1000 if power_mw is not None else None,
+                            "power_limit_w": limit_mw / 1000 if limit_mw is not None else None,
+                            "sm_clock_mhz": float(sm_clock) if sm_clock is not None else None,
+                            "memory_clock_mhz": float(mem_clock) if mem_clock is not None else None,
+                            "throttle_reasons": int(throttle) if throttle is not None else None,
+                            **self._rates(idx, handle),
+                        }
+                    )
+                if processes:
+                    gpu["processes"] = self._processes(idx, handle)
+                gpus.append(gpu)
+        return gpus
+
+    def shutdown(self) -> None:
+        self.indices = []
+        self.handles = []
+        if self._initialized:
+            try:
+                self.nvml.nvmlShutdown()
+            except Exception:  # pragma: no cover - best effort cleanup
+                pass
+        self._initialized = False
+        self._counters = {}
+
+
+_session: Optional[NvmlSession] = None
+_session_lock = threading.Lock()
+
+
+def get_nvml_session() -> NvmlSession:
+    """Return the process-wide NVML session, initializing it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = NvmlSession()
+            atexit.register(_session.shutdown)
+        return _session
+
+
+def sample_system(session: Optional[NvmlSession] = None, extended: bool = False) -> Dict[str, Any]:
+    """Host readings plus GPU readings; ``extended`` adds the extended GPU telemetry and processes."""
+    session = session or get_nvml_session()
+    sample: Dict[str, Any] = {
+        "timestamp": time.perf_counter(),
         "cpu_percent": psutil.cpu_percent(interval=None),
         "memory_percent": psutil.virtual_memory().percent,
     }
-    if pynvml is None:
-        return snapshot
+    if session.available:
+        sample["gpus"] = session.sample_gpus(extended=extended, processes=extended)
+    return sample
 
-    try:
-        pynvml.nvmlInit()
-        snapshot["gpus"] = []
-        for idx in range(pynvml.nvmlDeviceGetCount()):
-            handle = pynvml.nvmlDeviceGetHandleByIndex(idx)
-            util = pynvml.nvmlDeviceGetUtilizationRates(handle)
-            mem = pynvml.nvmlDeviceGetMemoryInfo(handle)
-            snapshot["gpus"].append(
-                {
-                    "gpu_index": idx,
-                    "gpu_utilization": float(util.gpu),
-                    "memory_utilization": float(util.memory),
-                    "memory_used_bytes": float(mem.used),
-                    "memory_total_bytes": float(mem.total),
-                }
-            )
-    finally:
-        if pynvml is not None:
-            pynvml.nvmlShutdown()
+
+def _is_extended(sample: Dict[str, Any]) -> bool:
+    return bool(sample.get("gpus")) and "power_w" in sample["gpus"][0]
+
+
+def _mean_present(values: Iterable[Optional[float]]) -> Optional[float]:
+    present = [value for value in values if value is not None]
+    return mean(present) if present else None
+
+
+def _max_present(values: Iterable[Optional[float]]) -> Optional[float]:
+    present = [value for value in values if value is not None]
+    return max(present) if present else None
+
+
+def summarize_samples(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Average utilization over ``samples``; memory usage reports the peak.
+
+    Power, clocks and link rates are averaged over the extended samples,
+    throttle reasons are those seen in any of them, and per-process memory
+    is the peak for each pid. Without extended samples only utilization,
+    memory and temperature are reported.
+    """
+    summary: Dict[str, Any] = {
+        "cpu_percent": mean(s["cpu_percent"] for s in samples),
+        "memory_percent": mean(s["memory_percent"] for s in samples),
+        "num_samples": len(samples),
+    }
+    if "gpus" in samples[0]:
+        summary["gpus"] = []
+        for idx, first in enumerate(samples[0]["gpus"]):
+            per_gpu = [s["gpus"][idx] for s in samples]
+            gpu: Dict[str, Any] = {
+                "gpu_index": first["gpu_index"],
+                "gpu_utilization": _mean_present(g["gpu_utilization"] for g in per_gpu),
+                "memory_utilization": _mean_present(g["memory_utilization"] for g in per_gpu),
+                "memory_used_bytes": _max_present(g["memory_used_bytes"] for g in per_gpu),
+                "memory_total_bytes": first["memory_total_bytes"],
+                "temperature_c": _max_present(g.get("temperature_c") for g in per_gpu),
+            }
+            extended = [g for g in per_gpu if "power_w" in g]
+            if extended:
+                mask = 0
+                for g in extended:
+                    mask |= g.get("throttle_reasons") or 0
+                processes: Dict[int, Optional[float]] = {}
+                for g in extended:
+                    for proc in g.get("processes", []):
+                        processes[proc["pid"]] = _max_present([processes.get(proc["pid"]), proc["memory_used_bytes"]])
+                gpu.update(
+                    {
+                        "power_w": _mean_present(g["power_w"] for g in extended),
+                        "peak_power_w": _max_present(g["power_w"] for g in extended),
+                        "power_limit_w": extended[0].get("power_limit_w"),
+                        "sm_clock_mhz": _mean_present(g.get("sm_clock_mhz") for g in extended),
+                        "memory_clock_mhz": _mean_present(g.get("memory_clock_mhz") for g in extended),
+                        "throttle_reasons": decode_throttle_reasons(mask),
+                        **{key: _mean_present(g.get(key) for g in extended) for key in RATE_KEYS},
+                        "processes": [
+                            {"pid": pid, "memory_used_bytes": used} for pid, used in sorted(processes.items())
+                        ],
+                    }
+                )
+            summary["gpus"].append(gpu)
+    return summary
+
+
+class SystemSampler:
+    """Samples CPU/GPU utilization on a background thread into a ring buffer.
+
+    Timestamps use ``time.perf_counter`` so callers can look up the samples
+    that overlapped a request timed with ``time_it``. Utilization, memory and
+    temperature are read every ``interval``; extended telemetry (power,
+    clocks, link rates, processes) at most every ``extended_interval``.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        capacity: int = 6000,
+        session: Optional[NvmlSession] = None,
+        extended_interval: float = EXTENDED_SAMPLE_INTERVAL,
+    ):
+        self.interval = interval
+        self.extended_interval = extended_interval
+        self.capacity = capacity
+        self.session = session or get_nvml_session()
+        self._ring: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._written = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SystemSampler":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="system-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self) -> None:
+        last_extended = float("-inf")
+        while not self._stop.is_set():
+            extended = time.perf_counter() - last_extended >= self.extended_interval
+            try:
+                sample = sample_system(self.session, extended=extended)
+                if extended:
+                    last_extended = sample["timestamp"]
+            except Exception:  # noqa: BLE001 - a failed tick must not end sampling
+                logging.exception("System sampling failed; retrying in %.2fs", self.interval)
+                self._stop.wait(self.interval)
+                continue
+            with self._lock:
+                self._ring[self._written % self.capacity] = sample
+                self._written += 1
+            self._stop.wait(self.interval)
+
+    def _oldest(self) -> int:
+        return max(0, self._written - self.capacity)
+
+    def _bisect(self, timestamp: float, right: bool) -> int:
+        # Samples are appended in time order, so the ring is sorted by
+        # timestamp from the oldest retained sample onwards.
+        lo, hi = self._oldest(), self._written
+        while lo < hi:
+            mid = (lo + hi) // 2
+            sample_ts = self._ring[mid % self.capacity]["timestamp"]
+            if sample_ts < timestamp or (right and sample_ts == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._ring[(self._written - 1) % self.capacity] if self._written else None
+
+    def window(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """Samples taken between ``start`` and ``end``, or the last one before ``end``.
+
+        When none of them is extended, the latest extended sample before the
+        window is included too, so short requests still report power and clocks.
+        """
+        with self._lock:
+            first = self._bisect(start, right=False)
+            last = self._bisect(end, right=True)
+            if last <= first:
+                first = max(self._oldest(), last - 1)
+            samples = [self._ring[idx % self.capacity] for idx in range(first, last)]
+            if samples and not any(_is_extended(sample) for sample in samples):
+                earlier = (self._ring[idx % self.capacity] for idx in range(first - 1, self._oldest() - 1, -1))
+                previous = next((sample for sample in earlier if _is_extended(sample)), None)
+                if previous is not None:
+                    samples.insert(0, previous)
+            return samples
+
+    def __enter__(self) -> "SystemSampler":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        self.stop()
+
+
+_sampler: Optional[SystemSampler] = None
+
+
+def start_system_sampler(interval: float = 0.1, capacity: int = 6000) -> SystemSampler:
+    """Start the process-wide sampler consulted by ``capture_system_snapshot``."""
+    global _sampler
+    if _sampler is None:
+        _sampler = SystemSampler(interval=interval, capacity=capacity).start()
+        atexit.register(_sampler.stop)
+    return _sampler
+
+
+def stop_system_sampler() -> None:
+    global _sampler
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
+
+
+def capture_system_snapshot(start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, Any]:
+    """Utilization during ``[start, end]`` if the background sampler is running.
+
+    Without a running sampler this takes a single utilization, memory and
+    temperature reading using the persistent NVML session.
+    """
+    if _sampler is not None:
+        end = end if end is not None else time.perf_counter()
+        samples = _sampler.window(start if start is not None else end, end)
+        if samples:
+            return summarize_samples(samples)
+    snapshot = sample_system()
+    snapshot.pop("timestamp")
     return snapshot
 
 
 @contextmanager
 def time_it() -> Dict[str, Any]:
     start = time.perf_counter()
-    data: Dict[str, Any] = {}
+    data: Dict[str, Any] = {"start": start}
     try:
         yield data
     finally:
-        data["latency_ms"] = (time.perf_counter() - start) * 1000
+        data["end"] = time.perf_counter()
+        data["latency_ms"] = (data["end"] - start) * 1000
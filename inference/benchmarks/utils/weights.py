@@ -0,0 +1,40 @@
+"""Locate model weights so startup can be split into download and load."""
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+# Files engines read at startup; safetensors win when a repo also ships `.bin` copies.
+WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth", ".gguf", ".engine")
+# What `fetch_weights` pulls from the Hub: configs, tokenizers and safetensors shards.
+DOWNLOAD_PATTERNS = ["*.json", "*.safetensors", "*.model", "*.tiktoken", "*.txt"]
+
+
+def fetch_weights(model: str) -> Optional[Path]:
+    """Local directory with ``model``'s weights, downloading them from the Hub if needed.
+
+    Returns ``None`` when ``model`` is neither a directory nor a Hub repo,
+    leaving the engine to resolve it. Already-cached repos are not downloaded
+    again, so this phase then only costs a metadata check.
+    """
+    if os.path.isdir(model):
+        return Path(model)
+    from huggingface_hub import snapshot_download
+
+    try:
+        return Path(snapshot_download(model, allow_patterns=DOWNLOAD_PATTERNS))
+    except Exception as exc:  # noqa: BLE001 - the engine reports real load failures
+        logging.warning("Could not fetch weights for `%s` ahead of engine setup: %s", model, exc)
+        return None
+
+
+def weight_bytes(path: Optional[Path]) -> Optional[int]:
+    """Total size of the weight files under ``path``, or ``None`` if there are none."""
+    if path is None:
+        return None
+    files = [file for file in Path(path).rglob("*") if file.suffix in WEIGHT_SUFFIXES and file.is_file()]
+    safetensors = [file for file in files if file.suffix == ".safetensors"]
+    total = sum(file.stat().st_size for file in safetensors or files)
+    return total or None
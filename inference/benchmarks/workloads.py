@@ -0,0 +1,388 @@
+"""Prompt workloads for benchmark suites.
+
+A workload is an iterable of :class:`Request` objects. Iterating it again
+starts a fresh pass, and file-backed workloads re-read their file on each
+pass instead of holding it in memory.
+"""
+from __future__ import annotations
+
+import json
+import math
+import random
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+TokenCounter = Callable[[str], int]
+
+WORKLOAD_TYPES = ("prompts", "jsonl", "sharegpt", "synthetic", "conversations")
+PROMPT_FIELDS = ("prompt", "text", "body", "instruction", "input", "question")
+LENGTH_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal")
+HUMAN_ROLES = ("human", "user")
+ASSISTANT_ROLES = ("gpt", "assistant", "chatgpt", "bing", "bard")
+
+# Common English words that most LLM tokenizers encode as a single token
+# when preceded by a space, so a synthetic prompt of N words is ~N tokens.
+_WORDS = (
+    "the of and to in is you that it he was for on are as with his they at be this have from or one had by "
+    "word but not what all were we when your can said there use an each which she do how their if will up "
+    "other about out many then them these so some her would make like him into time has look two more write "
+    "go see number no way could people my than first water been call who oil its now find long down day did "
+    "get come made may part over new sound take only little work know place year live me back give most very "
+    "after thing our just name good sentence man think say great where help through much before line right "
+    "too mean old any same tell boy follow came want show also around form three small set put end does "
+    "another well large must big even such because turn here why ask went men read need land different home "
+    "us move try kind hand picture again change off play spell air away animal house point page letter mother"
+).split()
+
+
+@dataclass
+class Request:
+    """A single prompt and, optionally, its own generation limit.
+
+    Conversation workloads also set ``conversation`` and ``turn``, and
+    ``prefix_hit`` says whether an earlier request in the pass already sent
+    this prompt's prefix, i.e. whether a prefix cache could serve it.
+    """
+
+    prompt: str
+    max_new_tokens: Optional[int] = None
+    conversation: Optional[int] = None
+    turn: Optional[int] = None
+    prefix_hit: Optional[bool] = None
+
+
+def annotate_sample(sample: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    """Copy conversation metadata onto ``sample`` and label it a prefix-cache hit or miss.
+
+    The engine's own count of cached prompt tokens decides when the runner
+    reports one; otherwise the workload's expectation is used.
+    """
+    if request.conversation is not None:
+        sample["conversation"] = request.conversation
+        sample["turn"] = request.turn
+    cached = sample.get("cached_prompt_tokens")
+    if cached is not None:
+        sample["prefix_cache"] = "hit" if cached > 0 else "miss"
+    elif request.prefix_hit is not None:
+        sample["prefix_cache"] = "hit" if request.prefix_hit else "miss"
+    return sample
+
+
+def whitespace_token_count(text: str) -> int:
+    return len(text.split())
+
+
+def load_token_counter(tokenizer: Optional[str]) -> TokenCounter:
+    """Count tokens with a Hugging Face tokenizer, or approximate with words when unset."""
+    if tokenizer is None:
+        return whitespace_token_count
+    from transformers import AutoTokenizer
+
+    tok = AutoTokenizer.from_pretrained(tokenizer, use_fast=True)
+    return lambda text: len(tok.encode(text, add_special_tokens=False))
+
+
+def _iter_json_lines(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _iter_records(path: Path) -> Iterator[Dict[str, Any]]:
+    # ShareGPT dumps are usually one JSON array; only JSONL can be streamed.
+    if path.suffix == ".json":
+        with path.open("r", encoding="utf-8") as f:
+            yield from json.load(f)
+    else:
+        yield from _iter_json_lines(path)
+
+
+def iter_jsonl_requests(
+    path: Path,
+    prompt_field: Optional[str] = None,
+    max_new_tokens_field: str = "max_new_tokens",
+) -> Iterator[Request]:
+    """Yield one request per JSON line.
+
+    The prompt is read from ``prompt_field`` or, when unset, the first of
+    ``PROMPT_FIELDS`` present in the record. Records without a prompt are skipped.
+    """
+    for record in _iter_json_lines(path):
+        field = prompt_field or next((name for name in PROMPT_FIELDS if record.get(name)), None)
+        if field is None or not record.get(field):
+            continue
+        max_new_tokens = record.get(max_new_tokens_field)
+        yield Request(prompt=str(record[field]), max_new_tokens=int(max_new_tokens) if max_new_tokens else None)
+
+
+def iter_sharegpt_requests(path: Path, token_counter: TokenCounter = whitespace_token_count) -> Iterator[Request]:
+    """Yield the first user turn of each ShareGPT conversation.
+
+    ``max_new_tokens`` is set to the length of the assistant's reply so the
+    benchmark generates as much as the recorded conversation did.
+    """
+    for record in _iter_records(path):
+        turns = record.get("conversations") or record.get("messages") or []
+        prompt = reply = None
+        for turn in turns:
+            role = turn.get("from") or turn.get("role")
+            text = turn.get("value") or turn.get("content")
+            if prompt is None and role in HUMAN_ROLES and text:
+                prompt = text
+            elif prompt is not None and role in ASSISTANT_ROLES and text:
+                reply = text
+                break
+        if prompt is None:
+            continue
+        yield Request(prompt=prompt, max_new_tokens=max(1, token_counter(reply)) if reply else None)
+
+
+@dataclass
+class LengthDistribution:
+    """Token-length distribution for synthetic requests, clipped to ``[min, max]``.
+
+    ``mean`` and ``stddev`` describe the lengths themselves for both ``normal``
+    and ``lognormal``; ``uniform`` draws between ``min`` and ``max``.
+    """
+
+    distribution: str = "constant"
+    mean: float = 128
+    stddev: float = 0.0
+    min: int = 1
+    max: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "LengthDistribution":
+        if isinstance(data, (int, float)):
+            return cls(mean=data)
+        dist = cls(**data)
+        if dist.distribution not in LENGTH_DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown length distribution `{dist.distribution}`; expected one of {LENGTH_DISTRIBUTIONS}"
+            )
+        if dist.distribution == "uniform" and dist.max is None:
+            raise ValueError("A uniform length distribution requires `max`")
+        return dist
+
+    def sample(self, rng: random.Random) -> int:
+        if self.distribution == "uniform":
+            value: float = rng.uniform(self.min, self.max)
+        elif self.distribution == "normal":
+            value = rng.gauss(self.mean, self.stddev)
+        elif self.distribution == "lognormal":
+            sigma2 = math.log(1 + (self.stddev / self.mean) ** 2)
+            value = rng.lognormvariate(math.log(self.mean) - sigma2 / 2, math.sqrt(sigma2))
+        else:
+            value = self.mean
+        value = max(self.min, round(value))
+        return int(min(self.max, value) if self.max is not None else value)
+
+
+TextSampler = Callable[[random.Random, int], str]
+
+
+def sample_words(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choices(_WORDS, k=length))
+
+
+def load_text_sampler(tokenizer: Optional[str]) -> TextSampler:
+    """Random text of a given token length.
+
+    With ``tokenizer`` set, text is decoded from random token ids and is close
+    to exact; otherwise it is built from common words that usually map to one
+    token each.
+    """
+    if tokenizer is None:
+        return sample_words
+    from transformers import AutoTokenizer
+
+    tok = AutoTokenizer.from_pretrained(tokenizer, use_fast=True)
+    special = set(tok.all_special_ids)
+    vocab = [idx for idx in range(tok.vocab_size) if idx not in special]
+    return lambda rng, length: tok.decode(rng.choices(vocab, k=length))
+
+
+def iter_synthetic_requests(
+    num_requests: int,
+    input_tokens: LengthDistribution,
+    output_tokens: Optional[LengthDistribution] = None,
+    seed: Optional[int] = None,
+    sample_text: TextSampler = sample_words,
+) -> Iterator[Request]:
+    """Yield random prompts whose lengths follow ``input_tokens``.
+
+    Every prompt is drawn independently so engines cannot serve them from a
+    prefix cache. See ``load_text_sampler`` for how text is generated.
+    """
+    rng = random.Random(seed)
+    for _ in range(num_requests):
+        prompt = sample_text(rng, input_tokens.sample(rng))
+        yield Request(prompt=prompt, max_new_tokens=output_tokens.sample(rng) if output_tokens else None)
+
+
+def iter_conversation_requests(
+    num_conversations: int,
+    turns: LengthDistribution,
+    shared_prefix_tokens: LengthDistribution,
+    user_tokens: LengthDistribution,
+    output_tokens: Optional[LengthDistribution] = None,
+    num_shared_prefixes: int = 1,
+    prefix_reuse_ratio: float = 1.0,
+    seed: Optional[int] = None,
+    sample_text: TextSampler = sample_words,
+) -> Iterator[Request]:
+    """Yield multi-turn conversations that open with a system prompt, turn by turn.
+
+    A ``prefix_reuse_ratio`` share of conversations opens with one of
+    ``num_shared_prefixes`` shared system prompts; the rest get a system prompt
+    of their own. Every turn resends the conversation so far, with the
+    assistant replies filled in with synthetic text as long as that turn's
+    ``max_new_tokens``, so each prompt extends the previous one. Conversations
+    are yielded one after another, in turn order.
+    """
+    rng = random.Random(seed)
+    pool = [sample_text(rng, shared_prefix_tokens.sample(rng)) for _ in range(max(1, num_shared_prefixes))]
+    pool_sent = [False] * len(pool)
+    for conversation in range(num_conversations):
+        if rng.random() < prefix_reuse_ratio:
+            slot = rng.randrange(len(pool))
+            history, prefix_hit = pool[slot], pool_sent[slot]
+            pool_sent[slot] = True
+        else:
+            history, prefix_hit = sample_text(rng, shared_prefix_tokens.sample(rng)), False
+        for turn in range(max(1, turns.sample(rng))):
+            history += f"\n\nUser: {sample_text(rng, user_tokens.sample(rng))}\nAssistant:"
+            max_new_tokens = output_tokens.sample(rng) if output_tokens else None
+            yield Request(
+                prompt=history,
+                max_new_tokens=max_new_tokens,
+                conversation=conversation,
+                turn=turn,
+                prefix_hit=prefix_hit or turn > 0,
+            )
+            history += " " + sample_text(rng, max_new_tokens or user_tokens.sample(rng))
+
+
+def group_conversations(requests: Iterable[Request]) -> Iterator[List[Request]]:
+    """Group consecutive turns of each conversation so they can be sent in order.
+
+    A new group starts whenever the conversation changes or its turn number
+    does not advance (the next pass replaying it); requests outside any
+    conversation form groups of one.
+    """
+    group: List[Request] = []
+    for request in requests:
+        if group and (
+            request.conversation is None
+            or request.conversation != group[-1].conversation
+            or request.turn <= group[-1].turn
+        ):
+            yield group
+            group = []
+        group.append(request)
+    if group:
+        yield group
+
+
+class Workload:
+    """Re-iterable source of requests described by a suite's ``workload`` section.
+
+    ``type`` selects the source: ``prompts`` (an inline list), ``jsonl``,
+    ``sharegpt``, ``synthetic`` or ``conversations``. ``limit`` caps the
+    requests per pass.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = dict(config)
+        self.type = self.config.pop("type", "prompts")
+        self.limit = self.config.pop("limit", None)
+        if self.type not in WORKLOAD_TYPES:
+            raise ValueError(f"Unknown workload type `{self.type}`; expected one of {WORKLOAD_TYPES}")
+        if self.type in ("jsonl", "sharegpt"):
+            if "path" not in self.config:
+                raise ValueError(f"A `{self.type}` workload requires `path`")
+            self.path = Path(self.config["path"])
+            if not self.path.exists():
+                raise FileNotFoundError(f"Workload file {self.path} does not exist")
+        if self.type == "synthetic":
+            if "num_requests" not in self.config or "input_tokens" not in self.config:
+                raise ValueError("A `synthetic` workload requires `num_requests` and `input_tokens`")
+            self.input_tokens = LengthDistribution.from_dict(self.config["input_tokens"])
+            output = self.config.get("output_tokens")
+            self.output_tokens = LengthDistribution.from_dict(output) if output is not None else None
+        if self.type == "conversations":
+            required = ("num_conversations", "shared_prefix_tokens", "user_tokens")
+            if any(key not in self.config for key in required):
+                raise ValueError(f"A `conversations` workload requires {', '.join(f'`{key}`' for key in required)}")
+            ratio = self.config.get("prefix_reuse_ratio", 1.0)
+            if not 0.0 <= ratio <= 1.0:
+                raise ValueError("`prefix_reuse_ratio` must be between 0 and 1")
+            self.turns = LengthDistribution.from_dict(self.config.get("turns", 1))
+            self.shared_prefix_tokens = LengthDistribution.from_dict(self.config["shared_prefix_tokens"])
+            self.user_tokens = LengthDistribution.from_dict(self.config["user_tokens"])
+            output = self.config.get("output_tokens")
+            self.output_tokens = LengthDistribution.from_dict(output) if output is not None else None
+        self._token_counter: Optional[TokenCounter] = None
+        self._text_sampler: Optional[TextSampler] = None
+        self._passes = 0
+
+    def _sample_text(self) -> TextSampler:
+        # Loading a tokenizer and its vocabulary is slow; do it once, not every pass.
+        if self._text_sampler is None:
+            self._text_sampler = load_text_sampler(self.config.get("tokenizer"))
+        return self._text_sampler
+
+    def _requests(self) -> Iterator[Request]:
+        if self.type == "jsonl":
+            return iter_jsonl_requests(
+                self.path,
+                prompt_field=self.config.get("prompt_field"),
+                max_new_tokens_field=self.config.get("max_new_tokens_field", "max_new_tokens"),
+            )
+        if self.type == "sharegpt":
+            if self._token_counter is None:
+                self._token_counter = load_token_counter(self.config.get("tokenizer"))
+            return iter_sharegpt_requests(self.path, token_counter=self._token_counter)
+        if self.type == "synthetic":
+            seed = self.config.get("seed")
+            return iter_synthetic_requests(
+                self.config["num_requests"],
+                self.input_tokens,
+                self.output_tokens,
+                # Each pass draws new prompts while staying reproducible.
+                seed=seed + self._passes if seed is not None else None,
+                sample_text=self._sample_text(),
+            )
+        if self.type == "conversations":
+            seed = self.config.get("seed")
+            return iter_conversation_requests(
+                self.config["num_conversations"],
+                self.turns,
+                self.shared_prefix_tokens,
+                self.user_tokens,
+                self.output_tokens,
+                num_shared_prefixes=self.config.get("num_shared_prefixes", 1),
+                prefix_reuse_ratio=self.config.get("prefix_reuse_ratio", 1.0),
+                seed=seed + self._passes if seed is not None else None,
+                sample_text=self._sample_text(),
+            )
+        max_new_tokens = self.config.get("max_new_tokens")
+        return (Request(prompt=prompt, max_new_tokens=max_new_tokens) for prompt in self.config.get("prompts", []))
+
+    def __iter__(self) -> Iterator[Request]:
+        requests = self._requests()
+        self._passes += 1
+        return islice(requests, self.limit) if self.limit is not None else requests
+
+
+def build_workload(suite_config: Dict[str, Any]) -> Workload:
+    """Workload for a suite, falling back to its inline ``prompts`` list."""
+    if "workload" in suite_config:
+        if "prompts" in suite_config:
+            raise ValueError("A suite can set either `prompts` or `workload`, not both")
+        return Workload(suite_config["workload"])
+    return Workload({"prompts": suite_config.get("prompts", ["Hello, world! Explain Azure H100 benefits."])})
@@ -0,0 +1,88 @@
+"""CPU-only runners with injected delays for exercising the harness."""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from inference.benchmarks.runners.base import BenchmarkRunner
+
+
+class FakeRunner(BenchmarkRunner):
+    """Sleeps ``delay_s`` per request and tracks how many requests overlap.
+
+    Not thread-safe, like the in-process engines: concurrent calls are
+    detected and recorded in ``overlapping_calls``.
+    """
+
+    name = "fake"
+    request_params = ("delay_s", "max_new_tokens")
+    # Every runner set up in this process, so tests can inspect them afterwards.
+    instances: List["FakeRunner"] = []
+
+    def setup(self) -> None:
+        FakeRunner.instances.append(self)
+        # Lets scheduler tests check which (simulated) devices a suite was given.
+        self.startup["visible_devices"] = os.environ.get("CUDA_VISIBLE_DEVICES")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.overlapping_calls = 0
+        self.batch_sizes: List[int] = []
+        self.configure()
+
+    def configure(self) -> None:
+        self.delay_s = self.config.get("delay_s", 0.01)
+        self.max_new_tokens = self.config.get("max_new_tokens", 8)
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            if self.in_flight > 1 and not self.thread_safe:
+                self.overlapping_calls += 1
+
+    def _exit(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def _sample(self, prompt: str, latency_ms: float, max_new_tokens: Optional[int]) -> Dict[str, Any]:
+        return {
+            "prompt": prompt,
+            "output": "x",
+            "latency_ms": latency_ms,
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": max_new_tokens or self.max_new_tokens,
+        }
+
+    def run_once(self, prompt: str, max_new_tokens: Optional[int] = None) -> Dict[str, Any]:
+        self._enter()
+        try:
+            start = time.perf_counter()
+            time.sleep(self.delay_s)
+            return self._sample(prompt, (time.perf_counter() - start) * 1000, max_new_tokens)
+        finally:
+            self._exit()
+
+    def run_batch(
+        self, prompts: Sequence[str], max_new_tokens: Optional[Sequence[Optional[int]]] = None
+    ) -> List[Dict[str, Any]]:
+        self._enter()
+        try:
+            self.batch_sizes.append(len(prompts))
+            start = time.perf_counter()
+            time.sleep(self.delay_s)
+            latency_ms = (time.perf_counter() - start) * 1000
+            limits = max_new_tokens if max_new_tokens is not None else [None] * len(prompts)
+            return [self._sample(prompt, latency_ms, limit) for prompt, limit in zip(prompts, limits)]
+        finally:
+            self._exit()
+
+    def teardown(self) -> None:
+        pass
+
+
+class ThreadSafeFakeRunner(FakeRunner):
+    name = "fake-thread-safe"
+    thread_safe = True
@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pytest
+
+from inference.benchmarks.compare import BucketDistribution, bootstrap_delta, classify, index_suites, main
+from inference.benchmarks.run_benchmarks import run_suite
+
+FAKE = "tests.benchmarks.fake_runners.FakeRunner"
+
+
+def _summary(**suite):
+    return run_suite({"runner": FAKE, "prompts": ["a b", "c d e"], "repetitions": 10, **suite})
+
+
+def test_suites_differing_outside_params_are_kept_apart():
+    summaries = [
+        _summary(params={"delay_s": 0.001}),
+        _summary(params={"delay_s": 0.001}, load={"mode": "closed", "concurrency": 2}),
+        _summary(params={"delay_s": 0.001}, batch_size=2),
+        _summary(params={"delay_s": 0.001}, prompts=["other"]),
+        _summary(params={"delay_s": 0.001}, streaming=True),
+    ]
+    indexed = index_suites(summaries)
+    assert len(indexed) == 5
+    assert all(occurrence == 0 for _, _, occurrence in indexed)
+
+
+def test_bootstrap_handles_zero_baselines():
+    rng = np.random.default_rng(0)
+    zeros = BucketDistribution(np.array([0.0]), np.array([20]))
+    mixed = BucketDistribution(np.array([0.0, 1.0]), np.array([19, 1]))
+    result = bootstrap_delta(zeros, mixed, "mean", rng, num_resamples=50)
+    assert result["delta"] is None and result["ci"] is None
+    assert classify(result, higher_is_better=False, threshold=0.05) == "no interval"
+
+
+def test_compare_cli_matches_suites_across_files(tmp_path, capsys):
+    suites = [_summary(params={"delay_s": 0.001}), _summary(params={"delay_s": 0.001}, batch_size=2)]
+    baseline, candidate = tmp_path / "baseline.json", tmp_path / "candidate.json"
+    baseline.write_text(json.dumps(suites))
+    candidate.write_text(json.dumps(suites[::-1]))
+    main([str(baseline), str(candidate), "--output", str(tmp_path / "report.json")])
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert [entry["status"] for entry in report] == ["ok", "ok"]
+    assert {entry["suite"].get("batch_size") for entry in report} == {None, 2}
+
+
+def test_suite_throughput_is_bootstrapped_and_gates(tmp_path):
+    baseline, candidate = tmp_path / "baseline.json", tmp_path / "candidate.json"
+    baseline.write_text(json.dumps([_summary(params={"delay_s": 0.001, "max_new_tokens": 8})]))
+    # Same suite definition, but each request now returns half the tokens in the same time.
+    slower = _summary(params={"delay_s": 0.001, "max_new_tokens": 8})
+    rates = slower["results"]["output_rates"]
+    rates["buckets"] = [[index, tokens / 2, latency_s] for index, tokens, latency_s in rates["buckets"]]
+    candidate.write_text(json.dumps([slower]))
+    with pytest.raises(SystemExit):
+        main([str(baseline), str(candidate), "--output", str(tmp_path / "report.json")])
+    (entry,) = json.loads((tmp_path / "report.json").read_text())
+    (row,) = [row for row in entry["metrics"] if row["metric"] == "output_tokens_per_s"]
+    assert row["status"] == "regression"
+    assert row["delta"] == pytest.approx(-0.5, abs=0.15)
+    assert row["ci"][1] < 0
+
+
+def test_suites_missing_from_candidate_fail_unless_allowed(tmp_path):
+    suites = [_summary(params={"delay_s": 0.001}), _summary(params={"delay_s": 0.001}, batch_size=2)]
+    baseline, candidate = tmp_path / "baseline.json", tmp_path / "candidate.json"
+    baseline.write_text(json.dumps(suites))
+    candidate.write_text(json.dumps(suites[:1]))
+    with pytest.raises(SystemExit):
+        main([str(baseline), str(candidate)])
+    main([str(baseline), str(candidate), "--allow-missing"])
@@ -0,0 +1,78 @@
+import math
+import random
+
+import pytest
+
+from inference.benchmarks.utils.metrics import BenchmarkResults, StreamingHistogram
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+
+def test_quantiles_stay_within_the_relative_error():
+    rng = random.Random(0)
+    values = [rng.lognormvariate(3, 1) for _ in range(5000)]
+    histogram = StreamingHistogram(relative_error=0.01)
+    for value in values:
+        histogram.record(value)
+    for q in (0.01, 0.5, 0.9, 0.99, 0.999):
+        exact = _exact_quantile(values, q)
+        assert histogram.quantile(q) == pytest.approx(exact, rel=0.0101)
+    assert histogram.quantile(0.0) == pytest.approx(min(values), rel=0.0101)
+    assert histogram.quantile(1.0) == max(values)
+    assert histogram.mean == pytest.approx(sum(values) / len(values))
+
+
+def test_values_outside_the_range_land_in_the_edge_buckets():
+    histogram = StreamingHistogram(min_value=1.0, max_value=100.0)
+    for value in (0.0, 0.5, 1e6):
+        histogram.record(value)
+    # Everything below ``min_value`` shares the first bucket.
+    assert histogram.quantile(0.5) == 1.0
+    # Everything above ``max_value`` shares the last one, just past it.
+    assert histogram.quantile(1.0) == pytest.approx(100.0, rel=0.05)
+    assert histogram.min == 0.0 and histogram.max == 1e6
+    assert StreamingHistogram().quantile(0.5) is None
+
+
+def test_merge_matches_recording_everything_in_one_histogram():
+    rng = random.Random(1)
+    left_values = [rng.uniform(1, 10) for _ in range(300)]
+    right_values = [rng.uniform(5, 500) for _ in range(700)]
+    left, right, combined = StreamingHistogram(), StreamingHistogram(), StreamingHistogram()
+    for value in left_values:
+        left.record(value)
+        combined.record(value)
+    for value in right_values:
+        right.record(value)
+        combined.record(value)
+    left.merge(right)
+    assert list(left.counts) == list(combined.counts)
+    assert (left.count, left.min, left.max) == (combined.count, combined.min, combined.max)
+    assert left.mean == pytest.approx(combined.mean)
+    assert left.stddev == pytest.approx(combined.stddev)
+    assert left.quantile(0.99) == combined.quantile(0.99)
+
+    with pytest.raises(ValueError):
+        left.merge(StreamingHistogram(relative_error=0.05))
+
+
+def test_round_trip_through_dict():
+    histogram = StreamingHistogram()
+    for value in (1.0, 2.0, 2.0, 40.0):
+        histogram.record(value)
+    restored = StreamingHistogram.from_dict(histogram.to_dict())
+    assert restored.summary() == histogram.summary()
+    assert restored.buckets() == histogram.buckets()
+
+
+def test_results_keep_token_rates_for_suite_throughput():
+    results = BenchmarkResults(name="fake")
+    for tokens, latency_ms in ((10, 1000.0), (30, 1000.0), (5, None)):
+        results.add_sample({"completion_tokens": tokens, "latency_ms": latency_ms})
+    buckets = results.output_rates.buckets()
+    assert sum(count for count, _, _ in buckets) == 2
+    assert sum(tokens for _, tokens, _ in buckets) / sum(latency for _, _, latency in buckets) == 20.0
+    assert results.totals["completion_tokens"] == 45
@@ -0,0 +1,167 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from inference.benchmarks.run_benchmarks import run_suite
+from inference.benchmarks.utils.load import (
+    LoadConfig,
+    RequestCoalescer,
+    arrival_offsets,
+    generate_load,
+    run_closed_loop,
+    run_open_loop,
+)
+from tests.benchmarks.fake_runners import FakeRunner, ThreadSafeFakeRunner
+
+FAKE = "tests.benchmarks.fake_runners.FakeRunner"
+
+
+@pytest.fixture(autouse=True)
+def _reset_instances():
+    FakeRunner.instances.clear()
+
+
+def _runner(cls=ThreadSafeFakeRunner, **config):
+    runner = cls(config)
+    runner.setup()
+    return runner
+
+
+def test_closed_loop_caps_requests_in_flight():
+    runner = _runner(delay_s=0.02)
+    samples = []
+    completed = run_closed_loop(runner.run_once, [f"p{i}" for i in range(20)], 4, samples.append)
+    assert completed == len(samples) == 20
+    assert runner.max_in_flight == 4
+    assert all(sample["queue_delay_ms"] < 5 for sample in samples)
+
+
+def test_open_loop_reaches_target_qps():
+    runner = _runner(delay_s=0.005)
+    stats = generate_load(
+        runner.run_once,
+        [f"p{i}" for i in range(25)],
+        LoadConfig.from_dict({"mode": "open", "qps": 50, "arrival": "constant", "concurrency": 8}),
+        lambda sample: None,
+    )
+    assert stats["num_requests"] == 25
+    assert stats["achieved_qps"] == pytest.approx(50, rel=0.2)
+
+
+def test_open_loop_overload_accumulates_queue_delay():
+    runner = _runner(delay_s=0.02)
+    samples = []
+    run_open_loop(runner.run_once, [f"p{i}" for i in range(20)], 200, "constant", 1, samples.append)
+    assert runner.max_in_flight == 1
+    delays = [sample["queue_delay_ms"] for sample in sorted(samples, key=lambda s: s["start_offset_s"])]
+    # Requests arrive every 5 ms but take 20 ms, so each waits ~15 ms longer than the last.
+    assert delays[-1] > 150
+    assert delays[-1] > delays[len(delays) // 2] > delays[0]
+    assert all(s["end_to_end_ms"] >= s["queue_delay_ms"] + s["latency_ms"] * 0.9 for s in samples)
+
+
+def test_poisson_arrivals_match_rate():
+    offsets = arrival_offsets(100.0, "poisson", random.Random(0))
+    times = [next(offsets) for _ in range(5001)]
+    assert times[-1] / 5000 == pytest.approx(0.01, rel=0.05)
+
+
+def test_coalescer_serializes_and_batches_concurrent_calls():
+    runner = _runner(FakeRunner, delay_s=0.02)
+    with RequestCoalescer(runner.run_batch, max_batch_size=8) as coalescer:
+        start = threading.Barrier(16)
+
+        def call(i):
+            start.wait()
+            return coalescer(f"p{i}")
+
+        with ThreadPoolExecutor(16) as pool:
+            samples = list(pool.map(call, range(16)))
+    assert [sample["prompt"] for sample in samples] == [f"p{i}" for i in range(16)]
+    assert runner.overlapping_calls == 0
+    assert max(runner.batch_sizes) > 1
+    assert max(runner.batch_sizes) <= 8
+    assert all("batch_wait_ms" in sample for sample in samples)
+
+
+def test_coalescer_propagates_errors():
+    def fail(requests):
+        raise RuntimeError("engine failed")
+
+    with RequestCoalescer(fail) as coalescer:
+        with pytest.raises(RuntimeError, match="engine failed"):
+            coalescer("p")
+
+
+def test_run_suite_drives_non_thread_safe_runner_concurrently():
+    suite = {
+        "runner": FAKE,
+        "prompts": [f"prompt {i}" for i in range(8)],
+        "repetitions": 4,
+        "load": {"mode": "closed", "concurrency": 8},
+        "params": {"delay_s": 0.02},
+    }
+    summary = run_suite(suite)
+    (runner,) = FakeRunner.instances
+    assert summary["load"]["num_requests"] == 32
+    assert summary["results"]["num_samples"] == 32
+    assert runner.overlapping_calls == 0
+    assert max(runner.batch_sizes) > 1
+    assert summary["results"]["queue_delay_ms"]["count"] == 32
+
+
+def test_run_suite_rejects_concurrent_streaming_on_non_thread_safe_runner():
+    suite = {
+        "runner": FAKE,
+        "prompts": ["p"],
+        "streaming": True,
+        "load": {"mode": "closed", "concurrency": 4},
+    }
+    with pytest.raises(ValueError, match="streams one request at a time"):
+        run_suite(suite)
+
+
+CONVERSATIONS = {
+    "type": "conversations",
+    "num_conversations": 6,
+    "seed": 0,
+    "turns": 3,
+    "shared_prefix_tokens": 16,
+    "user_tokens": 4,
+    "output_tokens": 4,
+}
+
+
+@pytest.mark.parametrize(
+    "load",
+    [{"mode": "closed", "concurrency": 4}, {"mode": "open", "qps": 1000, "concurrency": 4}],
+    ids=["closed", "open"],
+)
+def test_conversation_turns_wait_for_the_previous_turn(load):
+    suite = {
+        "runner": "tests.benchmarks.fake_runners.ThreadSafeFakeRunner",
+        "workload": CONVERSATIONS,
+        "load": load,
+        "params": {"delay_s": 0.02},
+    }
+    samples = []
+    summary = run_suite(suite, sample_writer=samples.append)
+    assert summary["load"]["num_requests"] == 18
+    (runner,) = FakeRunner.instances
+    # Conversations run concurrently, turns within one never do.
+    assert runner.max_in_flight > 1
+    by_conversation = {}
+    for sample in samples:
+        by_conversation.setdefault(sample["conversation"], []).append(sample)
+    for turns in by_conversation.values():
+        turns.sort(key=lambda sample: sample["turn"])
+        for previous, current in zip(turns, turns[1:]):
+            assert current["start_offset_s"] >= previous["start_offset_s"] + previous["latency_ms"] / 1000
+
+
+def test_conversation_workloads_reject_batching():
+    suite = {"runner": FAKE, "workload": CONVERSATIONS, "batch_size": 4}
+    with pytest.raises(ValueError, match="cannot be batched"):
+        run_suite(suite)
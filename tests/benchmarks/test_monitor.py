@@ -0,0 +1,35 @@
+from inference.benchmarks.utils.monitor import MonitorLogWriter, read_monitor_log, record_layout
+
+
+def _values(timestamp, num_gpus):
+    return [float(timestamp)] * sum(count for _, _, count in record_layout(num_gpus))
+
+
+def _write(path, num_gpus, timestamps, interval=1.0):
+    writer = MonitorLogWriter(path, list(range(num_gpus)), interval)
+    for timestamp in timestamps:
+        writer.write(_values(timestamp, num_gpus))
+    writer.close()
+    return writer.path
+
+
+def test_restart_appends_to_a_matching_log(tmp_path):
+    path = tmp_path / "system_metrics.bin"
+    _write(path, 2, [1, 2])
+    # A crash mid-record leaves a partial record that must not shift later ones.
+    with path.open("ab") as f:
+        f.write(b"\x00" * 5)
+    assert _write(path, 2, [3]) == path
+    log = read_monitor_log(path)
+    assert log["timestamp"].tolist() == [1, 2, 3]
+    assert log["gpu_utilization"].shape == (3, 2)
+
+
+def test_restart_with_another_layout_rolls_to_a_new_file(tmp_path):
+    path = tmp_path / "system_metrics.bin"
+    _write(path, 2, [1, 2])
+    rolled = _write(path, 1, [3])
+    assert rolled == tmp_path / "system_metrics.1.bin"
+    assert _write(path, 2, [4], interval=5.0) == tmp_path / "system_metrics.2.bin"
+    assert read_monitor_log(path)["timestamp"].tolist() == [1, 2]
+    assert read_monitor_log(rolled)["gpu_utilization"].shape == (1, 1)
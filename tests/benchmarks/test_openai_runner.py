@@ -0,0 +1,148 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from inference.benchmarks.runners.openai_runner import OpenAICompatibleRunner
+
+
+class StubServer(ThreadingHTTPServer):
+    """OpenAI-compatible stub; ``pieces`` are streamed as separate SSE events."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests = []
+        self.pieces = ["Hello", " wor", "ld"]
+        self.completion_tokens = 5
+        self.send_usage = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def _choice(self, piece, chat, stream):
+        if not chat:
+            return {"index": 0, "text": piece}
+        return {"index": 0, ("delta" if stream else "message"): {"role": "assistant", "content": piece}}
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.requests.append((self.path, body))
+        chat = self.path == "/v1/chat/completions"
+        usage = {
+            "prompt_tokens": 7,
+            "completion_tokens": server.completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 4},
+        }
+        if not body["stream"]:
+            payload = json.dumps({"choices": [self._choice("".join(server.pieces), chat, False)], "usage": usage})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload.encode())
+            return
+        events = [{"choices": [self._choice(piece, chat, True)]} for piece in server.pieces]
+        if server.send_usage:
+            events.append({"choices": [], "usage": usage})
+        stream = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(stream)))
+        self.end_headers()
+        self.wfile.write(stream.encode())
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["completions", "chat"])
+def endpoint(request):
+    return request.param
+
+
+def _runner(server, endpoint):
+    return OpenAICompatibleRunner({"base_url": server.url, "endpoint": endpoint, "model": "stub", "max_new_tokens": 16})
+
+
+def test_run_once(server, endpoint):
+    with _runner(server, endpoint) as runner:
+        sample = runner.run_once("Hi", max_new_tokens=3)
+    assert sample["output"] == "Hello world"
+    assert sample["prompt_tokens"] == 7
+    assert sample["completion_tokens"] == 5
+    assert sample["cached_prompt_tokens"] == 4
+    path, body = server.requests[0]
+    assert path == f"/v1/{'chat/' if endpoint == 'chat' else ''}completions"
+    assert body["max_tokens"] == 3
+    assert not body["stream"]
+    if endpoint == "chat":
+        assert body["messages"] == [{"role": "user", "content": "Hi"}]
+    else:
+        assert body["prompt"] == "Hi"
+
+
+def test_streaming_reconciles_usage(server, endpoint):
+    with _runner(server, endpoint) as runner:
+        sample = runner.run_streaming("Hi")
+    assert sample["output"] == "Hello world"
+    # Three text events, but the usage report says five tokens were generated.
+    assert sample["completion_tokens"] == 5
+    assert sample["prompt_tokens"] == 7
+    assert sample["cached_prompt_tokens"] == 4
+    assert len(sample["itl_ms"]) == 2
+    assert sample["ttft_ms"] <= sample["latency_ms"]
+    _, body = server.requests[0]
+    assert body["stream"] and body["stream_options"] == {"include_usage": True}
+    assert body["max_tokens"] == 16
+
+
+def test_streaming_without_usage_counts_events(server, endpoint):
+    server.send_usage = False
+    with _runner(server, endpoint) as runner:
+        sample = runner.run_streaming("Hi")
+    assert sample["output"] == "Hello world"
+    assert sample["completion_tokens"] == 3
+    assert sample["prompt_tokens"] is None
+    assert sample["cached_prompt_tokens"] is None
+
+
+def test_run_batch_issues_requests_concurrently(server):
+    with _runner(server, "completions") as runner:
+        samples = runner.run_batch(["a", "b", "c"], [1, None, 2])
+    assert [sample["prompt"] for sample in samples] == ["a", "b", "c"]
+    assert all(sample["batch_size"] == 3 for sample in samples)
+    assert sorted(body["max_tokens"] for _, body in server.requests) == [1, 2, 16]
+
+
+def test_http_errors_raise(server):
+    with OpenAICompatibleRunner({"base_url": server.url + "/missing", "endpoint": "chat"}) as runner:
+        runner.path = "/nope"
+        server.RequestHandlerClass = type("NotFound", (StubHandler,), {"do_POST": lambda self: self.send_error(404)})
+        with pytest.raises(Exception, match="404"):
+            runner.run_once("Hi")
+        with pytest.raises(Exception, match="404"):
+            runner.run_streaming("Hi")
+
+
+def test_unknown_endpoint_is_rejected():
+    with pytest.raises(ValueError, match="Unknown endpoint"):
+        OpenAICompatibleRunner({"endpoint": "embeddings"}).setup()
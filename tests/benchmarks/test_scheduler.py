@@ -0,0 +1,45 @@
+import pytest
+
+from inference.benchmarks.scheduler import SuiteScheduler
+
+FAKE = "tests.benchmarks.fake_runners.FakeRunner"
+
+
+def _suite(num_gpus, runner=FAKE):
+    return {"runner": runner, "prompts": ["p"], "num_gpus": num_gpus, "params": {"delay_s": 0.05}}
+
+
+def _run(scheduler, suites):
+    started, completed = [], {}
+    failures = scheduler.run(
+        list(enumerate(suites)),
+        on_start=lambda index, suite: started.append(index),
+        on_complete=lambda index, suite, summary: completed.__setitem__(index, summary),
+    )
+    return started, completed, failures
+
+
+def test_packs_suites_onto_simulated_devices():
+    suites = [_suite(2), _suite(1), _suite(1), _suite(4), _suite(1, runner="tests.benchmarks.fake_runners.Missing")]
+    started, completed, failures = _run(SuiteScheduler(["0", "1", "2"]), suites)
+    assert sorted(completed) == [0, 1, 2]
+    assert completed[0]["startup"]["visible_devices"] == "0,1"
+    # Suite 1 fills the device suite 0 leaves free; suite 2 waits for one to be released.
+    assert completed[1]["startup"]["visible_devices"] == "2"
+    assert len(completed[2]["startup"]["visible_devices"].split(",")) == 1
+    assert "requires 4 GPUs" in failures[3]
+    assert "Missing" in failures[4]
+    assert 3 not in started
+
+
+def test_max_parallel_runs_suites_one_at_a_time():
+    started, completed, failures = _run(SuiteScheduler(["0", "1"], max_parallel=1), [_suite(1), _suite(1)])
+    assert not failures
+    # With a single slot every suite gets the first device.
+    assert [completed[index]["startup"]["visible_devices"] for index in (0, 1)] == ["0", "0"]
+
+
+@pytest.mark.parametrize("devices, max_parallel", [(["0"], 0), ([], None)])
+def test_rejects_configurations_that_cannot_run(devices, max_parallel):
+    with pytest.raises(ValueError):
+        SuiteScheduler(devices, max_parallel=max_parallel)
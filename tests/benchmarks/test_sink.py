@@ -0,0 +1,30 @@
+import pytest
+
+from inference.benchmarks.utils.sink import ResultSink, read_records
+
+
+def _write_suite(sink, index=0):
+    suite = {"runner": "fake", "params": {"index": index}}
+    run_id = sink.start_suite(index, suite)
+    sink.finish_suite(index, suite, run_id, {"runner": "fake"})
+    return suite
+
+
+def test_existing_results_are_kept_unless_resuming_or_overwriting(tmp_path):
+    path = tmp_path / "results.jsonl"
+    sink = ResultSink(path)
+    _write_suite(sink)
+    sink.close()
+
+    with pytest.raises(FileExistsError):
+        ResultSink(path)
+    assert len(list(read_records(path))) == 2
+
+    resumed = ResultSink(path, resume=True)
+    assert len(resumed.completed_suites()) == 1
+    resumed.close()
+
+    ResultSink(path, overwrite=True).close()
+    assert list(read_records(path)) == []
+    # An empty sink is not worth protecting.
+    ResultSink(path).close()
@@ -0,0 +1,59 @@
+import pytest
+
+from inference.benchmarks.sweep import expand_sweep, pareto_frontier, sweep_points
+
+
+def test_grid_enumerates_the_cartesian_product_in_order():
+    points = list(sweep_points([[1, 2], ["a", "b", "c"]]))
+    assert points == [(i, j) for i in range(2) for j in range(3)]
+
+
+def test_random_draws_distinct_points_reproducibly():
+    levels = [list(range(10)), list(range(10))]
+    points = list(sweep_points(levels, "random", samples=20, seed=3))
+    assert len(points) == len(set(points)) == 20
+    assert points == list(sweep_points(levels, "random", samples=20, seed=3))
+    # Asking for more points than the grid has yields the whole grid.
+    assert len(list(sweep_points([[1, 2]], "random", samples=5))) == 2
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_latin_hypercube_covers_every_level_evenly(seed):
+    levels = [list(range(4)), list(range(8))]
+    points = list(sweep_points(levels, "lhs", samples=8, seed=seed))
+    # With as many samples as levels each stratum maps to one level, so no point repeats.
+    assert sorted(point[1] for point in points) == list(range(8))
+    assert sorted(point[0] for point in points) == [0, 0, 1, 1, 2, 2, 3, 3]
+
+
+def test_bare_axes_map_to_params_suite_keys_and_load():
+    suite = {
+        "runner": "fake",
+        "load": {"mode": "closed"},
+        "sweep": {
+            "axes": {
+                "max_new_tokens": [8],
+                "repetitions": [2],
+                "concurrency": [4],
+                "qps": [10.0],
+                "params.engine_args.max_num_seqs": [64],
+            }
+        },
+    }
+    (expanded,) = expand_sweep(suite)
+    assert expanded["params"] == {"max_new_tokens": 8, "engine_args": {"max_num_seqs": 64}}
+    assert expanded["repetitions"] == 2
+    assert expanded["load"] == {"mode": "closed", "concurrency": 4, "qps": 10.0}
+    assert expanded["sweep_point"]["concurrency"] == 4
+    assert "sweep" not in expanded
+
+
+def test_pareto_frontier_drops_dominated_points():
+    points = [
+        {"name": "fast", "output_tokens_per_s": 100.0, "p99_latency_ms": 50.0},
+        {"name": "dominated", "output_tokens_per_s": 90.0, "p99_latency_ms": 60.0},
+        {"name": "busy", "output_tokens_per_s": 200.0, "p99_latency_ms": 120.0},
+        {"name": "tie_slower", "output_tokens_per_s": 200.0, "p99_latency_ms": 130.0},
+        {"name": "snappy", "output_tokens_per_s": 20.0, "p99_latency_ms": 10.0},
+    ]
+    assert [point["name"] for point in pareto_frontier(points)] == ["busy", "fast", "snappy"]
@@ -0,0 +1,209 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from inference.benchmarks.utils.system import RATE_KEYS, NvmlSession, SystemSampler, summarize_samples
+
+
+class NVMLError(Exception):
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+
+class FakeNvml:
+    """Stands in for ``pynvml`` with scripted readings for each device.
+
+    Cumulative counters live in ``counters`` and are advanced by the tests.
+    """
+
+    NVML_CLOCK_SM = 1
+    NVML_CLOCK_MEM = 2
+    NVML_TEMPERATURE_GPU = 0
+    NVML_ERROR_NOT_SUPPORTED = 3
+    NVML_ERROR_UNKNOWN = 999
+    NVML_PCIE_UTIL_TX_BYTES = 0
+    NVML_PCIE_UTIL_RX_BYTES = 1
+    NVML_FI_DEV_PCIE_COUNT_TX_BYTES = 10
+    NVML_FI_DEV_PCIE_COUNT_RX_BYTES = 11
+    NVML_FI_DEV_NVLINK_THROUGHPUT_DATA_TX = 12
+    NVML_FI_DEV_NVLINK_THROUGHPUT_DATA_RX = 13
+
+    def __init__(self, device_count=1, unsupported=(), failing=()):
+        self.device_count = device_count
+        self.unsupported = set(unsupported)
+        # Queries that fail with a transient error until removed from the set.
+        self.failing = set(failing)
+        self.calls = {}
+        # Field id -> counter value (bytes for PCIe, KiB for NVLink); energy in mJ.
+        self.counters = {10: 0, 11: 0, 12: 0, 13: 0}
+        self.energy_mj = 0
+
+    def _call(self, name, value):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if name in self.unsupported:
+            raise NVMLError(self.NVML_ERROR_NOT_SUPPORTED)
+        if name in self.failing:
+            raise NVMLError(self.NVML_ERROR_UNKNOWN)
+        return value
+
+    def nvmlInit(self):
+        pass
+
+    def nvmlShutdown(self):
+        pass
+
+    def nvmlDeviceGetCount(self):
+        return self.device_count
+
+    def nvmlDeviceGetHandleByIndex(self, idx):
+        return idx
+
+    def nvmlDeviceGetUtilizationRates(self, handle):
+        return self._call("utilization", SimpleNamespace(gpu=50, memory=20))
+
+    def nvmlDeviceGetMemoryInfo(self, handle):
+        return self._call("memory", SimpleNamespace(used=2 * 2**30, total=80 * 2**30))
+
+    def nvmlDeviceGetPowerUsage(self, handle):
+        return self._call("power", 300_000)
+
+    def nvmlDeviceGetEnforcedPowerLimit(self, handle):
+        return self._call("power_limit", 700_000)
+
+    def nvmlDeviceGetClockInfo(self, handle, clock):
+        return self._call("clock", 1500)
+
+    def nvmlDeviceGetCurrentClocksThrottleReasons(self, handle):
+        return self._call("throttle", 0)
+
+    def nvmlDeviceGetTemperature(self, handle, sensor):
+        return self._call("temperature", 60)
+
+    def nvmlDeviceGetComputeRunningProcesses(self, handle):
+        return self._call("processes", [])
+
+    def nvmlDeviceGetPcieThroughput(self, handle, counter):
+        return self._call("pcie_throughput", 3)
+
+    def nvmlDeviceGetTotalEnergyConsumption(self, handle):
+        return self._call("energy", self.energy_mj)
+
+    def nvmlDeviceGetFieldValues(self, handle, fields):
+        values = [
+            SimpleNamespace(nvmlReturn=0, value=SimpleNamespace(ullVal=self.counters[field_id]))
+            for field_id, _ in fields
+        ]
+        return self._call("field_values", values)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def _all_devices_visible(monkeypatch):
+    monkeypatch.delenv("CUDA_VISIBLE_DEVICES", raising=False)
+
+
+def test_counters_are_converted_to_rates_between_samples():
+    nvml, clock = FakeNvml(), FakeClock()
+    session = NvmlSession(nvml=nvml, clock=clock)
+    (first,) = session.sample_gpus(extended=True)
+    assert all(first[key] is None for key in RATE_KEYS)
+
+    clock.now += 2.0
+    nvml.counters[10] += 4000
+    nvml.counters[11] += 1000
+    nvml.counters[12] += 10
+    nvml.energy_mj += 500_000
+    (second,) = session.sample_gpus(extended=True)
+    assert second["pcie_tx_bytes_per_s"] == 2000.0
+    assert second["pcie_rx_bytes_per_s"] == 500.0
+    # NVLink counters are in KiB.
+    assert second["nvlink_tx_bytes_per_s"] == 5 * 1024
+    assert second["nvlink_rx_bytes_per_s"] == 0.0
+    assert second["average_power_w"] == 250.0
+
+    # A counter going backwards was reset; it is not reported as traffic.
+    clock.now += 1.0
+    nvml.counters[10] = 0
+    (third,) = session.sample_gpus(extended=True)
+    assert third["pcie_tx_bytes_per_s"] is None
+    assert third["average_power_w"] == 0.0
+
+
+def test_unsupported_queries_are_cached_and_not_substituted():
+    nvml = FakeNvml(unsupported={"power", "field_values", "energy"})
+    session = NvmlSession(nvml=nvml, clock=FakeClock())
+    for _ in range(3):
+        (gpu,) = session.sample_gpus(extended=True)
+    assert gpu["power_w"] is None and gpu["average_power_w"] is None
+    assert gpu["nvlink_tx_bytes_per_s"] is None
+    # Without PCIe byte counters there is no rate; the blocking throughput query is never made.
+    assert gpu["pcie_tx_bytes_per_s"] is None
+    assert "pcie_throughput" not in nvml.calls
+    assert nvml.calls["power"] == nvml.calls["field_values"] == nvml.calls["energy"] == 1
+    assert nvml.calls["temperature"] == 3
+
+
+def test_failing_utilization_and_memory_are_reported_as_missing():
+    nvml = FakeNvml(failing={"utilization", "memory"})
+    session = NvmlSession(nvml=nvml)
+    samples = [{"cpu_percent": 1.0, "memory_percent": 1.0, "gpus": session.sample_gpus(extended=True)} for _ in range(2)]
+    gpu = samples[0]["gpus"][0]
+    assert gpu["gpu_utilization"] is None and gpu["memory_used_bytes"] is None
+    assert gpu["power_w"] == 300.0
+    summary = summarize_samples(samples)["gpus"][0]
+    assert summary["gpu_utilization"] is None and summary["memory_used_bytes"] is None
+
+    # Transient errors are retried, so the readings come back once NVML recovers.
+    nvml.failing.clear()
+    (gpu,) = session.sample_gpus(extended=True)
+    assert gpu["gpu_utilization"] == 50.0 and gpu["memory_used_bytes"] == 2 * 2**30
+    assert nvml.calls["utilization"] == nvml.calls["memory"] == 3
+
+
+def test_sampler_keeps_running_after_a_failed_sample():
+    class FlakySession:
+        available = True
+
+        def __init__(self):
+            self.attempts = 0
+
+        def sample_gpus(self, extended=False, processes=False):
+            self.attempts += 1
+            if self.attempts == 1:
+                raise RuntimeError("driver hiccup")
+            return []
+
+    session = FlakySession()
+    with SystemSampler(interval=0.001, session=session) as sampler:
+        deadline = time.monotonic() + 2
+        while sampler.latest() is None and time.monotonic() < deadline:
+            time.sleep(0.005)
+    assert session.attempts > 1
+    assert sampler.latest() is not None
+
+
+def test_sampler_reads_extended_telemetry_at_the_lower_rate():
+    nvml = FakeNvml()
+    session = NvmlSession(nvml=nvml)
+    with SystemSampler(interval=0.001, session=session, extended_interval=3600) as sampler:
+        deadline = time.monotonic() + 2
+        while nvml.calls.get("utilization", 0) < 5 and time.monotonic() < deadline:
+            time.sleep(0.005)
+    assert nvml.calls["utilization"] >= 5
+    assert nvml.calls["power"] == nvml.calls["field_values"] == nvml.calls["processes"] == 1
+
+    # A window without an extended sample borrows the latest earlier one.
+    latest = sampler.latest()
+    window = sampler.window(latest["timestamp"], latest["timestamp"])
+    assert "power_w" not in window[-1]["gpus"][0]
+    summary = summarize_samples(window)["gpus"][0]
+    assert summary["power_w"] == 300.0 and summary["temperature_c"] == 60.0
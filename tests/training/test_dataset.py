@@ -0,0 +1,58 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+datasets = pytest.importorskip("datasets")
+pytest.importorskip("pyarrow")
+pytest.importorskip("transformers")
+
+from training.utils.dataset import IGNORE_INDEX, PackedCollator, hold_out, pack_sequences  # noqa: E402
+
+
+def _rows(packed):
+    return [dict(zip(packed, values)) for values in zip(*packed.values())]
+
+
+def test_concat_packing_continues_positions_and_pads_the_last_row():
+    packed = pack_sequences([[1, 2], [3]], block_size=4, pad_token_id=0)
+    assert set(packed) == {"input_ids", "attention_mask", "labels", "num_tokens", "num_documents", "truncated_tokens"}
+    assert packed["input_ids"] == [[1, 2, 3, 0]]
+    assert packed["attention_mask"] == [[1, 1, 1, 0]]
+    # Documents attend to each other, so only padding is ignored.
+    assert packed["labels"] == [[1, 2, 3, IGNORE_INDEX]]
+    assert packed["num_tokens"] == [3] and packed["num_documents"] == [2]
+
+
+def test_document_boundaries_restart_positions_and_mask_first_labels():
+    packed = pack_sequences([[1, 2, 3], [4, 5, 6, 7, 8]], block_size=4, pad_token_id=0, packing="position_ids")
+    assert packed["input_ids"] == [[1, 2, 3, 4], [5, 6, 7, 8]]
+    assert packed["position_ids"] == [[0, 1, 2, 0], [0, 1, 2, 3]]
+    # The first token of each document, and of a document continued from the
+    # previous row, cannot be predicted from its segment.
+    assert packed["labels"] == [[IGNORE_INDEX, 2, 3, IGNORE_INDEX], [IGNORE_INDEX, 6, 7, 8]]
+    assert packed["num_documents"] == [2, 0]
+
+
+def test_cu_seqlens_collation_flattens_rows_with_segment_offsets():
+    packed = pack_sequences([[1, 2, 3], [4, 5]], block_size=4, pad_token_id=0, packing="cu_seqlens")
+    assert packed["seq_lengths"] == [[3, 1], [1, 3]]
+    assert packed["position_ids"] == [[0, 1, 2, 0], [0, 0, 1, 2]]
+    assert packed["labels"][1] == [IGNORE_INDEX] * 4
+
+    batch = PackedCollator("cu_seqlens")(_rows(packed))
+    assert "attention_mask" not in batch
+    assert batch["input_ids"].tolist() == [[1, 2, 3, 4, 5, 0, 0, 0]]
+    assert batch["cu_seq_lens_q"].tolist() == [0, 3, 4, 5, 8]
+    assert batch["cu_seq_lens_q"].dtype == torch.int32
+    assert batch["max_length_q"] == batch["max_length_k"] == 3
+
+
+def test_hold_out_keeps_at_least_one_training_row():
+    dataset = datasets.Dataset.from_dict({"text": ["a", "b", "c"]})
+    rest, texts = hold_out(dataset, 1)
+    assert len(rest) == 2 and texts == ["c"]
+    rest, texts = hold_out(dataset, 10)
+    assert len(rest) == 1 and texts == ["b", "c"]
+
+    single = datasets.Dataset.from_dict({"text": ["only"]})
+    rest, texts = hold_out(single, 5)
+    assert rest is single and texts == []
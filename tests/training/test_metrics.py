@@ -0,0 +1,72 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("evaluate")
+
+from training.utils.metrics import ThroughputTracker  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _train_step(model, optimizer, tracker, clock, batch):
+    clock.now += 0.1
+    tracker.mark("data")
+    tracker.record_batch(batch)
+    loss = model(batch["input_ids"].float()).pow(2).mean()
+    loss.backward()
+    clock.now += 0.3
+    tracker.mark("forward_backward")
+    optimizer.step()
+    optimizer.zero_grad()
+    clock.now += 0.1
+    tracker.mark("optimizer")
+    tracker.step()
+
+
+def test_tracks_phases_and_rewinds_evaluation_on_a_tiny_cpu_model():
+    torch.manual_seed(0)
+    model = torch.nn.Linear(8, 8)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    clock = FakeClock()
+    tracker = ThroughputTracker(
+        sum(p.numel() for p in model.parameters()), peak_flops=1e9, cuda_events=False, clock=clock
+    )
+    batch = {"input_ids": torch.ones(2, 8, dtype=torch.long), "attention_mask": torch.ones(2, 8, dtype=torch.long)}
+    for _ in range(4):
+        _train_step(model, optimizer, tracker, clock, batch)
+    # An evaluation pass is excluded from both time and token counts.
+    tracker.checkpoint()
+    tracker.record_batch(batch)
+    clock.now += 5.0
+    tracker.rewind()
+
+    metrics = tracker.summary()
+    assert metrics["step_time_s"] == pytest.approx(0.5)
+    assert metrics["data_s"] == pytest.approx(0.1)
+    assert metrics["forward_backward_s"] == pytest.approx(0.3)
+    assert metrics["optimizer_s"] == pytest.approx(0.1)
+    assert metrics["tokens_per_s"] == pytest.approx(64 / 2.0)
+    assert metrics["mfu"] == pytest.approx(metrics["tokens_per_s"] * tracker.flops_per_token / 1e9)
+    assert tracker.totals()["tokens"] == 64
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs a CUDA device")
+def test_cuda_marks_do_not_synchronize(monkeypatch):
+    calls = []
+    monkeypatch.setattr(torch.cuda, "synchronize", lambda *args: calls.append(args))
+    tracker = ThroughputTracker(1, cuda_events=True)
+    x = torch.randn(256, 256, device="cuda")
+    for phase in ("data", "forward_backward", "optimizer"):
+        x = x @ x
+        tracker.mark(phase)
+    tracker.step()
+    assert not calls
+    metrics = tracker.summary()
+    assert metrics["forward_backward_s"] >= 0
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("datasets")
+pytest.importorskip("pyarrow")
+
+from training.utils.sampler import LengthGroupedBatchSampler  # noqa: E402
+
+LENGTHS = [random.Random(0).randint(1, 64) for _ in range(200)]
+
+
+def _flatten(batches):
+    return [idx for batch in batches for idx in batch]
+
+
+def test_token_budget_bounds_padded_batch_size():
+    sampler = LengthGroupedBatchSampler(LENGTHS, max_tokens=256, bucket_size=50)
+    batches = sampler.batches(0)
+    assert sorted(_flatten(batches)) == list(range(len(LENGTHS)))
+    for batch in batches:
+        assert max(LENGTHS[idx] for idx in batch) * len(batch) <= 256
+    # Grouping by length lets short examples share a batch.
+    assert max(len(batch) for batch in batches) > 256 // 64
+
+
+def test_batch_size_caps_examples_and_drop_last_discards_the_remainder():
+    sampler = LengthGroupedBatchSampler(LENGTHS, batch_size=16, bucket_size=len(LENGTHS), drop_last=True)
+    batches = sampler.batches(0)
+    assert all(len(batch) == 16 for batch in batches)
+    assert len(batches) == len(LENGTHS) // 16
+    # One bucket spanning the dataset means batches are sorted runs of lengths.
+    for batch in batches:
+        lengths = [LENGTHS[idx] for idx in batch]
+        assert lengths == sorted(lengths, reverse=True)
+
+
+def test_ranks_get_disjoint_equal_shares_of_the_same_batches():
+    common = dict(max_tokens=256, seed=3)
+    full = LengthGroupedBatchSampler(LENGTHS, **common).batches(0)
+    shards = [LengthGroupedBatchSampler(LENGTHS, num_replicas=3, rank=rank, **common).batches(0) for rank in range(3)]
+    assert len({len(shard) for shard in shards}) == 1
+    assert len(shards[0]) == len(full) // 3
+    for rank, shard in enumerate(shards):
+        assert shard == full[rank::3][: len(shard)]
+    indices = [idx for shard in shards for idx in _flatten(shard)]
+    assert len(set(indices)) == len(indices)
+
+
+def test_epochs_reshuffle_and_set_epoch_replays_one():
+    sampler = LengthGroupedBatchSampler(LENGTHS, batch_size=8)
+    first, second = list(sampler), list(sampler)
+    assert first != second
+    assert sorted(_flatten(first)) == sorted(_flatten(second))
+
+    sampler.set_epoch(0)
+    assert list(sampler) == first
+    # An explicitly set epoch is not advanced by iterating.
+    assert sampler.epoch == 0
+    assert len(sampler) == len(first)
+
+
+def test_requires_a_batch_size_or_token_budget():
+    with pytest.raises(ValueError):
+        LengthGroupedBatchSampler(LENGTHS)
@@ -6,26 +6,34 @@ from pathlib import Path
 from typing import Any, Dict
 
 import torch
-from accelerate import Accelerator
+from accelerate import Accelerator, DataLoaderConfiguration, DistributedType
+from accelerate.utils import gather_object
 from torch.optim import AdamW
 from torch.utils.data import DataLoader
 from transformers import AutoModelForCausalLM, DataCollatorForLanguageModeling, get_scheduler
 
+from inference.benchmarks.utils.profiling import ProfilingConfig, build_profiler
+from training.utils.checkpoint import AsyncCheckpointer, TrainingProgress
 from training.utils.config import DEFAULT_CONFIG, TrainingConfig
-from training.utils.dataset import prepare_dataset
+from training.utils.dataset import STREAMING_SHUFFLE_BUFFER, PackedCollator, prepare_dataset
+from training.utils.evaluation import Evaluator
 from training.utils.logging_utils import configure_logging, load_env, log_metrics
 from training.utils.metrics import (
-    compute_accuracy_metrics,
+    ThroughputTracker,
+    count_parameters,
+    peak_flops_per_device,
     report_final_metrics,
     start_background_monitor,
     stop_background_monitor,
 )
+from training.utils.sampler import LengthGroupedBatchSampler, example_lengths
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Fine-tune an LLM with Hugging Face Accelerate")
     parser.add_argument("--config", type=Path, help="Path to YAML config", default=None)
     parser.add_argument("--env-file", type=str, default=None, help="Optional path to .env file")
+    parser.add_argument("--resume", action="store_true", help="Continue from the latest complete checkpoint")
     return parser.parse_args()
 
 
@@ -35,22 +43,75 @@ def load_config(path: Path | None) -> TrainingConfig:
     return TrainingConfig.from_yaml(path)
 
 
+def run_evaluation(accelerator: Accelerator, evaluator: Evaluator, model: torch.nn.Module) -> Dict[str, Any]:
+    """Evaluate on the main process, or on every rank when parameters are sharded."""
+    sharded = accelerator.distributed_type in (DistributedType.FSDP, DistributedType.DEEPSPEED)
+    results: Dict[str, Any] = {}
+    if sharded or accelerator.is_main_process:
+        results = evaluator.run(accelerator.unwrap_model(model), synced_gpus=sharded)
+    accelerator.wait_for_everyone()
+    return results
+
+
 def main() -> None:
     args = parse_args()
     load_env(args.env_file)
 
     cfg = load_config(args.config)
 
-    accelerator = Accelerator()
+    # A seedable sampler makes each epoch's shuffle order reproducible on resume.
+    accelerator = Accelerator(dataloader_config=DataLoaderConfiguration(use_seedable_sampler=True))
     cfg.output_dir.mkdir(parents=True, exist_ok=True)
     log_path = configure_logging(cfg.output_dir)
 
-    monitor_process = start_background_monitor(cfg.output_dir / "system_metrics.jsonl", interval=5.0)
+    monitor = start_background_monitor(cfg.output_dir / "system_metrics.bin", interval=5.0)
 
     try:
-        tokenized = prepare_dataset(cfg.dataset_path, cfg.base_model_name, cfg.max_seq_length)
-        data_collator = DataCollatorForLanguageModeling(tokenizer=tokenized.tokenizer, mlm=False)
-        dataloader = DataLoader(tokenized.dataset, batch_size=cfg.batch_size, shuffle=True, collate_fn=data_collator)
+        if cfg.dataset_streaming and cfg.max_steps is None:
+            raise ValueError("`dataset_streaming` requires `max_steps` because the dataset length is unknown")
+        if cfg.group_by_length and (cfg.packing != "none" or cfg.dataset_streaming):
+            raise ValueError("`group_by_length` requires an unpacked, non-streaming dataset")
+        tokenized = prepare_dataset(
+            cfg.dataset_path,
+            cfg.base_model_name,
+            cfg.max_seq_length,
+            streaming=cfg.dataset_streaming,
+            num_proc=cfg.dataset_num_proc,
+            packing=cfg.packing,
+            cache_dir=cfg.dataset_cache_dir,
+            tokenizer_revision=cfg.tokenizer_revision,
+            pad_to_max_length=not cfg.group_by_length,
+            eval_holdout=cfg.eval_holdout,
+        )
+        evaluator = Evaluator(
+            tokenized.tokenizer,
+            tokenized.eval_texts,
+            batch_size=cfg.eval_batch_size,
+            prompt_tokens=cfg.eval_prompt_tokens,
+            max_new_tokens=cfg.eval_max_new_tokens,
+            metric=cfg.eval_metric,
+        )
+        if cfg.packing != "none":
+            data_collator = PackedCollator(cfg.packing)
+        else:
+            data_collator = DataCollatorForLanguageModeling(
+                tokenizer=tokenized.tokenizer, mlm=False, pad_to_multiple_of=8 if cfg.group_by_length else None
+            )
+        train_dataset = tokenized.dataset
+        if cfg.dataset_streaming:
+            train_dataset = train_dataset.shuffle(seed=0, buffer_size=STREAMING_SHUFFLE_BUFFER)
+        batch_sampler = None
+        if cfg.group_by_length:
+            batch_sampler = LengthGroupedBatchSampler(
+                example_lengths(train_dataset),
+                batch_size=None if cfg.max_tokens_per_batch else cfg.batch_size,
+                max_tokens=cfg.max_tokens_per_batch,
+            )
+            dataloader = DataLoader(train_dataset, batch_sampler=batch_sampler, collate_fn=data_collator)
+        else:
+            dataloader = DataLoader(
+                train_dataset, batch_size=cfg.batch_size, shuffle=not cfg.dataset_streaming, collate_fn=data_collator
+            )
 
         model = AutoModelForCausalLM.from_pretrained(cfg.base_model_name, torch_dtype="auto")
         model.resize_token_embeddings(len(tokenized.tokenizer))
@@ -61,56 +122,128 @@ def main() -> None:
             cfg.lr_scheduler_type,
             optimizer=optimizer,
             num_warmup_steps=100,
-            num_training_steps=max(1, len(dataloader) * cfg.num_epochs),
+            num_training_steps=max(1, cfg.max_steps or len(dataloader) * cfg.num_epochs),
         )
 
+        tracker = ThroughputTracker(
+            count_parameters(model),
+            peak_flops=cfg.peak_tflops * 1e12 if cfg.peak_tflops else peak_flops_per_device(),
+            world_size=accelerator.num_processes,
+        )
         model, optimizer, dataloader, lr_scheduler = accelerator.prepare(model, optimizer, dataloader, lr_scheduler)
+        profiler = build_profiler(
+            ProfilingConfig.from_dict(
+                {
+                    "mode": cfg.profile_mode,
+                    "start": cfg.profile_start_step,
+                    "steps": cfg.profile_steps,
+                    "top_n": cfg.profile_top_n,
+                }
+            ),
+            cfg.output_dir / "profile",
+            rank=accelerator.process_index,
+        )
 
-        global_step = 0
+        checkpointer = None
+        progress = TrainingProgress()
+        if cfg.checkpoint_steps or args.resume:
+            if accelerator.distributed_type in (DistributedType.FSDP, DistributedType.DEEPSPEED):
+                raise ValueError("Checkpointing in this script supports single-device and DDP runs only")
+            checkpointer = AsyncCheckpointer(
+                cfg.output_dir / "checkpoints", keep=cfg.checkpoint_keep, is_main_process=accelerator.is_main_process
+            )
+        if args.resume:
+            resumed = checkpointer.load_latest(
+                accelerator.unwrap_model(model), optimizer, lr_scheduler, process_index=accelerator.process_index
+            )
+            if resumed is not None:
+                progress = resumed
+                accelerator.print(f"Resuming from step {progress.global_step} (epoch {progress.epoch + 1})")
+
+        global_step = progress.global_step
         model.train()
-        for epoch in range(cfg.num_epochs):
-            for step, batch in enumerate(dataloader):
-                outputs = model(**batch)
-                loss = outputs.loss / cfg.gradient_accumulation_steps
-                accelerator.backward(loss)
-
-                if (step + 1) % cfg.gradient_accumulation_steps == 0:
-                    optimizer.step()
-                    lr_scheduler.step()
-                    optimizer.zero_grad()
-                    global_step += 1
-
-                    if global_step % cfg.logging_steps == 0:
-                        accelerator.print(f"Step {global_step}: loss={loss.item():.4f}")
-                        log_metrics(global_step, {"loss": loss.item(), "learning_rate": lr_scheduler.get_last_lr()[0]})
-
-            accelerator.print(f"Completed epoch {epoch + 1}/{cfg.num_epochs}")
+        try:
+            for epoch in range(progress.epoch, cfg.num_epochs):
+                if hasattr(dataloader, "set_epoch"):
+                    dataloader.set_epoch(epoch)
+                if batch_sampler is not None:
+                    batch_sampler.set_epoch(epoch)
+                skipped = progress.batches_in_epoch if epoch == progress.epoch else 0
+                epoch_dataloader = accelerator.skip_first_batches(dataloader, skipped) if skipped else dataloader
+                for step, batch in enumerate(epoch_dataloader):
+                    tracker.mark("data")
+                    tracker.record_batch(batch)
+                    outputs = model(**batch)
+                    loss = outputs.loss / cfg.gradient_accumulation_steps
+                    accelerator.backward(loss)
+                    tracker.mark("forward_backward")
+
+                    if (step + 1) % cfg.gradient_accumulation_steps == 0:
+                        optimizer.step()
+                        lr_scheduler.step()
+                        optimizer.zero_grad()
+                        tracker.mark("optimizer")
+                        tracker.step()
+                        global_step += 1
+                        if profiler is not None:
+                            profiler.step()
+
+                        if global_step % cfg.logging_steps == 0:
+                            accelerator.print(f"Step {global_step}: loss={loss.item():.4f}")
+                            log_metrics(
+                                global_step,
+                                {
+                                    "loss": loss.item(),
+                                    "learning_rate": lr_scheduler.get_last_lr()[0],
+                                    **tracker.summary(),
+                                },
+                            )
+
+                        if cfg.evaluation_steps and global_step % cfg.evaluation_steps == 0:
+                            tracker.checkpoint()
+                            eval_metrics = run_evaluation(accelerator, evaluator, model)
+                            tracker.rewind()
+                            if eval_metrics:
+                                log_metrics(global_step, eval_metrics)
+
+                        if cfg.checkpoint_steps and global_step % cfg.checkpoint_steps == 0:
+                            checkpointer.save(
+                                TrainingProgress(global_step, epoch, skipped + step + 1),
+                                accelerator.unwrap_model(model),
+                                optimizer,
+                                lr_scheduler,
+                                gather=gather_object,
+                            )
+                            tracker.mark("checkpoint")
+
+                        if cfg.max_steps is not None and global_step >= cfg.max_steps:
+                            break
+
+                if cfg.max_steps is not None and global_step >= cfg.max_steps:
+                    break
+                accelerator.print(f"Completed epoch {epoch + 1}/{cfg.num_epochs}")
+        finally:
+            if profiler is not None:
+                profiler.close()
+            if checkpointer is not None:
+                checkpointer.close()
 
         accelerator.wait_for_everyone()
         unwrapped_model = accelerator.unwrap_model(model)
         unwrapped_model.save_pretrained(cfg.output_dir, save_function=accelerator.save)
         tokenized.tokenizer.save_pretrained(cfg.output_dir)
 
-        sample = tokenized.dataset.select(range(min(16, len(tokenized.dataset))))
-        sample_inputs = torch.tensor(sample["input_ids"], device=accelerator.device)
-        predictions = tokenized.tokenizer.batch_decode(
-            unwrapped_model.generate(max_length=cfg.max_seq_length, input_ids=sample_inputs),
-            skip_special_tokens=True,
-        )
-        references = tokenized.tokenizer.batch_decode(
-            sample_inputs.cpu().tolist(), skip_special_tokens=True
-        )
-        bleu_metrics = compute_accuracy_metrics(predictions, references)
-
         final_metrics: Dict[str, Any] = {
-            "bleu": bleu_metrics,
+            "evaluation": run_evaluation(accelerator, evaluator, model),
             "steps": global_step,
+            "throughput": tracker.totals(),
             "config": cfg.__dict__,
             "log_path": str(log_path),
+            "dataset": tokenized.stats,
         }
         report_final_metrics(final_metrics, cfg.output_dir / "final_metrics.json")
     finally:
-        stop_background_monitor(monitor_process)
+        stop_background_monitor(monitor)
 
 
 if __name__ == "__main__":
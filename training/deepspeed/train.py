@@ -3,25 +3,60 @@ from __future__ import annotations
 
 import argparse
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import torch
+from torch.utils.data import DataLoader
 from transformers import (
     AutoModelForCausalLM,
     DataCollatorForLanguageModeling,
     Trainer,
     TrainingArguments,
 )
+from transformers.integrations import is_deepspeed_zero3_enabled
 
+from inference.benchmarks.utils.profiling import ProfilingConfig, build_profiler
 from training.utils.config import DEFAULT_CONFIG, TrainingConfig
-from training.utils.dataset import prepare_dataset
+from training.utils.dataset import PackedCollator, head, prepare_dataset
+from training.utils.evaluation import EvaluationCallback, Evaluator
 from training.utils.logging_utils import configure_logging, load_env
 from training.utils.metrics import (
-    compute_accuracy_metrics,
+    ProfilerCallback,
+    ThroughputCallback,
+    ThroughputTracker,
+    TokenCountingCollator,
+    count_parameters,
+    peak_flops_per_device,
     report_final_metrics,
     start_background_monitor,
     stop_background_monitor,
 )
+from training.utils.sampler import LengthGroupedBatchSampler, example_lengths
+
+
+class LengthGroupedTrainer(Trainer):
+    """Trainer that draws training batches from ``LengthGroupedBatchSampler``."""
+
+    def __init__(self, *args: Any, max_tokens_per_batch: Optional[int] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.max_tokens_per_batch = max_tokens_per_batch
+
+    def get_train_dataloader(self) -> DataLoader:
+        batch_sampler = LengthGroupedBatchSampler(
+            example_lengths(self.train_dataset),
+            batch_size=None if self.max_tokens_per_batch else self.args.per_device_train_batch_size,
+            max_tokens=self.max_tokens_per_batch,
+            seed=self.args.seed,
+            num_replicas=self.args.world_size,
+            rank=self.args.process_index,
+        )
+        return DataLoader(
+            self.train_dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+        )
 
 
 def parse_args() -> argparse.Namespace:
@@ -48,11 +83,31 @@ def main() -> None:
 
     cfg.output_dir.mkdir(parents=True, exist_ok=True)
     log_path = configure_logging(cfg.output_dir)
-    monitor_process = start_background_monitor(cfg.output_dir / "system_metrics.jsonl", interval=5.0)
+    monitor = start_background_monitor(cfg.output_dir / "system_metrics.bin", interval=5.0)
 
     try:
-        tokenized = prepare_dataset(cfg.dataset_path, cfg.base_model_name, cfg.max_seq_length)
-        data_collator = DataCollatorForLanguageModeling(tokenizer=tokenized.tokenizer, mlm=False)
+        if cfg.dataset_streaming and cfg.max_steps is None:
+            raise ValueError("`dataset_streaming` requires `max_steps` because the dataset length is unknown")
+        if cfg.group_by_length and (cfg.packing != "none" or cfg.dataset_streaming):
+            raise ValueError("`group_by_length` requires an unpacked, non-streaming dataset")
+        tokenized = prepare_dataset(
+            cfg.dataset_path,
+            cfg.base_model_name,
+            cfg.max_seq_length,
+            streaming=cfg.dataset_streaming,
+            num_proc=cfg.dataset_num_proc,
+            packing=cfg.packing,
+            cache_dir=cfg.dataset_cache_dir,
+            tokenizer_revision=cfg.tokenizer_revision,
+            pad_to_max_length=not cfg.group_by_length,
+            eval_holdout=cfg.eval_holdout,
+        )
+        if cfg.packing != "none":
+            data_collator = PackedCollator(cfg.packing)
+        else:
+            data_collator = DataCollatorForLanguageModeling(
+                tokenizer=tokenized.tokenizer, mlm=False, pad_to_multiple_of=8 if cfg.group_by_length else None
+            )
 
         model = AutoModelForCausalLM.from_pretrained(cfg.base_model_name, torch_dtype=torch.bfloat16)
         model.resize_token_embeddings(len(tokenized.tokenizer))
@@ -60,6 +115,7 @@ def main() -> None:
         training_args = TrainingArguments(
             output_dir=str(cfg.output_dir),
             num_train_epochs=cfg.num_epochs,
+            max_steps=cfg.max_steps or -1,
             per_device_train_batch_size=cfg.batch_size,
             gradient_accumulation_steps=cfg.gradient_accumulation_steps,
             learning_rate=cfg.learning_rate,
@@ -72,36 +128,72 @@ def main() -> None:
             gradient_checkpointing=cfg.gradient_checkpointing,
             bf16=True,
             report_to=["none"],
+            # `seq_lengths` is not a model argument but PackedCollator needs it.
+            remove_unused_columns=cfg.packing != "cu_seqlens",
         )
 
-        trainer = Trainer(
+        tracker = ThroughputTracker(
+            count_parameters(model),
+            peak_flops=cfg.peak_tflops * 1e12 if cfg.peak_tflops else peak_flops_per_device(),
+            gradient_checkpointing=cfg.gradient_checkpointing,
+            world_size=training_args.world_size,
+        )
+        evaluator = Evaluator(
+            tokenized.tokenizer,
+            tokenized.eval_texts,
+            batch_size=cfg.eval_batch_size,
+            prompt_tokens=cfg.eval_prompt_tokens,
+            max_new_tokens=cfg.eval_max_new_tokens,
+            metric=cfg.eval_metric,
+        )
+        # Checked after TrainingArguments, which is what registers the DeepSpeed config.
+        synced_gpus = is_deepspeed_zero3_enabled()
+        callbacks = [
+            ThroughputCallback(tracker),
+            EvaluationCallback(evaluator, cfg.evaluation_steps, synced_gpus=synced_gpus, tracker=tracker),
+        ]
+        profiler = build_profiler(
+            ProfilingConfig.from_dict(
+                {
+                    "mode": cfg.profile_mode,
+                    "start": cfg.profile_start_step,
+                    "steps": cfg.profile_steps,
+                    "top_n": cfg.profile_top_n,
+                }
+            ),
+            cfg.output_dir / "profile",
+            rank=training_args.process_index,
+        )
+        if profiler is not None:
+            callbacks.append(ProfilerCallback(profiler))
+        trainer_kwargs: Dict[str, Any] = {}
+        if cfg.group_by_length:
+            trainer_kwargs["max_tokens_per_batch"] = cfg.max_tokens_per_batch
+        trainer = (LengthGroupedTrainer if cfg.group_by_length else Trainer)(
             model=model,
             args=training_args,
             train_dataset=tokenized.dataset,
-            eval_dataset=tokenized.dataset.select(range(min(200, len(tokenized.dataset)))),
-            data_collator=data_collator,
+            eval_dataset=head(tokenized.dataset, 200),
+            data_collator=TokenCountingCollator(data_collator, tracker),
             tokenizer=tokenized.tokenizer,
+            callbacks=callbacks,
+            **trainer_kwargs,
         )
 
         trainer.train()
         trainer.save_model(cfg.output_dir)
 
-        eval_samples = tokenized.dataset.select(range(min(16, len(tokenized.dataset))))
-        inputs = torch.tensor(eval_samples["input_ids"], device=trainer.model.device)
-        generations = trainer.model.generate(max_length=cfg.max_seq_length, input_ids=inputs)
-        predictions = tokenized.tokenizer.batch_decode(generations, skip_special_tokens=True)
-        references = tokenized.tokenizer.batch_decode(inputs.cpu().tolist(), skip_special_tokens=True)
-        bleu_metrics = compute_accuracy_metrics(predictions, references)
-
         final_metrics: Dict[str, Any] = {
-            "bleu": bleu_metrics,
+            "evaluation": evaluator.run(trainer.model, synced_gpus=synced_gpus),
             "config": cfg.__dict__,
             "log_path": str(log_path),
             "deepspeed_config": str(args.deepspeed),
+            "throughput": tracker.totals(),
+            "dataset": tokenized.stats,
         }
         report_final_metrics(final_metrics, cfg.output_dir / "final_metrics.json")
     finally:
-        stop_background_monitor(monitor_process)
+        stop_background_monitor(monitor)
 
 
 if __name__ == "__main__":
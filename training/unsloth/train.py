@@ -8,16 +8,22 @@ from typing import Any, Dict
 import torch
 from unsloth import FastLanguageModel
 from torch.utils.data import DataLoader
+from transformers import DataCollatorForLanguageModeling
 
+from inference.benchmarks.utils.profiling import ProfilingConfig, build_profiler
 from training.utils.config import DEFAULT_CONFIG, TrainingConfig
-from training.utils.dataset import prepare_dataset
+from training.utils.dataset import STREAMING_SHUFFLE_BUFFER, PackedCollator, prepare_dataset
+from training.utils.evaluation import Evaluator
 from training.utils.logging_utils import configure_logging, load_env, log_metrics
 from training.utils.metrics import (
-    compute_accuracy_metrics,
+    ThroughputTracker,
+    count_parameters,
+    peak_flops_per_device,
     report_final_metrics,
     start_background_monitor,
     stop_background_monitor,
 )
+from training.utils.sampler import LengthGroupedBatchSampler, example_lengths
 
 
 def parse_args() -> argparse.Namespace:
@@ -36,6 +42,15 @@ def load_config(path: Path | None) -> TrainingConfig:
     return TrainingConfig.from_yaml(path)
 
 
+def run_evaluation(evaluator: Evaluator, model: Any) -> Dict[str, Any]:
+    # Unsloth swaps in its fast generation kernels only in inference mode.
+    FastLanguageModel.for_inference(model)
+    try:
+        return evaluator.run(model)
+    finally:
+        FastLanguageModel.for_training(model)
+
+
 def main() -> None:
     args = parse_args()
     load_env(args.env_file)
@@ -44,11 +59,47 @@ def main() -> None:
     cfg.output_dir.mkdir(parents=True, exist_ok=True)
     log_path = configure_logging(cfg.output_dir)
 
-    monitor_process = start_background_monitor(cfg.output_dir / "system_metrics.jsonl", interval=5.0)
+    monitor = start_background_monitor(cfg.output_dir / "system_metrics.bin", interval=5.0)
 
     try:
-        tokenized = prepare_dataset(cfg.dataset_path, cfg.base_model_name, cfg.max_seq_length)
-        dataloader = DataLoader(tokenized.dataset, batch_size=cfg.batch_size, shuffle=True)
+        if cfg.dataset_streaming and cfg.max_steps is None:
+            raise ValueError("`dataset_streaming` requires `max_steps` because the dataset length is unknown")
+        if cfg.group_by_length and (cfg.packing != "none" or cfg.dataset_streaming):
+            raise ValueError("`group_by_length` requires an unpacked, non-streaming dataset")
+        tokenized = prepare_dataset(
+            cfg.dataset_path,
+            cfg.base_model_name,
+            cfg.max_seq_length,
+            streaming=cfg.dataset_streaming,
+            num_proc=cfg.dataset_num_proc,
+            packing=cfg.packing,
+            cache_dir=cfg.dataset_cache_dir,
+            tokenizer_revision=cfg.tokenizer_revision,
+            pad_to_max_length=not cfg.group_by_length,
+            eval_holdout=cfg.eval_holdout,
+        )
+        train_dataset = tokenized.dataset
+        if cfg.dataset_streaming:
+            train_dataset = train_dataset.shuffle(seed=0, buffer_size=STREAMING_SHUFFLE_BUFFER)
+        collate_fn = None
+        if cfg.packing != "none":
+            collate_fn = PackedCollator(cfg.packing)
+        elif cfg.group_by_length:
+            collate_fn = DataCollatorForLanguageModeling(tokenizer=tokenized.tokenizer, mlm=False, pad_to_multiple_of=8)
+        if cfg.group_by_length:
+            batch_sampler = LengthGroupedBatchSampler(
+                example_lengths(train_dataset),
+                batch_size=None if cfg.max_tokens_per_batch else cfg.batch_size,
+                max_tokens=cfg.max_tokens_per_batch,
+            )
+            dataloader = DataLoader(train_dataset, batch_sampler=batch_sampler, collate_fn=collate_fn)
+        else:
+            dataloader = DataLoader(
+                train_dataset,
+                batch_size=cfg.batch_size,
+                shuffle=not cfg.dataset_streaming,
+                collate_fn=collate_fn,
+            )
 
         model, tokenizer = FastLanguageModel.from_pretrained(
             model_name=cfg.base_model_name,
@@ -65,50 +116,98 @@ def main() -> None:
             lora_dropout=0.05,
         )
 
+        evaluator = Evaluator(
+            tokenizer,
+            tokenized.eval_texts,
+            batch_size=cfg.eval_batch_size,
+            prompt_tokens=cfg.eval_prompt_tokens,
+            max_new_tokens=cfg.eval_max_new_tokens,
+            metric=cfg.eval_metric,
+        )
         optimizer = torch.optim.AdamW(model.parameters(), lr=cfg.learning_rate)
         model.train()
+        tracker = ThroughputTracker(
+            count_parameters(model),
+            peak_flops=cfg.peak_tflops * 1e12 if cfg.peak_tflops else peak_flops_per_device(),
+            gradient_checkpointing=cfg.gradient_checkpointing,
+        )
 
-        global_step = 0
-        for epoch in range(cfg.num_epochs):
-            for step, batch in enumerate(dataloader):
-                input_ids = torch.tensor(batch["input_ids"], device=model.device)
-                attention_mask = torch.tensor(batch["attention_mask"], device=model.device)
-                labels = torch.tensor(batch["labels"], device=model.device)
-
-                outputs = model(input_ids=input_ids, attention_mask=attention_mask, labels=labels)
-                loss = outputs.loss
-                loss.backward()
-
-                if (step + 1) % cfg.gradient_accumulation_steps == 0:
-                    optimizer.step()
-                    optimizer.zero_grad()
-                    global_step += 1
-                    if global_step % cfg.logging_steps == 0:
-                        log_metrics(global_step, {"loss": loss.item()})
+        profiler = build_profiler(
+            ProfilingConfig.from_dict(
+                {
+                    "mode": cfg.profile_mode,
+                    "start": cfg.profile_start_step,
+                    "steps": cfg.profile_steps,
+                    "top_n": cfg.profile_top_n,
+                }
+            ),
+            cfg.output_dir / "profile",
+        )
 
-            FastLanguageModel.save_lora_adapters(model, cfg.output_dir / f"lora_epoch_{epoch + 1}")
+        global_step = 0
+        try:
+            for epoch in range(cfg.num_epochs):
+                for step, batch in enumerate(dataloader):
+                    if collate_fn is not None:
+                        batch = {
+                            key: value.to(model.device) if torch.is_tensor(value) else value
+                            for key, value in batch.items()
+                        }
+                    else:
+                        batch = {
+                            "input_ids": torch.tensor(batch["input_ids"], device=model.device),
+                            "attention_mask": torch.tensor(batch["attention_mask"], device=model.device),
+                            "labels": torch.tensor(batch["labels"], device=model.device),
+                        }
+                    tracker.mark("data")
+                    tracker.record_batch(batch)
+                    outputs = model(**batch)
+                    loss = outputs.loss
+                    loss.backward()
+                    tracker.mark("forward_backward")
+
+                    if (step + 1) % cfg.gradient_accumulation_steps == 0:
+                        optimizer.step()
+                        optimizer.zero_grad()
+                        tracker.mark("optimizer")
+                        tracker.step()
+                        global_step += 1
+                        if profiler is not None:
+                            profiler.step()
+                        if global_step % cfg.logging_steps == 0:
+                            log_metrics(global_step, {"loss": loss.item(), **tracker.summary()})
+                        if cfg.evaluation_steps and global_step % cfg.evaluation_steps == 0:
+                            tracker.checkpoint()
+                            eval_metrics = run_evaluation(evaluator, model)
+                            tracker.rewind()
+                            if eval_metrics:
+                                log_metrics(global_step, eval_metrics)
+                        if cfg.max_steps is not None and global_step >= cfg.max_steps:
+                            break
+
+                FastLanguageModel.save_lora_adapters(model, cfg.output_dir / f"lora_epoch_{epoch + 1}")
+                if cfg.max_steps is not None and global_step >= cfg.max_steps:
+                    break
+        finally:
+            if profiler is not None:
+                profiler.close()
 
         FastLanguageModel.merge_lora(model)
         model.save_pretrained(cfg.output_dir)
         tokenizer.save_pretrained(cfg.output_dir)
 
-        eval_samples = tokenized.dataset.select(range(min(16, len(tokenized.dataset))))
-        inputs = torch.tensor(eval_samples["input_ids"], device=model.device)
-        generations = model.generate(max_length=cfg.max_seq_length, input_ids=inputs)
-        predictions = tokenizer.batch_decode(generations, skip_special_tokens=True)
-        references = tokenizer.batch_decode(inputs.cpu().tolist(), skip_special_tokens=True)
-        bleu_metrics = compute_accuracy_metrics(predictions, references)
-
         final_metrics: Dict[str, Any] = {
-            "bleu": bleu_metrics,
+            "evaluation": run_evaluation(evaluator, model),
             "config": cfg.__dict__,
             "log_path": str(log_path),
             "lora_r": args.lora_r,
             "lora_alpha": args.lora_alpha,
+            "throughput": tracker.totals(),
+            "dataset": tokenized.stats,
         }
         report_final_metrics(final_metrics, cfg.output_dir / "final_metrics.json")
     finally:
-        stop_background_monitor(monitor_process)
+        stop_background_monitor(monitor)
 
 
 if __name__ == "__main__":
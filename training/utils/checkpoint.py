@@ -0,0 +1,179 @@
+"""Asynchronous, resumable checkpoints for the custom training loops."""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import re
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+
+CHECKPOINT_MARKER = "COMPLETE"
+_STEP_DIR = re.compile(r"^step-(\d+)$")
+
+
+@dataclass
+class TrainingProgress:
+    """Where training stands; ``batches_in_epoch`` counts micro-batches consumed."""
+
+    global_step: int = 0
+    epoch: int = 0
+    batches_in_epoch: int = 0
+
+
+def rng_state() -> Dict[str, Any]:
+    state: Dict[str, Any] = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state()
+    return state
+
+
+def set_rng_state(state: Dict[str, Any]) -> None:
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state(state["cuda"])
+
+
+def list_checkpoints(directory: Path) -> List[Path]:
+    """Completed checkpoints in ``directory``, oldest first."""
+    if not directory.exists():
+        return []
+    found = []
+    for path in directory.iterdir():
+        match = _STEP_DIR.match(path.name)
+        if match and (path / CHECKPOINT_MARKER).exists():
+            found.append((int(match.group(1)), path))
+    return [path for _, path in sorted(found)]
+
+
+def latest_checkpoint(directory: Path) -> Optional[Path]:
+    checkpoints = list_checkpoints(directory)
+    return checkpoints[-1] if checkpoints else None
+
+
+class AsyncCheckpointer:
+    """Snapshot training state to pinned host memory and write it on a background thread.
+
+    ``save`` copies model, optimizer and scheduler state into reusable
+    (pinned, when CUDA is available) CPU buffers, which only stalls training
+    for a device-to-host copy, then hands serialization to a single writer
+    thread. Each checkpoint is written to a temporary directory, synced,
+    marked complete and renamed to ``step-<N>``, so a crash mid-write never
+    leaves a checkpoint that ``load_latest`` would pick. Only the newest
+    ``keep`` checkpoints are retained. A new snapshot waits for the previous
+    write so buffers are never overwritten while in use; write errors are
+    raised from the next ``save`` or from ``close``.
+
+    Every rank calls ``save``; ranks other than ``is_main_process`` only
+    contribute their RNG state through ``gather``.
+    """
+
+    def __init__(self, directory: Path, keep: int = 2, is_main_process: bool = True):
+        self.directory = directory
+        self.keep = keep
+        self.is_main_process = is_main_process
+        self._buffers: Dict[str, torch.Tensor] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+        self._pending: Optional[Future] = None
+
+    def _snapshot(self, obj: Any, key: str) -> Any:
+        if isinstance(obj, torch.Tensor):
+            buffer = self._buffers.get(key)
+            if buffer is None or buffer.shape != obj.shape or buffer.dtype != obj.dtype:
+                buffer = torch.empty(obj.shape, dtype=obj.dtype, pin_memory=torch.cuda.is_available())
+                self._buffers[key] = buffer
+            buffer.copy_(obj.detach(), non_blocking=True)
+            return buffer
+        if isinstance(obj, dict):
+            return {name: self._snapshot(value, f"{key}.{name}") for name, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self._snapshot(value, f"{key}.{idx}") for idx, value in enumerate(obj))
+        return obj
+
+    def wait(self) -> None:
+        """Block until the in-flight write (if any) has finished, re-raising its error."""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def save(
+        self,
+        progress: TrainingProgress,
+        model: torch.nn.Module,
+        optimizer: Any,
+        lr_scheduler: Any,
+        gather: Any = None,
+    ) -> None:
+        """Checkpoint the current state; ``gather`` collects per-rank objects on every rank."""
+        self.wait()
+        rng = [rng_state()] if gather is None else gather([rng_state()])
+        if not self.is_main_process:
+            return
+        state = {
+            "model": self._snapshot(model.state_dict(), "model"),
+            "optimizer": self._snapshot(optimizer.state_dict(), "optimizer"),
+            "lr_scheduler": lr_scheduler.state_dict(),
+            "rng": rng,
+            "progress": asdict(progress),
+        }
+        if torch.cuda.is_available():
+            # The copies above are asynchronous; they must land before the writer reads them.
+            torch.cuda.synchronize()
+        self._pending = self._executor.submit(self._write, progress.global_step, state)
+
+    def _write(self, step: int, state: Dict[str, Any]) -> None:
+        final = self.directory / f"step-{step}"
+        tmp = self.directory / f"step-{step}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name in ("model", "optimizer", "lr_scheduler", "rng", "progress"):
+            path = tmp / f"{name}.pt"
+            with path.open("wb") as f:
+                torch.save(state[name], f)
+                f.flush()
+                os.fsync(f.fileno())
+        (tmp / CHECKPOINT_MARKER).touch()
+        shutil.rmtree(final, ignore_errors=True)
+        os.rename(tmp, final)
+        logging.info("Saved checkpoint %s", final)
+        for stale in list_checkpoints(self.directory)[: -self.keep] if self.keep > 0 else []:
+            shutil.rmtree(stale, ignore_errors=True)
+
+    def load_latest(
+        self,
+        model: torch.nn.Module,
+        optimizer: Any,
+        lr_scheduler: Any,
+        process_index: int = 0,
+    ) -> Optional[TrainingProgress]:
+        """Restore the newest complete checkpoint into the given objects, if one exists."""
+        checkpoint = latest_checkpoint(self.directory)
+        if checkpoint is None:
+            return None
+        model.load_state_dict(torch.load(checkpoint / "model.pt", map_location="cpu"))
+        optimizer.load_state_dict(torch.load(checkpoint / "optimizer.pt", map_location="cpu"))
+        lr_scheduler.load_state_dict(torch.load(checkpoint / "lr_scheduler.pt"))
+        rng = torch.load(checkpoint / "rng.pt", weights_only=False)
+        set_rng_state(rng[process_index % len(rng)])
+        progress = TrainingProgress(**torch.load(checkpoint / "progress.pt"))
+        logging.info("Resumed from %s at step %s", checkpoint, progress.global_step)
+        return progress
+
+    def close(self) -> None:
+        """Wait for the last write and stop the writer thread."""
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
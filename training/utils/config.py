@@ -25,12 +25,34 @@ class TrainingConfig:
     gradient_checkpointing: bool = True
     use_flash_attention: bool = True
     deepspeed_config: Optional[Path] = None
+    max_steps: Optional[int] = None
+    dataset_streaming: bool = False
+    dataset_num_proc: Optional[int] = None
+    packing: str = "none"
+    group_by_length: bool = False
+    max_tokens_per_batch: Optional[int] = None
+    peak_tflops: Optional[float] = None
+    checkpoint_steps: Optional[int] = None
+    checkpoint_keep: int = 2
+    tokenizer_revision: Optional[str] = None
+    dataset_cache_dir: Optional[Path] = Path("data/cache/tokenized")
+    eval_holdout: int = 64
+    eval_batch_size: int = 8
+    eval_prompt_tokens: int = 128
+    eval_max_new_tokens: int = 64
+    eval_metric: str = "bleu"
+    profile_mode: Optional[str] = None
+    profile_start_step: int = 10
+    profile_steps: int = 5
+    profile_top_n: int = 20
 
     @classmethod
     def from_yaml(cls, path: Path) -> "TrainingConfig":
         data = yaml.safe_load(path.read_text())
         data["dataset_path"] = Path(data["dataset_path"])
         data["output_dir"] = Path(data["output_dir"])
+        if data.get("dataset_cache_dir"):
+            data["dataset_cache_dir"] = Path(data["dataset_cache_dir"])
         if data.get("deepspeed_config"):
             data["deepspeed_config"] = Path(data["deepspeed_config"])
         return cls(**data)
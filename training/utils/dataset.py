@@ -1,50 +1,473 @@
 """Dataset utilities for fine-tuning demos."""
 from __future__ import annotations
 
+import hashlib
 import json
-from dataclasses import dataclass
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from itertools import accumulate
 from pathlib import Path
-from typing import Iterable
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-from datasets import Dataset
+import pyarrow.compute as pc
+import torch
+from datasets import Dataset, IterableDataset
 from transformers import AutoTokenizer
 
+try:  # Optional: several times faster than the standard library parser.
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - depends on the environment
+    _loads = json.loads
+
+TOKEN_COLUMNS = ("input_ids", "attention_mask", "labels")
+# `concat` packs documents back to back and lets them attend to each other;
+# `position_ids` and `cu_seqlens` keep per-document attention boundaries.
+PACKING_MODES = ("none", "concat", "position_ids", "cu_seqlens")
+# Per-row counters used for the padding report, dropped before training.
+STATS_COLUMNS = ("num_tokens", "num_documents", "truncated_tokens")
+IGNORE_INDEX = -100
+# Bump when the tokenized layout changes so older cache entries are ignored.
+CACHE_VERSION = 1
+CACHE_MARKER = "COMPLETE"
+CACHE_POLL_INTERVAL_S = 2.0
+CACHE_TIMEOUT_S = 4 * 60 * 60
+# Large enough to amortize process start-up, small enough to balance workers.
+SHARD_BYTES = 64 * 1024 * 1024
+STREAMING_SHUFFLE_BUFFER = 10_000
+
+# (path, start offset, end offset, mtime_ns); the mtime keeps the Arrow cache
+# fingerprint from matching an older version of the same file.
+Shard = Tuple[str, int, int, int]
+TextDataset = Union[Dataset, IterableDataset]
+
 
 @dataclass
 class TokenizedDataset:
-    dataset: Dataset
+    dataset: TextDataset
     tokenizer: AutoTokenizer
+    packing: str = "none"
+    stats: Dict[str, Any] = field(default_factory=dict)
+    # Raw documents held out of training for generation-based evaluation.
+    eval_texts: List[str] = field(default_factory=list)
+
+
+def jsonl_shards(path: Path, shard_bytes: int = SHARD_BYTES) -> List[Shard]:
+    """Split ``path`` into byte ranges that each start and end on a line boundary."""
+    stat = path.stat()
+    bounds = [0]
+    with path.open("rb") as f:
+        offset = shard_bytes
+        while offset < stat.st_size:
+            f.seek(offset)
+            f.readline()
+            if f.tell() >= stat.st_size:
+                break
+            bounds.append(f.tell())
+            offset = f.tell() + shard_bytes
+    bounds.append(stat.st_size)
+    return [(str(path), start, end, stat.st_mtime_ns) for start, end in zip(bounds, bounds[1:])]
+
+
+def _read_shards(shards: List[Shard]) -> Iterator[Dict[str, Any]]:
+    # Top-level so `datasets` can pickle it into worker processes, each of
+    # which receives a slice of `shards`.
+    for path, start, end, _ in shards:
+        with open(path, "rb") as f:
+            f.seek(start)
+            while f.tell() < end:
+                line = f.readline()
+                if line.strip():
+                    yield _loads(line)
+
+
+def load_text_dataset(path: Path, streaming: bool = False, num_proc: Optional[int] = None) -> TextDataset:
+    """Load a JSONL file without materializing it as Python objects.
+
+    The file is split into line-aligned byte ranges that are parsed in
+    ``num_proc`` worker processes (defaults to the CPU count) and written
+    straight to Arrow record batches. With ``streaming`` an ``IterableDataset``
+    is returned instead, which reads the file lazily on every pass.
+    """
+    shards = jsonl_shards(path)
+    if streaming:
+        return IterableDataset.from_generator(_read_shards, gen_kwargs={"shards": shards})
+    num_proc = min(num_proc or os.cpu_count() or 1, len(shards))
+    return Dataset.from_generator(
+        _read_shards,
+        gen_kwargs={"shards": shards},
+        num_proc=num_proc if num_proc > 1 else None,
+    )
+
+
+def hold_out(dataset: TextDataset, n: int) -> Tuple[TextDataset, List[str]]:
+    """Split ``n`` documents off ``dataset`` and return the rest with their texts.
+
+    Map-style datasets give up their last ``n`` rows; streaming datasets their
+    first ``n``, since that is the only part that can be read without a full pass.
+    """
+    if n <= 0:
+        return dataset, []
+    if isinstance(dataset, IterableDataset):
+        rows = list(dataset.take(n))
+        texts = _texts({key: [row[key] for row in rows] for key in rows[0]}) if rows else []
+        return dataset.skip(n), texts
+    # Always leave at least one row to train on.
+    n = min(n, len(dataset) - 1)
+    if n <= 0:
+        return dataset, []
+    return dataset.select(range(len(dataset) - n)), _texts(dataset[len(dataset) - n :])
 
 
-def load_text_dataset(path: Path) -> Dataset:
-    with path.open("r", encoding="utf-8") as f:
-        records = [json.loads(line) for line in f]
-    return Dataset.from_list(records)
+def _texts(batch: Dict[str, List[Any]]) -> List[str]:
+    texts: Iterable[str] = batch.get("text") or batch.get("content") or batch.get("instruction")
+    if texts is None:
+        raise KeyError("Dataset must contain a `text`, `content`, or `instruction` field")
+    return list(texts)
 
 
-def tokenize_dataset(dataset: Dataset, tokenizer: AutoTokenizer, max_length: int) -> Dataset:
-    def tokenize_fn(batch: dict[str, list[str]]):
-        texts: Iterable[str] = batch.get("text") or batch.get("content") or batch.get("instruction")
-        if texts is None:
-            raise KeyError("Dataset must contain a `text`, `content`, or `instruction` field")
+def token_columns(packing: str) -> List[str]:
+    """Columns a tokenized dataset keeps for training in the given packing mode."""
+    if packing == "position_ids":
+        return [*TOKEN_COLUMNS, "position_ids"]
+    if packing == "cu_seqlens":
+        return [*TOKEN_COLUMNS, "position_ids", "seq_lengths"]
+    return list(TOKEN_COLUMNS)
+
+
+def pack_sequences(
+    sequences: Sequence[List[int]], block_size: int, pad_token_id: int, packing: str = "concat"
+) -> Dict[str, List[Any]]:
+    """Concatenate token sequences and cut them into rows of ``block_size``.
+
+    Documents longer than a row continue in the next one and the final
+    partial row is padded. With per-document boundaries every document (and
+    every row) starts a new attention segment: position ids restart at zero
+    and the segment's first label is ignored, since it cannot be predicted
+    from the segment before it.
+    """
+    boundaries = packing in ("position_ids", "cu_seqlens")
+    rows: Dict[str, List[Any]] = {name: [] for name in [*token_columns("cu_seqlens"), *STATS_COLUMNS]}
+    ids: List[int] = []
+    labels: List[int] = []
+    positions: List[int] = []
+    lengths: List[int] = []
+    counts = {"num_documents": 0, "truncated_tokens": 0}
+
+    def add_segment(segment: List[int], segment_labels: List[int]) -> None:
+        if boundaries or not ids:
+            positions.extend(range(len(segment)))
+            lengths.append(len(segment))
+            if boundaries:
+                segment_labels = [IGNORE_INDEX, *segment_labels[1:]]
+        else:
+            positions.extend(range(positions[-1] + 1, positions[-1] + 1 + len(segment)))
+            lengths[-1] += len(segment)
+        ids.extend(segment)
+        labels.extend(segment_labels)
+
+    def emit(num_tokens: int) -> None:
+        rows["input_ids"].append(list(ids))
+        rows["attention_mask"].append([1] * num_tokens + [0] * (len(ids) - num_tokens))
+        rows["labels"].append(list(labels))
+        rows["position_ids"].append(list(positions))
+        rows["seq_lengths"].append(list(lengths))
+        rows["num_tokens"].append(num_tokens)
+        rows["num_documents"].append(counts["num_documents"])
+        rows["truncated_tokens"].append(counts["truncated_tokens"])
+        for buffer in (ids, labels, positions, lengths):
+            buffer.clear()
+        counts.update(num_documents=0, truncated_tokens=0)
+
+    for sequence in sequences:
+        counts["num_documents"] += 1
+        counts["truncated_tokens"] += min(len(sequence), block_size)
+        remaining = list(sequence)
+        while remaining:
+            piece, remaining = remaining[: block_size - len(ids)], remaining[block_size - len(ids):]
+            add_segment(piece, list(piece))
+            if len(ids) == block_size:
+                emit(block_size)
+    if ids:
+        num_tokens = len(ids)
+        # Padding forms its own segment so it never shares attention with real tokens.
+        padding = [pad_token_id] * (block_size - num_tokens)
+        ids.extend(padding)
+        labels.extend([IGNORE_INDEX] * len(padding))
+        positions.extend(range(len(padding)))
+        lengths.append(len(padding))
+        emit(num_tokens)
+
+    keep = token_columns(packing)
+    return {name: values for name, values in rows.items() if name in keep or name in STATS_COLUMNS}
+
+
+def tokenize_dataset(
+    dataset: TextDataset,
+    tokenizer: AutoTokenizer,
+    max_length: int,
+    num_proc: Optional[int] = None,
+    packing: str = "none",
+    pad_to_max_length: bool = True,
+) -> TextDataset:
+    """Tokenize ``dataset``, padding each example or packing them into full rows.
+
+    Without ``pad_to_max_length`` examples are only truncated and carry no
+    labels, leaving padding and labels to a dynamic collator. Rows carry
+    ``STATS_COLUMNS`` alongside the training columns; see ``padding_report``.
+    """
+    if packing not in PACKING_MODES:
+        raise ValueError(f"Unknown packing mode `{packing}`; expected one of {PACKING_MODES}")
+    if packing != "none" and not pad_to_max_length:
+        raise ValueError("Dynamic padding only applies to unpacked datasets")
+
+    def tokenize_fn(batch: Dict[str, List[Any]]):
         tokens = tokenizer(
-            list(texts),
+            _texts(batch),
             truncation=True,
-            padding="max_length",
+            padding="max_length" if pad_to_max_length else False,
             max_length=max_length,
         )
-        tokens["labels"] = tokens["input_ids"].copy()
+        if pad_to_max_length:
+            tokens["labels"] = tokens["input_ids"].copy()
+        num_tokens = [sum(mask) for mask in tokens["attention_mask"]]
+        tokens.update(num_tokens=num_tokens, num_documents=[1] * len(num_tokens), truncated_tokens=num_tokens)
         return tokens
 
-    keep_cols = set(["input_ids", "attention_mask", "labels"])
-    remove_cols = [col for col in dataset.column_names if col not in keep_cols]
-    return dataset.map(tokenize_fn, batched=True, remove_columns=remove_cols)
+    def pack_fn(batch: Dict[str, List[Any]]):
+        sequences = tokenizer(_texts(batch))["input_ids"]
+        eos = tokenizer.eos_token_id
+        sequences = [ids + [eos] if not ids or ids[-1] != eos else ids for ids in sequences]
+        return pack_sequences(sequences, max_length, tokenizer.pad_token_id, packing)
+
+    map_fn = tokenize_fn if packing == "none" else pack_fn
+    keep_cols = [*token_columns(packing), *STATS_COLUMNS]
+    columns = dataset.column_names
+    if columns is None:
+        # Generator-backed iterable datasets only learn their columns from the first row.
+        columns = list(next(iter(dataset.take(1)), {}))
+    # Packing changes the number of rows, so every input column must go.
+    remove_cols = columns if packing != "none" else [c for c in columns if c not in keep_cols]
+    if isinstance(dataset, IterableDataset):
+        if not pad_to_max_length:
+            raise ValueError("Dynamic padding requires a map-style dataset")
+        return dataset.map(map_fn, batched=True, remove_columns=remove_cols).select_columns(token_columns(packing))
+    return dataset.map(map_fn, batched=True, remove_columns=remove_cols, num_proc=num_proc)
+
 
+def padding_report(dataset: Dataset, max_length: int) -> Dict[str, Any]:
+    """Share of row slots holding real tokens, compared with padding every example.
 
-def prepare_dataset(path: Path, tokenizer_name: str, max_seq_length: int) -> TokenizedDataset:
-    dataset = load_text_dataset(path)
-    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, use_fast=True)
+    ``padded_efficiency`` is what one example per ``max_length`` row would
+    achieve; ``efficiency_gain`` is the resulting reduction in wasted compute.
+    """
+    real_tokens = pc.sum(dataset.data.column("num_tokens")).as_py() or 0
+    documents = pc.sum(dataset.data.column("num_documents")).as_py() or 0
+    truncated = pc.sum(dataset.data.column("truncated_tokens")).as_py() or 0
+    efficiency = real_tokens / (len(dataset) * max_length) if len(dataset) else 0.0
+    padded_efficiency = truncated / (documents * max_length) if documents else 0.0
+    return {
+        "documents": documents,
+        "rows": len(dataset),
+        "real_tokens": real_tokens,
+        "padding_efficiency": efficiency,
+        "padded_efficiency": padded_efficiency,
+        "efficiency_gain": efficiency / padded_efficiency if padded_efficiency else None,
+    }
+
+
+@dataclass
+class PackedCollator:
+    """Stack packed rows into the layout the chosen packing mode needs.
+
+    ``position_ids`` and ``cu_seqlens`` drop the attention mask so flash
+    attention derives document boundaries from position ids or from the
+    ``cu_seq_lens_*`` keyword arguments instead. ``cu_seqlens`` flattens the
+    batch into a single row, as variable-length kernels expect.
+    """
+
+    packing: str = "concat"
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, torch.Tensor]:
+        batch = {
+            name: torch.tensor([feature[name] for feature in features])
+            for name in token_columns(self.packing)
+            if name != "seq_lengths"
+        }
+        if self.packing == "concat":
+            return batch
+        del batch["attention_mask"]
+        if self.packing == "cu_seqlens":
+            batch = {name: value.reshape(1, -1) for name, value in batch.items()}
+            lengths = [length for feature in features for length in feature["seq_lengths"]]
+            cu_seqlens = torch.tensor([0, *accumulate(lengths)], dtype=torch.int32)
+            batch.update(
+                cu_seq_lens_q=cu_seqlens,
+                cu_seq_lens_k=cu_seqlens,
+                max_length_q=max(lengths),
+                max_length_k=max(lengths),
+            )
+        return batch
+
+
+def head(dataset: TextDataset, count: int) -> Dataset:
+    """The first ``count`` rows as an in-memory dataset, for evaluation samples."""
+    if isinstance(dataset, IterableDataset):
+        return Dataset.from_list(list(dataset.take(count)))
+    return dataset.select(range(min(count, len(dataset))))
+
+
+def dataset_cache_key(
+    path: Path,
+    tokenizer_name: str,
+    tokenizer_revision: Optional[str],
+    max_seq_length: int,
+    packing: str,
+    pad_to_max_length: bool = True,
+    eval_holdout: int = 0,
+) -> str:
+    """Digest of everything that determines the tokenized output.
+
+    The dataset file is identified by its resolved path, size and mtime
+    rather than its contents, so every rank can compute the key with a
+    single ``stat`` instead of hashing the raw file.
+    """
+    stat = path.stat()
+    parts = {
+        "version": CACHE_VERSION,
+        "file": [str(path.resolve()), stat.st_size, stat.st_mtime_ns],
+        "tokenizer": tokenizer_name,
+        "tokenizer_revision": tokenizer_revision or "main",
+        "max_seq_length": max_seq_length,
+        "packing": packing,
+        "padding": "max_length" if pad_to_max_length else "dynamic",
+        "eval_holdout": eval_holdout,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+def _load_tokenizer(name: str, revision: Optional[str] = None) -> AutoTokenizer:
+    tokenizer = AutoTokenizer.from_pretrained(name, revision=revision, use_fast=True)
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
-    tokenized = tokenize_dataset(dataset, tokenizer, max_seq_length)
-    return TokenizedDataset(dataset=tokenized, tokenizer=tokenizer)
+    return tokenizer
+
+
+def _build_dataset(
+    path: Path,
+    tokenizer: AutoTokenizer,
+    max_seq_length: int,
+    streaming: bool,
+    num_proc: Optional[int],
+    packing: str,
+    pad_to_max_length: bool,
+    eval_holdout: int,
+) -> Tuple[TextDataset, Dict[str, Any], List[str]]:
+    dataset = load_text_dataset(path, streaming=streaming, num_proc=num_proc)
+    dataset, eval_texts = hold_out(dataset, eval_holdout)
+    tokenized = tokenize_dataset(
+        dataset,
+        tokenizer,
+        max_seq_length,
+        num_proc=None if streaming else num_proc,
+        packing=packing,
+        pad_to_max_length=pad_to_max_length,
+    )
+    stats: Dict[str, Any] = {}
+    if isinstance(tokenized, Dataset):
+        stats = padding_report(tokenized, max_seq_length)
+        tokenized = tokenized.remove_columns(list(STATS_COLUMNS))
+    return tokenized, stats, eval_texts
+
+
+def _write_cache_entry(
+    entry: Path, dataset: Dataset, tokenizer: AutoTokenizer, stats: Dict[str, Any], eval_texts: List[str]
+) -> None:
+    # Build under a private name and rename into place, so readers only ever
+    # see complete entries even if this process dies half-way through.
+    tmp = entry.with_name(f"{entry.name}.tmp-{os.getpid()}")
+    try:
+        dataset.save_to_disk(str(tmp / "dataset"))
+        tokenizer.save_pretrained(str(tmp / "tokenizer"))
+        (tmp / "stats.json").write_text(json.dumps(stats, indent=2))
+        (tmp / "eval_texts.json").write_text(json.dumps(eval_texts))
+        (tmp / CACHE_MARKER).write_text(str(time.time()))
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # Another node sharing the cache directory finished first.
+            if not (entry / CACHE_MARKER).exists():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _wait_for_cache_entry(entry: Path, timeout_s: float) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not (entry / CACHE_MARKER).exists():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out after {timeout_s:.0f}s waiting for local rank 0 to build {entry}")
+        time.sleep(CACHE_POLL_INTERVAL_S)
+
+
+def prepare_dataset(
+    path: Path,
+    tokenizer_name: str,
+    max_seq_length: int,
+    streaming: bool = False,
+    num_proc: Optional[int] = None,
+    packing: str = "none",
+    cache_dir: Optional[Path] = None,
+    tokenizer_revision: Optional[str] = None,
+    cache_timeout_s: float = CACHE_TIMEOUT_S,
+    pad_to_max_length: bool = True,
+    eval_holdout: int = 0,
+) -> TokenizedDataset:
+    """Load and tokenize ``path``, reusing an on-disk cache when ``cache_dir`` is set.
+
+    Cache entries are keyed by ``dataset_cache_key``. On a miss, local rank 0
+    tokenizes and publishes the entry while the other ranks on the node wait
+    for it; every rank then memory-maps the same Arrow files. Streaming
+    datasets are never cached. The last ``eval_holdout`` documents (the
+    first ones when streaming) are kept out of training and returned as
+    ``eval_texts``.
+    """
+    if cache_dir is None or streaming:
+        tokenizer = _load_tokenizer(tokenizer_name, tokenizer_revision)
+        tokenized, stats, eval_texts = _build_dataset(
+            path, tokenizer, max_seq_length, streaming, num_proc, packing, pad_to_max_length, eval_holdout
+        )
+        if stats:
+            logging.info("Dataset padding (packing=%s): %s", packing, json.dumps(stats))
+        return TokenizedDataset(
+            dataset=tokenized, tokenizer=tokenizer, packing=packing, stats=stats, eval_texts=eval_texts
+        )
+
+    entry = cache_dir / dataset_cache_key(
+        path, tokenizer_name, tokenizer_revision, max_seq_length, packing, pad_to_max_length, eval_holdout
+    )
+    if not (entry / CACHE_MARKER).exists():
+        if int(os.environ.get("LOCAL_RANK", "0")) == 0:
+            logging.info("Tokenized dataset cache miss; building %s", entry)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tokenizer = _load_tokenizer(tokenizer_name, tokenizer_revision)
+            tokenized, stats, eval_texts = _build_dataset(
+                path, tokenizer, max_seq_length, False, num_proc, packing, pad_to_max_length, eval_holdout
+            )
+            _write_cache_entry(entry, tokenized, tokenizer, stats, eval_texts)
+        else:
+            _wait_for_cache_entry(entry, cache_timeout_s)
+
+    stats = json.loads((entry / "stats.json").read_text())
+    logging.info("Loaded tokenized dataset from %s (packing=%s): %s", entry, packing, json.dumps(stats))
+    return TokenizedDataset(
+        dataset=Dataset.load_from_disk(str(entry / "dataset")),
+        tokenizer=_load_tokenizer(str(entry / "tokenizer")),
+        packing=packing,
+        stats=stats,
+        eval_texts=json.loads((entry / "eval_texts.json").read_text()),
+    )
@@ -0,0 +1,163 @@
+"""Generation-based evaluation on held-out documents."""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import torch
+from transformers import AutoTokenizer, TrainerCallback
+
+from training.utils.logging_utils import log_metrics
+from training.utils.metrics import ThroughputTracker, compute_accuracy_metrics
+
+
+@dataclass
+class EvalExample:
+    prompt_ids: List[int]
+    reference: str
+
+
+def build_eval_examples(
+    texts: Iterable[str],
+    tokenizer: AutoTokenizer,
+    prompt_tokens: int,
+    max_new_tokens: int,
+) -> List[EvalExample]:
+    """Split each document into a prompt and the reference continuation that follows it.
+
+    Prompts are at most ``prompt_tokens`` long and never more than half of
+    the document, so every example has something to continue.
+    """
+    examples = []
+    for text in texts:
+        ids = tokenizer(text)["input_ids"]
+        split = min(prompt_tokens, len(ids) // 2)
+        if split == 0:
+            continue
+        reference = tokenizer.decode(ids[split : split + max_new_tokens], skip_special_tokens=True)
+        if reference.strip():
+            examples.append(EvalExample(prompt_ids=ids[:split], reference=reference))
+    return examples
+
+
+class Evaluator:
+    """Batched, KV-cached generation over held-out prompts, scored against their continuations.
+
+    Prompts are sorted by length and left-padded so every row in a batch
+    starts generating at the same position; decoding is greedy with the KV
+    cache enabled and capped at ``max_new_tokens``. ``run`` reports the
+    metric next to generation throughput for the pass.
+    """
+
+    def __init__(
+        self,
+        tokenizer: AutoTokenizer,
+        texts: Iterable[str],
+        batch_size: int = 8,
+        prompt_tokens: int = 128,
+        max_new_tokens: int = 64,
+        metric: str = "bleu",
+    ):
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.metric = metric
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        self.examples = sorted(
+            build_eval_examples(texts, tokenizer, prompt_tokens, max_new_tokens),
+            key=lambda example: len(example.prompt_ids),
+            reverse=True,
+        )
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    def _left_pad(self, batch: List[EvalExample], device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+        width = max(len(example.prompt_ids) for example in batch)
+        input_ids = torch.full((len(batch), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+        for row, example in enumerate(batch):
+            length = len(example.prompt_ids)
+            input_ids[row, width - length :] = torch.tensor(example.prompt_ids, dtype=torch.long)
+            attention_mask[row, width - length :] = 1
+        return input_ids.to(device), attention_mask.to(device)
+
+    @torch.inference_mode()
+    def _generate(self, model: torch.nn.Module, synced_gpus: bool) -> Tuple[List[str], int]:
+        predictions: List[str] = []
+        generated_tokens = 0
+        for start in range(0, len(self.examples), self.batch_size):
+            input_ids, attention_mask = self._left_pad(self.examples[start : start + self.batch_size], model.device)
+            output = model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                max_new_tokens=self.max_new_tokens,
+                do_sample=False,
+                use_cache=True,
+                pad_token_id=self.pad_token_id,
+                synced_gpus=synced_gpus,
+            )
+            new_tokens = output[:, input_ids.shape[1] :]
+            generated_tokens += int((new_tokens != self.pad_token_id).sum())
+            predictions.extend(self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True))
+        return predictions, generated_tokens
+
+    def run(self, model: torch.nn.Module, synced_gpus: bool = False) -> Dict[str, Any]:
+        """Evaluate ``model`` and restore its train/eval mode afterwards.
+
+        Set ``synced_gpus`` when parameters are sharded across ranks (ZeRO-3,
+        FSDP); every rank must then call ``run``.
+        """
+        if not self.examples:
+            return {}
+        was_training = model.training
+        model.eval()
+        start = time.perf_counter()
+        try:
+            predictions, generated_tokens = self._generate(model, synced_gpus)
+        finally:
+            model.train(was_training)
+        elapsed = time.perf_counter() - start
+        return {
+            self.metric: compute_accuracy_metrics(
+                predictions, [example.reference for example in self.examples], metric_name=self.metric
+            ),
+            "eval_samples": len(self.examples),
+            "eval_generated_tokens": generated_tokens,
+            "eval_runtime_s": elapsed,
+            "eval_samples_per_s": len(self.examples) / elapsed if elapsed > 0 else 0.0,
+            "eval_tokens_per_s": generated_tokens / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class EvaluationCallback(TrainerCallback):
+    """Run an ``Evaluator`` every ``eval_steps`` optimizer steps of a ``transformers.Trainer``.
+
+    Every rank generates (required under ZeRO-3, where ``synced_gpus`` keeps
+    the ranks in lock step); only the main process logs. With ``tracker`` the
+    pass is excluded from training throughput.
+    """
+
+    def __init__(
+        self,
+        evaluator: Evaluator,
+        eval_steps: int,
+        synced_gpus: bool = False,
+        tracker: Optional[ThroughputTracker] = None,
+    ):
+        self.evaluator = evaluator
+        self.eval_steps = eval_steps
+        self.synced_gpus = synced_gpus
+        self.tracker = tracker
+
+    def on_step_end(self, args, state, control, model=None, **kwargs):  # noqa: ANN001
+        if model is None or not self.eval_steps or state.global_step % self.eval_steps != 0:
+            return
+        if self.tracker is not None:
+            self.tracker.checkpoint()
+        results = self.evaluator.run(model, synced_gpus=self.synced_gpus)
+        if self.tracker is not None:
+            self.tracker.rewind()
+        if results and state.is_world_process_zero:
+            log_metrics(state.global_step, results)
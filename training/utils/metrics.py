@@ -1,39 +1,46 @@
 """Metrics helpers for fine-tuning demos."""
 from __future__ import annotations
 
-import contextlib
 import json
-import subprocess
-import sys
+import os
+import time
+from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterable
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 
 import evaluate
-import psutil
+import torch
+from transformers import TrainerCallback
 
-try:
-    import pynvml
-except ImportError:  # pragma: no cover
-    pynvml = None
+from inference.benchmarks.utils.monitor import SystemMonitor
+from inference.benchmarks.utils.profiling import ProfilerWindow
+from inference.benchmarks.utils.system import get_nvml_session
+from training.utils.logging_utils import log_metrics
 
 
-def start_background_monitor(output_path: Path, interval: float = 5.0) -> subprocess.Popen[str]:
-    """Spawn the shared system monitor helper."""
-    cmd = [sys.executable, "scripts/monitor_system.py", "--interval", str(interval), "--output", str(output_path)]
-    return subprocess.Popen(cmd)
+def start_background_monitor(output_path: Path, interval: float = 5.0) -> Optional[SystemMonitor]:
+    """Start the in-process system monitor thread; one per node, on local rank 0."""
+    if int(os.environ.get("LOCAL_RANK", "0")) != 0:
+        return None
+    return SystemMonitor(output_path, interval=interval).start()
 
 
-def stop_background_monitor(process: subprocess.Popen[str]) -> None:
-    if process.poll() is None:
-        process.terminate()
-        try:
-            process.wait(timeout=10)
-        except subprocess.TimeoutExpired:
-            process.kill()
+def stop_background_monitor(monitor: Optional[SystemMonitor]) -> None:
+    if monitor is not None:
+        monitor.stop()
 
 
-def compute_accuracy_metrics(predictions: Iterable[str], references: Iterable[str]) -> Dict[str, float]:
-    metric = evaluate.load("bleu")
+@lru_cache(maxsize=None)
+def load_metric(name: str) -> evaluate.EvaluationModule:
+    """Load an ``evaluate`` metric once per process; loading re-resolves the metric script."""
+    return evaluate.load(name)
+
+
+def compute_accuracy_metrics(
+    predictions: Iterable[str], references: Iterable[str], metric_name: str = "bleu"
+) -> Dict[str, float]:
+    metric = load_metric(metric_name)
     return metric.compute(predictions=list(predictions), references=[[r] for r in references])
 
 
@@ -44,23 +51,285 @@ def report_final_metrics(metrics: Dict[str, Any], output_path: Path) -> None:
 
 
 def get_gpu_memory_summary() -> Dict[str, Any]:
-    if pynvml is None:
+    session = get_nvml_session()
+    if not session.available:
         return {}
 
-    summary: Dict[str, Any] = {"gpus": []}
-    try:
-        pynvml.nvmlInit()
-        for idx in range(pynvml.nvmlDeviceGetCount()):
-            handle = pynvml.nvmlDeviceGetHandleByIndex(idx)
-            mem = pynvml.nvmlDeviceGetMemoryInfo(handle)
-            summary["gpus"].append(
-                {
-                    "gpu_index": idx,
-                    "memory_used_bytes": float(mem.used),
-                    "memory_total_bytes": float(mem.total),
-                }
-            )
-    finally:
-        with contextlib.suppress(Exception):
-            pynvml.nvmlShutdown()
-    return summary
+    return {
+        "gpus": [
+            {
+                "gpu_index": gpu["gpu_index"],
+                "memory_used_bytes": gpu["memory_used_bytes"],
+                "memory_total_bytes": gpu["memory_total_bytes"],
+            }
+            for gpu in session.sample_gpus()
+        ]
+    }
+
+
+# Dense BF16 tensor-core peak per device, matched against the CUDA device name.
+PEAK_BF16_FLOPS = {
+    "H200": 989e12,
+    "H100": 989e12,
+    "A100": 312e12,
+    "L40S": 362e12,
+    "A10": 125e12,
+}
+IGNORE_INDEX = -100
+STEP_PHASES = ("data", "forward_backward", "optimizer")
+# CUDA events a tracker holds before reading them back, for ranks that never summarize.
+MAX_PENDING_EVENTS = 4096
+
+
+def count_parameters(model: torch.nn.Module) -> int:
+    """Total parameter count, including parameters partitioned by DeepSpeed ZeRO-3."""
+    return sum(getattr(p, "ds_numel", p.numel()) for p in model.parameters())
+
+
+def peak_flops_per_device(device_name: Optional[str] = None) -> Optional[float]:
+    """Peak BF16 FLOP/s of the current CUDA device, or None when unknown."""
+    if device_name is None:
+        if not torch.cuda.is_available():
+            return None
+        device_name = torch.cuda.get_device_name()
+    return next((flops for key, flops in PEAK_BF16_FLOPS.items() if key in device_name), None)
+
+
+def count_batch_tokens(batch: Mapping[str, Any]) -> int:
+    """Non-padding tokens in a collated batch.
+
+    Uses the attention mask when present, otherwise the labels that are not
+    ignored (packed layouts without a mask), otherwise every input id.
+    """
+    if batch.get("attention_mask") is not None:
+        return int(batch["attention_mask"].sum())
+    if batch.get("labels") is not None:
+        return int((batch["labels"] != IGNORE_INDEX).sum())
+    return int(batch["input_ids"].numel())
+
+
+def count_batch_samples(batch: Mapping[str, Any]) -> int:
+    if batch.get("cu_seq_lens_q") is not None:
+        return len(batch["cu_seq_lens_q"]) - 1
+    return int(batch["input_ids"].shape[0])
+
+
+class ThroughputTracker:
+    """Per-interval training throughput, step-time breakdown and MFU.
+
+    Call ``mark(phase)`` at the end of each phase of a step: time since the
+    previous mark is charged to ``phase`` (``data`` wait, ``forward_backward``
+    or ``optimizer``). ``record_batch`` counts tokens and samples,
+    ``step`` counts optimizer steps and ``summary`` reports and resets the
+    current interval. MFU assumes ``flops_per_token`` model FLOPs per token
+    (6 x parameters for forward plus backward, 8 x with activation
+    recomputation) against ``peak_flops`` per device.
+
+    On CUDA, marks record events on the current stream instead of blocking
+    the host, so asynchronous kernels are still charged to the right phase;
+    the device is synchronized once per ``summary`` to read the events back,
+    or after ``MAX_PENDING_EVENTS`` events on ranks that never summarize.
+    """
+
+    def __init__(
+        self,
+        num_parameters: int,
+        peak_flops: Optional[float] = None,
+        gradient_checkpointing: bool = False,
+        world_size: int = 1,
+        cuda_events: Optional[bool] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.num_parameters = num_parameters
+        self.flops_per_token = (8 if gradient_checkpointing else 6) * num_parameters
+        self.peak_flops = peak_flops
+        self.world_size = world_size
+        self.cuda_events = torch.cuda.is_available() if cuda_events is None else cuda_events
+        self.clock = clock
+        self.total_tokens = 0
+        self.total_samples = 0
+        self.total_steps = 0
+        self._started = clock()
+        self._reset_interval()
+
+    def _reset_interval(self) -> None:
+        self._interval_start = self._last_mark = self.clock()
+        self._phases: Dict[str, float] = defaultdict(float)
+        self._tokens = 0
+        self._samples = 0
+        self._steps = 0
+        self._checkpoint = (self._interval_start, 0, 0)
+        # CUDA events in stream order as (phase, event, checkpoint event); a
+        # mark carries its phase, a rewind the checkpoint it rewinds to.
+        self._events: List[Tuple[Optional[str], Any, Any]] = []
+        self._checkpoint_event = self._record_event(None) if self.cuda_events else None
+
+    def _record_event(self, phase: Optional[str], since: Any = None) -> Any:
+        event = torch.cuda.Event(enable_timing=True)
+        event.record()
+        self._events.append((phase, event, since))
+        if len(self._events) >= MAX_PENDING_EVENTS:
+            self._resolve_events()
+        return event
+
+    def _resolve_events(self) -> None:
+        """Charge the device time between marks to their phases, minus rewound spans.
+
+        Events after the last mark (an open checkpoint or rewind) are kept,
+        anchored at that mark, so resolving early loses no time.
+        """
+        marks = [idx for idx, (phase, _, _) in enumerate(self._events) if phase is not None]
+        if not marks:
+            return
+        resolved = self._events[: marks[-1] + 1]
+        self._events = [(None, resolved[-1][1], None), *self._events[marks[-1] + 1 :]]
+        # Host-device synchronization happens only here: once per interval, or
+        # every ``MAX_PENDING_EVENTS`` events when nothing summarizes.
+        resolved[-1][1].synchronize()
+        previous = resolved[0][1]
+        excluded_ms = 0.0
+        for phase, event, since in resolved[1:]:
+            if since is not None:
+                excluded_ms += since.elapsed_time(event)
+            elif phase is not None:
+                self._phases[phase] += max(0.0, previous.elapsed_time(event) - excluded_ms) / 1000
+                previous, excluded_ms = event, 0.0
+
+    def mark(self, phase: str) -> None:
+        if self.cuda_events:
+            self._record_event(phase)
+            return
+        now = self.clock()
+        self._phases[phase] += now - self._last_mark
+        self._last_mark = now
+
+    def checkpoint(self) -> None:
+        """Remember the current position so later work can be excluded with ``rewind``."""
+        self._checkpoint = (self.clock(), self._tokens, self._samples)
+        if self.cuda_events:
+            self._checkpoint_event = self._record_event(None)
+
+    def rewind(self) -> None:
+        """Drop tokens, samples and time recorded since ``checkpoint`` (e.g. an evaluation pass)."""
+        at, tokens, samples = self._checkpoint
+        excluded = self.clock() - at
+        self.total_tokens -= self._tokens - tokens
+        self.total_samples -= self._samples - samples
+        self._tokens, self._samples = tokens, samples
+        self._started += excluded
+        self._interval_start += excluded
+        self._last_mark += excluded
+        if self.cuda_events:
+            self._record_event(None, since=self._checkpoint_event)
+
+    def record_batch(self, batch: Mapping[str, Any]) -> None:
+        self.record(count_batch_tokens(batch), count_batch_samples(batch))
+
+    def record(self, tokens: int, samples: int) -> None:
+        self._tokens += tokens
+        self._samples += samples
+        self.total_tokens += tokens
+        self.total_samples += samples
+
+    def step(self) -> None:
+        self._steps += 1
+        self.total_steps += 1
+
+    def _rates(self, tokens: int, samples: int, elapsed: float) -> Dict[str, Any]:
+        tokens_per_s = tokens / elapsed if elapsed > 0 else 0.0
+        achieved_flops = tokens_per_s * self.flops_per_token
+        return {
+            "tokens_per_s": tokens_per_s,
+            "global_tokens_per_s": tokens_per_s * self.world_size,
+            "samples_per_s": samples / elapsed if elapsed > 0 else 0.0,
+            "tflops_per_device": achieved_flops / 1e12,
+            "mfu": achieved_flops / self.peak_flops if self.peak_flops else None,
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Metrics for the interval since the previous ``summary``, then start a new interval."""
+        self._resolve_events()
+        elapsed = self.clock() - self._interval_start
+        steps = max(1, self._steps)
+        metrics = self._rates(self._tokens, self._samples, elapsed)
+        metrics["step_time_s"] = elapsed / steps
+        for phase in sorted(set(STEP_PHASES) | set(self._phases)):
+            metrics[f"{phase}_s"] = self._phases.get(phase, 0.0) / steps
+        self._reset_interval()
+        return metrics
+
+    def totals(self) -> Dict[str, Any]:
+        """Whole-run throughput since the tracker was created."""
+        elapsed = self.clock() - self._started
+        return {
+            "steps": self.total_steps,
+            "tokens": self.total_tokens,
+            "samples": self.total_samples,
+            "elapsed_s": elapsed,
+            **self._rates(self.total_tokens, self.total_samples, elapsed),
+        }
+
+
+class TokenCountingCollator:
+    """Wrap a data collator so every collated batch is counted by ``tracker``.
+
+    Counting happens where collation runs, so keep ``dataloader_num_workers``
+    at 0 when the counts must reach the main process.
+    """
+
+    def __init__(self, collator: Callable[[Any], Dict[str, Any]], tracker: ThroughputTracker):
+        self.collator = collator
+        self.tracker = tracker
+
+    def __call__(self, features: Any) -> Dict[str, Any]:
+        batch = self.collator(features)
+        self.tracker.record_batch(batch)
+        return batch
+
+
+class ThroughputCallback(TrainerCallback):
+    """Drive a ``ThroughputTracker`` from ``transformers.Trainer`` events.
+
+    Time between steps counts as data wait, step start to the optimizer as
+    forward/backward (including later micro-batch fetches under gradient
+    accumulation) and the optimizer to step end as the optimizer phase.
+    Evaluation passes are excluded from both time and token counts.
+    """
+
+    def __init__(self, tracker: ThroughputTracker):
+        self.tracker = tracker
+
+    def on_step_begin(self, args, state, control, **kwargs):  # noqa: ANN001
+        self.tracker.mark("data")
+
+    def on_pre_optimizer_step(self, args, state, control, **kwargs):  # noqa: ANN001
+        self.tracker.mark("forward_backward")
+
+    def on_step_end(self, args, state, control, **kwargs):  # noqa: ANN001
+        self.tracker.mark("optimizer")
+        self.tracker.step()
+        self.tracker.checkpoint()
+
+    def on_evaluate(self, args, state, control, **kwargs):  # noqa: ANN001
+        # Evaluation runs right after a step and shares the training collator.
+        self.tracker.rewind()
+
+    def on_log(self, args, state, control, logs=None, **kwargs):  # noqa: ANN001
+        if logs and "loss" in logs:
+            # Every rank summarizes so its interval (and CUDA events) is released.
+            metrics = self.tracker.summary()
+            if state.is_world_process_zero:
+                log_metrics(state.global_step, metrics)
+
+
+class ProfilerCallback(TrainerCallback):
+    """Advance a profiler window once per optimizer step of a ``transformers.Trainer``."""
+
+    def __init__(self, profiler: ProfilerWindow):
+        self.profiler = profiler
+
+    def on_step_end(self, args, state, control, **kwargs):  # noqa: ANN001
+        self.profiler.step()
+
+    def on_train_end(self, args, state, control, **kwargs):  # noqa: ANN001
+        self.profiler.close()
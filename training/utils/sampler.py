@@ -0,0 +1,111 @@
+"""Length-aware batching for fine-tuning demos."""
+from __future__ import annotations
+
+import random
+from typing import Iterator, List, Optional, Sequence
+
+import pyarrow.compute as pc
+from datasets import Dataset
+from torch.utils.data import Sampler
+
+# Examples are sorted by length within buckets of this many batches, which
+# keeps batches homogeneous while still mixing lengths across the epoch.
+DEFAULT_BUCKET_BATCHES = 50
+
+
+def example_lengths(dataset: Dataset, column: str = "input_ids") -> List[int]:
+    """Token count of every example, read from the Arrow column without decoding rows."""
+    return pc.list_value_length(dataset.data.column(column)).to_pylist()
+
+
+class LengthGroupedBatchSampler(Sampler[List[int]]):
+    """Yield batches of indices whose examples have similar lengths.
+
+    Indices are shuffled, split into buckets, sorted by length within each
+    bucket and cut into batches; the batch order is then shuffled again so
+    long and short batches are interleaved. Batches hold ``batch_size``
+    examples or, with ``max_tokens``, as many examples as fit when padded to
+    the longest one (``batch_size`` then caps the example count).
+
+    With ``num_replicas > 1`` every rank builds the same batches from the
+    shared seed and keeps every ``num_replicas``-th one. The epoch advances
+    on each pass unless ``set_epoch`` is called.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        bucket_size: Optional[int] = None,
+        shuffle: bool = True,
+        seed: int = 0,
+        drop_last: bool = False,
+        num_replicas: int = 1,
+        rank: int = 0,
+    ):
+        if batch_size is None and max_tokens is None:
+            raise ValueError("LengthGroupedBatchSampler requires `batch_size` or `max_tokens`")
+        self.lengths = list(lengths)
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        if bucket_size is None:
+            per_batch = batch_size or max(1, max_tokens // max(1, max(self.lengths, default=1)))
+            bucket_size = per_batch * DEFAULT_BUCKET_BATCHES
+        self.bucket_size = bucket_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+        self._epoch_set = False
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+        self._epoch_set = True
+
+    def _split(self, indices: List[int]) -> List[List[int]]:
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        longest = 0
+        for idx in indices:
+            length = self.lengths[idx]
+            full = self.batch_size is not None and len(batch) >= self.batch_size
+            over_budget = self.max_tokens is not None and max(longest, length) * (len(batch) + 1) > self.max_tokens
+            if batch and (full or over_budget):
+                batches.append(batch)
+                batch, longest = [], 0
+            batch.append(idx)
+            longest = max(longest, length)
+        if batch and not (self.drop_last and self.batch_size is not None and len(batch) < self.batch_size):
+            batches.append(batch)
+        return batches
+
+    def batches(self, epoch: int) -> List[List[int]]:
+        """All batches for ``epoch`` on this rank."""
+        rng = random.Random(self.seed + epoch)
+        indices = list(range(len(self.lengths)))
+        if self.shuffle:
+            rng.shuffle(indices)
+        batches: List[List[int]] = []
+        for start in range(0, len(indices), self.bucket_size):
+            bucket = sorted(indices[start : start + self.bucket_size], key=self.lengths.__getitem__, reverse=True)
+            batches.extend(self._split(bucket))
+        if self.shuffle:
+            rng.shuffle(batches)
+        if self.num_replicas > 1:
+            # Every rank must run the same number of steps.
+            per_rank = len(batches) // self.num_replicas
+            batches = batches[self.rank : per_rank * self.num_replicas : self.num_replicas]
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        epoch = self.epoch
+        if not self._epoch_set:
+            self.epoch += 1
+        self._epoch_set = False
+        yield from self.batches(epoch)
+
+    def __len__(self) -> int:
+        return len(self.batches(self.epoch))